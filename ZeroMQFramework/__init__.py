@@ -1,8 +1,94 @@
-from ZeroMQFramework.common.connection_protocol import *
-from ZeroMQFramework.common.event import *
-from .worker.worker import *
-from .router.router import ZeroMQRouter
-from .client.client import *
-from .worker.multithreader_workers import *
-from .helpers.error import *
-from .common.socket_monitor import ZeroMQSocketMonitor
+"""
+The public classes and helpers are imported on first use (PEP 562), so importing the package, or a single class from
+it, only loads the modules that are needed. ``from ZeroMQFramework import *`` still imports everything in __all__.
+"""
+import importlib
+
+_LAZY_IMPORTS = {
+    # connections and events
+    "ZeroMQConnection": "ZeroMQFramework.common.connection_protocol",
+    "ZeroMQProtocol": "ZeroMQFramework.common.connection_protocol",
+    "ZeroMQTCPConnection": "ZeroMQFramework.common.connection_protocol",
+    "ZeroMQIPCConnection": "ZeroMQFramework.common.connection_protocol",
+    "ZeroMQINPROCConnection": "ZeroMQFramework.common.connection_protocol",
+    "ZeroMQEvent": "ZeroMQFramework.common.event",
+    "ZeroMQNodeType": "ZeroMQFramework.common.node_type",
+    "ZeroMQSocketStatus": "ZeroMQFramework.common.socket_status",
+    "ZeroMQCompression": "ZeroMQFramework.common.compression",
+    "ZeroMQBase": "ZeroMQFramework.common.base",
+    "ZeroMQProcessingBase": "ZeroMQFramework.common.processing_base",
+    "ZeroMQSocketMonitor": "ZeroMQFramework.common.socket_monitor",
+    "ZeroMQContextManager": "ZeroMQFramework.common.context_manager",
+    "ZeroMQSocketProfile": "ZeroMQFramework.common.socket_profile",
+    "ZeroMQObjectRegistry": "ZeroMQFramework.common.object_registry",
+    "ZeroMQSharedMemoryPool": "ZeroMQFramework.common.shared_memory",
+    "ZeroMQTracer": "ZeroMQFramework.common.tracing",
+    "ZeroMQJSONSpanExporter": "ZeroMQFramework.common.tracing",
+    "ZeroMQOpenTelemetrySpanExporter": "ZeroMQFramework.common.tracing",
+    # nodes
+    "ZeroMQWorker": "ZeroMQFramework.worker.worker",
+    "ZeroMQIdempotencyStore": "ZeroMQFramework.worker.idempotency_store",
+    "ZeroMQMultiThreadedWorkers": "ZeroMQFramework.worker.multithreader_workers",
+    "ZeroMQReactorWorkers": "ZeroMQFramework.worker.reactor_workers",
+    "ZeroMQHandlerProfiler": "ZeroMQFramework.worker.profiler",
+    "ZeroMQProfilerMode": "ZeroMQFramework.worker.profiler",
+    "ZeroMQRouter": "ZeroMQFramework.router.router",
+    "ZeroMQTrafficCapture": "ZeroMQFramework.router.traffic_capture",
+    "ZeroMQCaptureReader": "ZeroMQFramework.router.traffic_capture",
+    "ZeroMQClient": "ZeroMQFramework.client.client",
+    "ZeroMQHedgingPolicy": "ZeroMQFramework.client.hedging_policy",
+    "ZeroMQCircuitBreaker": "ZeroMQFramework.client.circuit_breaker",
+    "ZeroMQCircuitState": "ZeroMQFramework.client.circuit_breaker",
+    "ZeroMQProducer": "ZeroMQFramework.pipeline.producer",
+    "ZeroMQPipelineWorker": "ZeroMQFramework.pipeline.pipeline_worker",
+    "ZeroMQSink": "ZeroMQFramework.pipeline.sink",
+    # heartbeat
+    "ZeroMQHeartbeatConfig": "ZeroMQFramework.heartbeat.heartbeat_config",
+    "ZeroMQHeartbeatSender": "ZeroMQFramework.heartbeat.heartbeat_sender",
+    "ZeroMQHeartbeatReceiver": "ZeroMQFramework.heartbeat.heartbeat_receiver",
+    # errors
+    "ZeroMQError": "ZeroMQFramework.helpers.error",
+    "ZeroMQClientError": "ZeroMQFramework.helpers.error",
+    "ZeroMQCircuitOpenError": "ZeroMQFramework.helpers.error",
+    "ZeroMQConnectionError": "ZeroMQFramework.helpers.error",
+    "ZeroMQMalformedMessage": "ZeroMQFramework.helpers.error",
+    "ZeroMQQSocketClosed": "ZeroMQFramework.helpers.error",
+    "ZeroMQQSocketDisconnected": "ZeroMQFramework.helpers.error",
+    "ZeroMQQSocketInvalid": "ZeroMQFramework.helpers.error",
+    "ZeroMQSocketError": "ZeroMQFramework.helpers.error",
+    "ZeroMQTimeoutError": "ZeroMQFramework.helpers.error",
+    # helpers
+    "ZeroMQBatchingLogSink": "ZeroMQFramework.helpers.log_sink",
+    "ZeroMQLogRateLimiter": "ZeroMQFramework.helpers.log_sink",
+    "ZeroMQLatencyHistogram": "ZeroMQFramework.helpers.histogram",
+    "setup_logging": "ZeroMQFramework.helpers.utils",
+    "cleanup_old_logs": "ZeroMQFramework.helpers.utils",
+    "create_message": "ZeroMQFramework.helpers.utils",
+    "parse_message": "ZeroMQFramework.helpers.utils",
+    "decompress_payload": "ZeroMQFramework.common.compression",
+    "get_current_time": "ZeroMQFramework.helpers.utils",
+    "get_uuid_hex": "ZeroMQFramework.helpers.utils",
+    "get_uuid_str": "ZeroMQFramework.helpers.utils",
+    "get_node_id": "ZeroMQFramework.helpers.utils",
+    "load_config": "ZeroMQFramework.helpers.utils",
+    "save_config": "ZeroMQFramework.helpers.utils",
+    "logger": "loguru",
+}
+_LAZY_MODULES = {"zmq"}  # re-exported modules
+
+__all__ = list(_LAZY_IMPORTS) + list(_LAZY_MODULES)
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        value = importlib.import_module(name)
+    elif name in _LAZY_IMPORTS:
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value  # the next lookups do not go through __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
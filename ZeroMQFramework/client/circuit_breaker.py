@@ -0,0 +1,241 @@
+import statistics
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Dict, Optional
+
+from loguru import logger
+
+
+class ZeroMQCircuitState(Enum):
+    CLOSED = "closed"  # requests go through
+    OPEN = "open"  # requests fail fast
+    HALF_OPEN = "half_open"  # a few probe requests go through, their outcome closes or opens the circuit again
+
+
+class ZeroMQEndpointHealth:
+    """The recent outcomes and the circuit state of an endpoint, see ZeroMQCircuitBreaker."""
+
+    def __init__(self, window_size: int):
+        self.outcomes = deque(maxlen=window_size)  # (success, latency in ms)
+        self.failures = 0  # in the window
+        self.state = ZeroMQCircuitState.CLOSED
+        self.reason = None  # of the last opening: "errors", "latency" or "outlier"
+        self.opened_at = 0.0
+        self.open_duration = 0.0
+        self.consecutive_opens = 0  # the open duration doubles with every failed probe
+        self.probes = 0  # probe requests in flight
+        self.probe_successes = 0
+        self.latency = None  # percentile of the window, refreshed on evaluation
+        self.recorded_since_evaluation = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def record(self, success: bool, latency: Optional[float]):
+        if len(self.outcomes) == self.outcomes.maxlen and not self.outcomes[0][0]:
+            self.failures -= 1
+        self.outcomes.append((success, latency))
+        if not success:
+            self.failures += 1
+        self.recorded_since_evaluation += 1
+
+    def get_error_rate(self) -> float:
+        return self.failures / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ZeroMQCircuitBreaker:
+    """
+    Opt-in circuit breaker for ZeroMQClient, per endpoint (router or server connection string).
+
+    The outcomes of the recent requests of every endpoint are kept in a window. Once the window holds at least
+    ``min_requests`` outcomes, the circuit of the endpoint opens if its error rate (timeouts, invalid or lost sockets)
+    reaches ``error_threshold`` or if the ``latency_percentile`` of its latencies exceeds ``latency_threshold``. An open
+    circuit fails the requests right away with ZeroMQCircuitOpenError instead of letting them wait for the timeout,
+    or the client fails over to another endpoint whose circuit is closed. After ``open_duration`` seconds the circuit
+    is half open: ``half_open_requests`` probe requests go through, and it closes if they all succeed or opens again
+    for twice as long (up to ``max_open_duration``) otherwise.
+
+    With several endpoints (failover connections), an endpoint whose latency percentile is ``outlier_factor`` times
+    the median of the other endpoints is ejected (opened) as an outlier, no more than ``max_ejected`` of the endpoints
+    at once. One breaker can be shared by the clients of a process, so they all learn the health of the endpoints.
+    """
+
+    def __init__(self, error_threshold: float = 0.5, latency_threshold: Optional[float] = None,
+                 latency_percentile: float = 99, window_size: int = 100, min_requests: int = 20,
+                 open_duration: float = 5.0, max_open_duration: float = 60.0, half_open_requests: int = 1,
+                 outlier_factor: Optional[float] = 3.0, max_ejected: float = 0.5):
+        """
+        :param error_threshold: Error rate of the window opening the circuit.
+        :param latency_threshold: Latency (ms) of the percentile opening the circuit, latencies are ignored if None.
+        :param latency_percentile: Percentile of the window latencies compared to the thresholds.
+        :param window_size: Number of recent outcomes kept per endpoint.
+        :param min_requests: Outcomes needed before a circuit can open or an endpoint be ejected.
+        :param open_duration: Seconds a circuit stays open before the first probe.
+        :param max_open_duration: Upper bound of the open duration, doubled after every failed probe.
+        :param half_open_requests: Probe requests needed to close a half open circuit.
+        :param outlier_factor: Latency ratio to the median of the other endpoints ejecting an endpoint, no outlier
+                               ejection if None.
+        :param max_ejected: Maximum ratio of the endpoints open at once by outlier ejection.
+        """
+        if not 0 < error_threshold <= 1:
+            raise ValueError("error_threshold must be between 0 and 1")
+        if not 0 < latency_percentile < 100:
+            raise ValueError("latency_percentile must be between 0 and 100")
+        self.error_threshold = error_threshold
+        self.latency_threshold = latency_threshold
+        self.latency_percentile = latency_percentile
+        self.window_size = window_size
+        self.min_requests = min(min_requests, window_size)
+        self.open_duration = open_duration
+        self.max_open_duration = max_open_duration
+        self.half_open_requests = half_open_requests
+        self.outlier_factor = outlier_factor
+        self.max_ejected = max_ejected
+        self.endpoints: Dict[str, ZeroMQEndpointHealth] = {}
+        self.lock = threading.Lock()
+        self._evaluate_every = max(1, window_size // 20)  # sorting the window on every request is too expensive
+
+    def _get_health(self, endpoint: str) -> ZeroMQEndpointHealth:
+        health = self.endpoints.get(endpoint)
+        if health is None:
+            health = self.endpoints[endpoint] = ZeroMQEndpointHealth(self.window_size)
+        return health
+
+    def allow(self, endpoint: str) -> bool:
+        """
+        Check whether a request can be sent to an endpoint. Every allowed request must be followed by a call to
+        record_success or record_failure.
+
+        :param endpoint: The connection string of the endpoint.
+        :return: True if the request can be sent, False if the circuit is open (the request is counted as rejected).
+        """
+        with self.lock:
+            health = self._get_health(endpoint)
+            if health.state == ZeroMQCircuitState.CLOSED:
+                return True
+            if health.state == ZeroMQCircuitState.OPEN:
+                if time.monotonic() - health.opened_at < health.open_duration:
+                    health.rejected += 1
+                    return False
+                health.state = ZeroMQCircuitState.HALF_OPEN
+                health.probes = 0
+                health.probe_successes = 0
+                logger.info("Circuit breaker: {} half open, probing", endpoint)
+            if health.probes + health.probe_successes >= self.half_open_requests:
+                health.rejected += 1
+                return False
+            health.probes += 1
+            return True
+
+    def record_success(self, endpoint: str, latency: float):
+        """
+        :param endpoint: The connection string of the endpoint.
+        :param latency: The request latency in milliseconds.
+        :return: None
+        """
+        with self.lock:
+            health = self._get_health(endpoint)
+            if health.state == ZeroMQCircuitState.HALF_OPEN:
+                health.probes = max(0, health.probes - 1)
+                slow = self.latency_threshold is not None and latency > self.latency_threshold
+                if slow:
+                    self._open(endpoint, health, "latency")
+                    return
+                health.probe_successes += 1
+                if health.probe_successes >= self.half_open_requests:
+                    self._close(endpoint, health)
+                return
+            health.record(True, latency)
+            self._evaluate(endpoint, health)
+
+    def record_failure(self, endpoint: str):
+        """
+        :param endpoint: The connection string of the endpoint.
+        :return: None
+        """
+        with self.lock:
+            health = self._get_health(endpoint)
+            if health.state == ZeroMQCircuitState.HALF_OPEN:
+                health.probes = max(0, health.probes - 1)
+                self._open(endpoint, health, "errors")
+                return
+            health.record(False, None)
+            self._evaluate(endpoint, health, force=True)
+
+    def _evaluate(self, endpoint: str, health: ZeroMQEndpointHealth, force: bool = False):
+        if health.state != ZeroMQCircuitState.CLOSED or len(health.outcomes) < self.min_requests:
+            return
+        if health.get_error_rate() >= self.error_threshold:
+            self._open(endpoint, health, "errors")
+            return
+        if not force and health.recorded_since_evaluation < self._evaluate_every:
+            return
+        health.recorded_since_evaluation = 0
+        latencies = sorted(latency for success, latency in health.outcomes if success)
+        if not latencies:
+            return
+        health.latency = latencies[min(len(latencies) - 1, int(len(latencies) * self.latency_percentile / 100))]
+        if self.latency_threshold is not None and health.latency > self.latency_threshold:
+            self._open(endpoint, health, "latency")
+        elif self.outlier_factor is not None and self._is_outlier(endpoint, health):
+            self._open(endpoint, health, "outlier")
+
+    def _is_outlier(self, endpoint: str, health: ZeroMQEndpointHealth) -> bool:
+        others = [other.latency for name, other in self.endpoints.items()
+                  if name != endpoint and other.state == ZeroMQCircuitState.CLOSED and other.latency is not None]
+        if not others or health.latency <= self.outlier_factor * statistics.median(others):
+            return False
+        opened = sum(other.state != ZeroMQCircuitState.CLOSED for other in self.endpoints.values())
+        return opened + 1 <= self.max_ejected * len(self.endpoints)
+
+    def _open(self, endpoint: str, health: ZeroMQEndpointHealth, reason: str):
+        was_half_open = health.state == ZeroMQCircuitState.HALF_OPEN
+        health.consecutive_opens = health.consecutive_opens + 1 if was_half_open else 1
+        health.open_duration = min(self.max_open_duration, self.open_duration * 2 ** (health.consecutive_opens - 1))
+        health.state = ZeroMQCircuitState.OPEN
+        health.reason = reason
+        health.opened_at = time.monotonic()
+        health.opened += 1
+        logger.warning("Circuit breaker: {} open for {} s ({}, error rate {:.0%}, p{} {} ms)", endpoint,
+                       health.open_duration, reason, health.get_error_rate(), self.latency_percentile, health.latency)
+
+    def _close(self, endpoint: str, health: ZeroMQEndpointHealth):
+        health.state = ZeroMQCircuitState.CLOSED
+        health.consecutive_opens = 0
+        health.outcomes.clear()
+        health.failures = 0
+        health.latency = None
+        logger.info("Circuit breaker: {} closed", endpoint)
+
+    def get_state(self, endpoint: str) -> ZeroMQCircuitState:
+        """
+        :param endpoint: The connection string of the endpoint.
+        :return: The circuit state of the endpoint, an open circuit past its open duration is reported half open.
+        """
+        with self.lock:
+            health = self._get_health(endpoint)
+            if health.state == ZeroMQCircuitState.OPEN and \
+                    time.monotonic() - health.opened_at >= health.open_duration:
+                return ZeroMQCircuitState.HALF_OPEN
+            return health.state
+
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        :return: The breaker state of every endpoint, by connection string: circuit state, reason of the last
+                 opening, error rate and latency percentile (ms) of the window, times opened, requests rejected.
+        """
+        states = {endpoint: self.get_state(endpoint) for endpoint in list(self.endpoints)}
+        with self.lock:
+            return {
+                endpoint: {
+                    "state": states[endpoint].value,
+                    "reason": health.reason,
+                    "requests": len(health.outcomes),
+                    "error_rate": round(health.get_error_rate(), 4),
+                    "latency_ms": round(health.latency, 3) if health.latency is not None else None,
+                    "opened": health.opened,
+                    "rejected": health.rejected,
+                }
+                for endpoint, health in self.endpoints.items()
+            }
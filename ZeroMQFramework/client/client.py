@@ -1,3 +1,5 @@
+from typing import Iterator, Any, Optional, List
+
 import zmq
 
 from ZeroMQFramework.common.connection_protocol import *
@@ -7,26 +9,110 @@ from ZeroMQFramework.helpers.error import *
 from ZeroMQFramework.common.base import ZeroMQBase
 from ZeroMQFramework.heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
 from ZeroMQFramework.common.node_type import ZeroMQNodeType
+from ZeroMQFramework.common.event import ZeroMQEvent
+from ZeroMQFramework.client.hedging_policy import ZeroMQHedgingPolicy
+from ZeroMQFramework.client.circuit_breaker import ZeroMQCircuitBreaker
+from ZeroMQFramework.common.tracing import ZeroMQSpan, ZeroMQTracer
+from ZeroMQFramework.common.object_registry import retain_message
 
 
 class ZeroMQClient(ZeroMQBase):
     def __init__(self, config_file: str, connection: ZeroMQConnection,
-                 heartbeat_config: ZeroMQHeartbeatConfig = None, timeout: int = 5):
-        super().__init__(config_file, connection, ZeroMQNodeType.CLIENT, None, None, heartbeat_config)
+                 heartbeat_config: ZeroMQHeartbeatConfig = None, timeout: int = 5, stream_hwm: int = 1000,
+                 retries: int = 0, hedging_policy: Optional[ZeroMQHedgingPolicy] = None,
+                 failover_connections: Optional[List[ZeroMQConnection]] = None, failover_heartbeat_interval: int = 100,
+                 circuit_breaker: Optional[ZeroMQCircuitBreaker] = None, tracer: Optional[ZeroMQTracer] = None,
+                 stream_credit: Optional[int] = None):
+        # The monitor events are processed on the client thread (see send_message), so the socket status is only
+        # written by the thread that reads it and the send path checks it without any lock
+        super().__init__(config_file, connection, ZeroMQNodeType.CLIENT, None, None, heartbeat_config,
+                         threaded_monitor=False)
         self.timeout = timeout * 1000  # convert to ms. Don't't change the multiplication unless u know what you are
         # doing!
+        self.hedging_policy = hedging_policy
+        self.hedge_sockets = []  # created on the first hedge
+        self._next_hedge_socket = 0
 
         self.heartbeat_started = False
         self.poller = zmq.Poller()
         self.connection_string = self.connection.get_connection_string(bind=False)
+
+        # High availability: endpoints of other routers the client fails over to when the current one is lost.
+        # ZMTP heartbeats on the socket detect a dead router within a few intervals (ms)
+        self.endpoints = [self.connection_string] + [connection.get_connection_string(bind=False)
+                                                     for connection in failover_connections or []]
+        self.failover_heartbeat_interval = failover_heartbeat_interval  # ms
+        self.failover_count = 0
         self._configure_socket()
         self._reinitialize = False
 
+        # Streams need a DEALER socket as the REQ socket can only receive a single reply per request.
+        # It is created on the first call to stream_message
+        self.stream_socket = None
+        self.stream_hwm = stream_hwm
+        # Chunks a worker may send ahead of the consumer (flow control credits), granted again as they are consumed.
+        # Below the receive high water mark, so no chunk is dropped by the router when the consumer is slow
+        self.stream_credit = stream_credit or max(1, stream_hwm // 2)
+
+        # Number of times a request is resent (with the same request id) after a timeout or an invalid socket.
+        # Only safe for non-idempotent handlers if the workers use an idempotency store
+        self.retries = retries
+        self.last_request_id = None
+
+        # Requests to an endpoint whose circuit is open fail fast (or fail over) instead of waiting for the timeout
+        self.circuit_breaker = circuit_breaker
+
+        # Traces the sampled requests: their trace context is added to the metadata for the routers and workers to
+        # record their own spans, see ZeroMQTracer
+        self.tracer = tracer
+        self.trace_attributes = {"node.type": self.node_type.value, "node.id": self.node_id}
+
     def _configure_socket(self):
         """Configure the ZMQ socket with the appropriate options."""
         self.socket.setsockopt(zmq.LINGER, 0)
         self.socket.setsockopt(zmq.RCVTIMEO, self.timeout)  # milliseconds
         self.socket.setsockopt(zmq.SNDTIMEO, self.timeout)  # milliseconds
+        # the socket is reset after a timeout and the router hands its identity over to the new socket, correlate mode
+        # drops the late reply of the request that timed out instead of taking it as the reply of the next request
+        self.socket.setsockopt(zmq.REQ_CORRELATE, 1)
+        if self.hedging_policy is not None:
+            # a hedged request leaves the slower socket waiting for a reply that is never read. Relaxed mode allows
+            # sending the next request anyway
+            self.socket.setsockopt(zmq.REQ_RELAXED, 1)
+        if self.failover_enabled:
+            self.socket.setsockopt(zmq.HEARTBEAT_IVL, self.failover_heartbeat_interval)
+            self.socket.setsockopt(zmq.HEARTBEAT_TIMEOUT, self.failover_heartbeat_interval * 3)
+
+    @property
+    def failover_enabled(self) -> bool:
+        return len(self.endpoints) > 1
+
+    def failover(self, endpoint: Optional[str] = None) -> bool:
+        """
+        Switch to another router endpoint, resetting the socket.
+
+        :param endpoint: The endpoint to switch to, the next one if None.
+        :return: True if the client connected to the new endpoint, False otherwise.
+        """
+        previous = self.connection_string
+        self.connection_string = endpoint or self.endpoints[(self.endpoints.index(previous) + 1) % len(self.endpoints)]
+        self.failover_count += 1
+        logger.warning(f"Client: failing over from {previous} to {self.connection_string}")
+        self.socket_requires_reset = True
+        return self.connect()
+
+    def add_failover_endpoints(self, endpoints: List[str]):
+        """
+        Add router endpoints to fail over to, e.g. discovered with discover_members(ZeroMQNodeType.ROUTER).
+
+        :param endpoints: Connection strings of the routers frontends.
+        :return: None
+        """
+        new_endpoints = [endpoint for endpoint in endpoints if endpoint and endpoint not in self.endpoints]
+        self.endpoints.extend(new_endpoints)
+        if new_endpoints and self.failover_enabled:
+            self._configure_socket()  # enable the ZMTP heartbeats
+        logger.debug(f"Client: failover endpoints = {self.endpoints}")
 
     def connect(self):
         """
@@ -34,25 +120,26 @@ class ZeroMQClient(ZeroMQBase):
 
         :return: True if the connection is successful, False otherwise.
         """
-        logger.debug(f"Connect")
-        logger.debug(f"heartbeat_enabled = {self.heartbeat_enabled}, heartbeat_started = {self.heartbeat_started}")
+        logger.debug("Connect: heartbeat_enabled = {}, heartbeat_started = {}", self.heartbeat_enabled,
+                     self.heartbeat_started)
         if self.heartbeat_enabled and not self.heartbeat_started:
             logger.info('Client: Starting heartbeat')
             self.heartbeat.start()
             self.heartbeat_started = True
 
-        logger.debug(f"socket_status = {self.socket_status.value}, _reinitialize = {self._reinitialize}, "
-                     f"socket_requires_reset = {self.socket_requires_reset}")
+        logger.debug("socket_status = {}, _reinitialize = {}, socket_requires_reset = {}", self.socket_status.value,
+                     self._reinitialize, self.socket_requires_reset)
         if self.socket_status == ZeroMQSocketStatus.CLOSED and self._reinitialize or self.socket_requires_reset:
             logger.info("Client: Reinitializing socket due to closed status")
             self._reinitialize_socket()
             self._configure_socket()
 
-        logger.info(f'Client: establishing connection on {self.connection_string}...')
+        logger.info("Client: establishing connection on {}...", self.connection_string)
+        self.start_socket_monitor()
         self.socket.connect(self.connection_string)
 
         if self.wait_for_connection():
-            logger.info(f'Client: connected on {self.connection_string} successfully')
+            logger.info("Client: connected on {} successfully", self.connection_string)
             self._reinitialize = True
             return True
         else:
@@ -60,51 +147,367 @@ class ZeroMQClient(ZeroMQBase):
             self._reinitialize = False
             return False
 
-    def send_message(self, event_name: str, event_data: dict):
+    def send_message(self, event_name: str, event_data: dict, request_id: Optional[str] = None):
         """
         Sends a message using the ZeroMQ socket.
 
+        Every request carries a request id, generated by the client unless one is given. Resending a request with
+        the same id (see ``last_request_id``) lets workers with an idempotency store return the cached response
+        instead of running the handler again. If ``retries`` is set, the client resets the socket and resends the
+        request with the same id after a timeout or an invalid socket state.
+
         :param event_name: The name of the event being sent.
         :param event_data: The data associated with the event.
+        :param request_id: Optional request id, to replay a request that failed.
         :return: The response received after sending the message.
         :raises ZeroMQQSocketDisconnected: If the socket state is disconnected.
         :raises ZeroMQQSocketClosed: If the socket state is closed.
         :raises ZeroMQTimeoutError: If no response is received within the timeout period.
         :raises ZeroMQQSocketInvalid: If the socket is in an invalid state.
+        :raises ZeroMQCircuitOpenError: If the circuit of the endpoint (of every endpoint, with failover) is open.
         :raises ZeroMQClientError: If a general ZMQError occurs.
         """
+        span = self.tracer.start_trace("client", self.trace_attributes) if self.tracer is not None else None
+        if span is None:
+            return self._send_message(event_name, event_data, request_id)
+        span.attributes = {**span.attributes, "event": event_name}
+        status = None
+        try:
+            return self._send_message(event_name, event_data, request_id, span)
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            self.tracer.end_span(span, status)
+
+    def _send_message(self, event_name: str, event_data: dict, request_id: Optional[str] = None,
+                      span: Optional[ZeroMQSpan] = None):
+        # pick up a lost connection or a reconnection before sending. Non-blocking, a single getsockopt without events
+        self.socket_monitor.drain_events()
+        if self.socket_status != ZeroMQSocketStatus.CONNECTED and self.failover_enabled:
+            for _ in range(len(self.endpoints)):
+                if self.failover():
+                    break
         if self.socket_status == ZeroMQSocketStatus.DISCONNECTED:
             raise ZeroMQQSocketDisconnected("Socket state is disconnected")
         elif self.socket_status == ZeroMQSocketStatus.CLOSED:
             raise ZeroMQQSocketClosed("Socket state is closed")
 
-        message = create_message(event_name, event_data)
+        request_id = request_id or get_uuid_hex(16)
+        self.last_request_id = request_id
+        metadata = {"request_id": request_id}
+        if span is not None:
+            metadata["trace"] = span.traceparent
+        # an offloaded payload is kept by the receivers as the request may be sent again, it is released below
+        message = create_message(event_name, event_data, metadata=metadata,
+                                 compression=self.connection.compression, by_reference=self.connection.pass_objects,
+                                 shared_memory=self.connection.shared_memory, keep_shared_memory=True)
 
+        if span is not None:
+            span.add_event("sent")
+        try:
+            return self._send_with_retries(message, request_id)
+        finally:
+            if self.connection.shared_memory is not None:
+                # the request cannot be sent again, its shared memory segment (if any) is released
+                self.connection.shared_memory.release_message(message)
+
+    def _send_with_retries(self, message: list, request_id: str):
+        attempt = 0
+        failovers = 0
+        while True:
+            try:
+                if self.circuit_breaker is not None:
+                    self._check_circuit()
+                if self.socket_requires_reset:
+                    self.connect()  # the REQ socket is still waiting for the reply of a request that timed out
+                if attempt or failovers:
+                    retain_message(message)  # sent again, the first one may have been read already
+                return self._send_and_record(message)
+            except ZeroMQQSocketDisconnected as e:
+                # the router was lost while waiting for the reply, resend through another one
+                if not self.failover_enabled or failovers >= len(self.endpoints):
+                    raise
+                failovers += 1
+                self.log_limiter.log("resend", "WARNING", "Client: resending request {} after: {}", request_id, e)
+                self.failover()
+            except (ZeroMQTimeoutError, ZeroMQQSocketInvalid) as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.log_limiter.log("retry", "WARNING", "Client: retrying request {} ({}/{}) after: {}", request_id,
+                                     attempt, self.retries, e)
+                if self.failover_enabled:
+                    self.failover()
+                else:
+                    self.socket_requires_reset = True  # the REQ socket is still waiting for the lost reply
+                    self.connect()
+
+    def _check_circuit(self):
+        """
+        Make sure the circuit of the current endpoint lets the request through, failing over to the first endpoint
+        whose circuit does otherwise.
+
+        :return: None
+        :raises ZeroMQCircuitOpenError: If no endpoint can take the request.
+        """
+        if self.circuit_breaker.allow(self.connection_string):
+            return
+        current = self.endpoints.index(self.connection_string)
+        for offset in range(1, len(self.endpoints)):
+            endpoint = self.endpoints[(current + offset) % len(self.endpoints)]
+            if not self.circuit_breaker.allow(endpoint):
+                continue
+            if self.failover(endpoint):
+                return
+            self.circuit_breaker.record_failure(endpoint)
+        raise ZeroMQCircuitOpenError(f"Client: circuit open for {self.connection_string}")
+
+    def _send_and_record(self, message: list):
+        if self.circuit_breaker is None:
+            return self._send_and_receive(message)
+        endpoint = self.connection_string
+        start = time.perf_counter()
+        try:
+            reply = self._send_and_receive(message)
+        except Exception:
+            self.circuit_breaker.record_failure(endpoint)
+            raise
+        self.circuit_breaker.record_success(endpoint, (time.perf_counter() - start) * 1000)
+        return reply
+
+    def discover_members(self, node_type: Optional[ZeroMQNodeType] = None) -> List[dict]:
+        """
+        Ask the router for the alive members of the cluster (endpoint discovery).
+        The router answers from its membership registry, which is fed by heartbeats.
+
+        :param node_type: Only return members of this type, all types if None.
+        :return: A list of members (node_id, session_id, node_type, endpoint, load, first_seen, last_seen, ...).
+        """
+        query = {"node_type": node_type.value if node_type else None}
+        response = self.send_message(ZeroMQEvent.MEMBERSHIP.value, query)
+        return response["event_data"]
+
+    def _send_and_receive(self, message: list):
         try:
             if self.socket_status == ZeroMQSocketStatus.CLOSED:
                 raise zmq.ZMQError
+            if self.hedging_policy is not None:
+                return self._send_hedged(message)
             self.socket.send_multipart(message)
+            if self.failover_enabled:
+                return self._receive_watching_connection()
             return self.receive_message()
         except zmq.Again:
             err = f"Client: No response received within the timeout period {self.timeout / 1000} seconds"
-            logger.warning(err)
+            self.log_limiter.log("timeout", "WARNING", err)
+            if self.hedging_policy is None:  # relaxed REQ sockets (hedging) can send again right away
+                self.socket_requires_reset = True
             raise ZeroMQTimeoutError(err)
         except zmq.ZMQError as e:
             if e.errno in (zmq.EFSM, zmq.EAGAIN):
                 err = f"Socket is in an invalid state. {e}"
-                logger.error(err)
+                self.log_limiter.log("invalid_state", "ERROR", err)
                 self.socket_requires_reset = True
                 raise ZeroMQQSocketInvalid(err)
             else:
                 err = f"Client: ZMQError occurred: {e}."
-                logger.error(err)
+                self.log_limiter.log("zmq_error", "ERROR", err)
                 raise ZeroMQClientError(err)
 
+    def _receive_watching_connection(self, check_interval: int = 10):
+        """
+        Wait for the reply while watching the socket state, so a lost router is detected in milliseconds instead of
+        after the whole timeout.
+
+        :param check_interval: How often the socket state is checked, in milliseconds.
+        :return: The response.
+        :raises ZeroMQQSocketDisconnected: If the socket got disconnected while waiting.
+        :raises zmq.Again: If no response is received within the timeout period.
+        """
+        deadline = time.monotonic() + self.timeout / 1000
+        while not self.socket.poll(check_interval, zmq.POLLIN):
+            self.socket_monitor.drain_events()
+            # a batch of events can end with the closed events of the reconnection attempts
+            if self.socket_status != ZeroMQSocketStatus.CONNECTED:
+                raise ZeroMQQSocketDisconnected(f"Socket disconnected from {self.connection_string}")
+            if time.monotonic() >= deadline:
+                raise zmq.Again()
+        return self.receive_message()
+
+    def _send_hedged(self, message: list):
+        """
+        Send the request and, if no reply is received within the hedging delay and the budget allows it, send a
+        duplicate through a hedge socket. The first reply wins, the other one is dropped by the REQ socket.
+
+        :param message: The request message.
+        :return: The first response received.
+        :raises zmq.Again: If no response is received within the timeout period.
+        """
+        policy = self.hedging_policy
+        policy.record_request()
+        start = time.perf_counter()
+        self.socket.send_multipart(message)
+        if self.socket.poll(policy.get_delay(), zmq.POLLIN):
+            reply = self.receive_message()
+            policy.record_latency((time.perf_counter() - start) * 1000)
+            return reply
+
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        hedge_socket = None
+        if policy.try_acquire_hedge():
+            hedge_socket = self._get_hedge_socket()
+            retain_message(message)
+            hedge_socket.send_multipart(message)
+            poller.register(hedge_socket, zmq.POLLIN)
+            logger.opt(lazy=True).debug("Client: hedge sent after {} ms", policy.get_delay)
+
+        remaining = self.timeout - (time.perf_counter() - start) * 1000
+        socks = dict(poller.poll(max(0, remaining)))
+        if self.socket in socks:
+            reply = self.receive_message()
+        elif hedge_socket is not None and hedge_socket in socks:
+            reply = parse_message(hedge_socket.recv_multipart(), compression=self.connection.compression,
+                                  shared_memory=self.connection.shared_memory)
+            policy.record_hedge_won()
+        else:
+            raise zmq.Again()
+        policy.record_latency((time.perf_counter() - start) * 1000)
+        return reply
+
+    def _get_hedge_socket(self) -> zmq.Socket:
+        """
+        Get the next hedge socket, creating the hedge sockets on first use.
+        There is one socket per hedge connection, or a single one connected to the client connection.
+
+        :return: A hedge socket.
+        """
+        if not self.hedge_sockets:
+            hedge_connections = self.hedging_policy.hedge_connections
+            targets = ([(connection.get_connection_string(bind=False), connection) for connection in hedge_connections]
+                       or [(self.connection_string, self.connection)])
+            for index, (connection_string, connection) in enumerate(targets):
+                hedge_socket = self.context.socket(zmq.REQ)
+                hedge_socket.setsockopt(zmq.IDENTITY, self.get_socket_identity() + f"_hedge{index}".encode('utf-8'))
+                hedge_socket.setsockopt(zmq.LINGER, 0)
+                hedge_socket.setsockopt(zmq.SNDTIMEO, self.timeout)
+                hedge_socket.setsockopt(zmq.REQ_RELAXED, 1)
+                hedge_socket.setsockopt(zmq.REQ_CORRELATE, 1)
+                connection.apply_socket_options(hedge_socket)
+                hedge_socket.connect(connection_string)
+                self.hedge_sockets.append(hedge_socket)
+                logger.debug(f"Client: hedge socket connected to {connection_string}")
+        hedge_socket = self.hedge_sockets[self._next_hedge_socket % len(self.hedge_sockets)]
+        self._next_hedge_socket += 1
+        return hedge_socket
+
     def receive_message(self):
         reply = self.socket.recv_multipart()
-        return parse_message(reply)
+        return parse_message(reply, compression=self.connection.compression,
+                             shared_memory=self.connection.shared_memory)
+
+    def stream_message(self, event_name: str, event_data: dict) -> Iterator[Any]:
+        """
+        Sends a message and iterates over the chunks of a streamed response.
+
+        The worker handler must return a generator (or an async generator) for the response to be streamed.
+        A handler returning a plain value produces a single chunk. Chunks are yielded as they arrive, so the
+        first chunk is available before the whole response is computed.
+
+        The stream is flow controlled with credits: the worker sends up to ``stream_credit`` chunks ahead of the
+        consumer and pauses the handler until more are granted, which happens every half window of consumed chunks.
+        Closing the iterator before the end cancels the stream on the worker.
+
+        :param event_name: The name of the event being sent.
+        :param event_data: The data associated with the event.
+        :return: An iterator over the received chunks.
+        :raises ZeroMQTimeoutError: If no chunk is received within the timeout period.
+        :raises ZeroMQMalformedMessage: If a chunk was lost (the receive HWM was exceeded somewhere on the path).
+        :raises ZeroMQClientError: If the handler failed mid-stream or a general ZMQError occurs.
+        """
+        if self.stream_socket is None:
+            self._create_stream_socket()
+
+        stream_id = get_uuid_hex(16)
+        message = create_message(event_name, event_data, include_empty_frame=True,
+                                 metadata={"stream": stream_id, "credit": self.stream_credit},
+                                 compression=self.connection.compression, by_reference=self.connection.pass_objects,
+                                 shared_memory=self.connection.shared_memory)
+        try:
+            self.stream_socket.send_multipart(message)
+        except zmq.Again:
+            err = f"Client: stream request not sent within the timeout period {self.timeout / 1000} seconds"
+            logger.warning(err)
+            raise ZeroMQTimeoutError(err)
+
+        expected_seq = 0
+        consumed = 0  # chunks consumed since the last credits were granted
+        finished = False
+        try:
+            while True:
+                if not self.stream_socket.poll(self.timeout, zmq.POLLIN):
+                    err = f"Client: No stream chunk received within the timeout period {self.timeout / 1000} seconds"
+                    logger.warning(err)
+                    raise ZeroMQTimeoutError(err)
+                parsed_message = parse_message(self.stream_socket.recv_multipart(),
+                                               compression=self.connection.compression,
+                                               shared_memory=self.connection.shared_memory)
+                metadata = parsed_message["metadata"]
+                if metadata.get("stream") != stream_id:
+                    if "stream" not in metadata:  # handler did not stream, the whole response is a single chunk
+                        finished = True
+                        yield parsed_message["event_data"]
+                        return
+                    continue  # stale chunk of an abandoned stream
+                if metadata["seq"] != expected_seq:
+                    raise ZeroMQMalformedMessage(f"Stream {stream_id}: expected chunk {expected_seq} "
+                                                 f"but received {metadata['seq']}")
+                if metadata["end"]:
+                    finished = True
+                    if "error" in metadata:
+                        raise ZeroMQClientError(f"Stream {stream_id} failed: {metadata['error']}")
+                    return
+                expected_seq += 1
+                yield parsed_message["event_data"]
+                consumed += 1
+                if consumed >= max(1, self.stream_credit // 2):
+                    self._send_stream_credit(stream_id, {"credit": consumed})
+                    consumed = 0
+        finally:
+            if not finished:  # abandoned by the consumer or failed, the worker stops producing
+                try:
+                    self._send_stream_credit(stream_id, {"cancel": True})
+                except (ZeroMQTimeoutError, zmq.ZMQError):
+                    pass
+
+    def _send_stream_credit(self, stream_id: str, credit: dict):
+        message = create_message(ZeroMQEvent.STREAM_CREDIT.value, credit, include_empty_frame=True,
+                                 metadata={"stream": stream_id})
+        try:
+            self.stream_socket.send_multipart(message)
+        except zmq.Again:
+            err = f"Client: stream credits not sent within the timeout period {self.timeout / 1000} seconds"
+            logger.warning(err)
+            raise ZeroMQTimeoutError(err)
+
+    def _create_stream_socket(self):
+        self.stream_socket = self.context.socket(zmq.DEALER)
+        self.stream_socket.setsockopt(zmq.IDENTITY, self.get_socket_identity() + b'_stream')
+        self.stream_socket.setsockopt(zmq.LINGER, 0)
+        self.stream_socket.setsockopt(zmq.SNDTIMEO, self.timeout)
+        self.stream_socket.setsockopt(zmq.RCVHWM, self.stream_hwm)
+        self.connection.apply_socket_options(self.stream_socket)
+        self.stream_socket.connect(self.connection_string)
+        logger.debug(f"Client: stream socket connected to {self.connection_string}")
 
     def cleanup(self):
         logger.info("Client: Cleaning up client...")
+        if self.stream_socket is not None:
+            self.stream_socket.close()
+            self.stream_socket = None
+        for hedge_socket in self.hedge_sockets:
+            hedge_socket.close()
+        self.hedge_sockets = []
         super().cleanup()
         logger.info("Client: Cleaned up ZeroMQ sockets and context.")
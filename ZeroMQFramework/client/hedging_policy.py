@@ -0,0 +1,107 @@
+import threading
+from collections import deque
+from typing import List, Optional
+
+from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+
+
+class ZeroMQHedgingPolicy:
+    """
+    Opt-in hedging policy for ZeroMQClient.
+
+    If no reply is received after a delay (the given percentile of the recent request latencies), the client sends
+    a duplicate of the request through a hedge socket and takes whichever reply comes first. Hedge sockets connect
+    to ``hedge_connections`` (other router endpoints), or to the client connection if none is given, in which case the
+    router hands the duplicate to another worker.
+    Duplicates carry the same request id. Workers sharing an idempotency store run the handler only once: a hedge
+    that arrives while the original is running waits for its response, so it only wins against a slow network or
+    queue, not a slow handler. A hedge that reaches a worker process without that store runs the handler again, so
+    the handlers of hedged requests must be idempotent unless all the workers share one store.
+    """
+
+    def __init__(self, percentile: float = 95, min_delay: int = 5, max_delay: int = 1000, initial_delay: int = 50,
+                 budget: float = 0.1, window_size: int = 1000,
+                 hedge_connections: Optional[List[ZeroMQConnection]] = None):
+        """
+        :param percentile: Percentile of the recent latencies used as the hedging delay.
+        :param min_delay: Lower bound of the hedging delay in milliseconds.
+        :param max_delay: Upper bound of the hedging delay in milliseconds.
+        :param initial_delay: Hedging delay in milliseconds until enough latencies are recorded.
+        :param budget: Maximum ratio of extra (hedge) requests to requests. 0.1 means at most 10% extra load.
+        :param window_size: Number of recent latencies the percentile is computed on.
+        :param hedge_connections: Connections the hedges are sent through, used in turn.
+        """
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.budget = budget
+        self.hedge_connections = hedge_connections or []
+        self.latencies = deque(maxlen=window_size)
+        self.lock = threading.Lock()
+        self._delay = initial_delay
+        self._refresh_every = max(1, window_size // 20)  # sorting the window on every request is too expensive
+        self._recorded_since_refresh = 0
+
+        # metrics
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.budget_exhausted = 0
+
+    def get_delay(self) -> int:
+        """
+        :return: The current hedging delay in milliseconds.
+        """
+        return self._delay
+
+    def record_latency(self, latency: float):
+        """
+        Record the latency of a completed request and refresh the hedging delay periodically.
+
+        :param latency: The request latency in milliseconds.
+        :return: None
+        """
+        with self.lock:
+            self.latencies.append(latency)
+            self._recorded_since_refresh += 1
+            if self._recorded_since_refresh < self._refresh_every:
+                return
+            self._recorded_since_refresh = 0
+            ordered = sorted(self.latencies)
+            index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+            self._delay = int(min(self.max_delay, max(self.min_delay, ordered[index])))
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def try_acquire_hedge(self) -> bool:
+        """
+        Check the budget and account for a hedge if it allows one.
+
+        :return: True if a hedge can be sent, False if the budget is exhausted.
+        """
+        with self.lock:
+            if self.hedges_sent + 1 > self.budget * self.requests:
+                self.budget_exhausted += 1
+                return False
+            self.hedges_sent += 1
+            return True
+
+    def record_hedge_won(self):
+        with self.lock:
+            self.hedges_won += 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "hedges_sent": self.hedges_sent,
+                "hedges_won": self.hedges_won,
+                "hedge_win_rate": self.hedges_won / self.hedges_sent if self.hedges_sent else 0.0,
+                "budget_exhausted": self.budget_exhausted,
+                "delay_ms": self._delay,
+            }
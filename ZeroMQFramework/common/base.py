@@ -2,16 +2,20 @@ from abc import abstractmethod
 
 import zmq
 import threading
+import time
 import signal
 from typing import Callable, Any, Optional
 from loguru import logger
-from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+from ZeroMQFramework.common.connection_protocol import ZeroMQConnection, ZeroMQProtocol
 from ZeroMQFramework.common.node_type import ZeroMQNodeType
 from ZeroMQFramework.heartbeat.heartbeat_sender import ZeroMQHeartbeatSender
 from ZeroMQFramework.heartbeat.heartbeat_receiver import ZeroMQHeartbeatReceiver
 from ZeroMQFramework.heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
 from ZeroMQFramework.common.socket_monitor import ZeroMQSocketMonitor
 from .socket_status import ZeroMQSocketStatus
+from .load_monitor import ZeroMQLoadMonitor
+from .context_manager import ZeroMQContextManager
+from ..helpers.log_sink import ZeroMQLogRateLimiter
 
 from ..helpers.utils import *
 
@@ -19,7 +23,7 @@ from ..helpers.utils import *
 class ZeroMQBase(threading.Thread):
     def __init__(self, config_file: str, connection: ZeroMQConnection, node_type: ZeroMQNodeType,
                  handle_message: Callable[[dict], Any] = None, context: Optional[zmq.Context] = None,
-                 heartbeat_config: Optional[ZeroMQHeartbeatConfig] = None):
+                 heartbeat_config: Optional[ZeroMQHeartbeatConfig] = None, threaded_monitor: bool = True):
         threading.Thread.__init__(self)
         self.config_file = config_file
 
@@ -27,27 +31,32 @@ class ZeroMQBase(threading.Thread):
         self.connection = connection
         self.handle_message = handle_message
         self.shutdown_requested = False
-        self.context = context or zmq.Context()
+        # nodes share the process wide context by default, a context given by the caller is left to the caller
+        self._shared_context = context is None
+        self.context = ZeroMQContextManager.acquire() if self._shared_context else context
         self.node_type = node_type
         self._is_connected = threading.Event()
         self._is_connected_timeout = 2  # in seconds
         self.poller = zmq.Poller()
         self.poller_timeout = 1000  # milliseconds
+        self.log_limiter = ZeroMQLogRateLimiter()  # for the logs of the message loops, see ZeroMQLogRateLimiter
         self.socket_status = ZeroMQSocketStatus.CLOSED
 
         self.node_id = self.load_or_generate_node_id()
         self.session_id = get_uuid_hex(16)
         self.socket = self.context.socket(self.get_socket_type())
         self.socket.setsockopt(zmq.IDENTITY, self.get_socket_identity())
+        self.connection.apply_socket_options(self.socket)
         self.socket_monitor = ZeroMQSocketMonitor(self.context, self.socket,
                                                   on_socket_closed_callback=self.socket_closed_callback,
                                                   on_socket_connect_callback=self.socket_connect_callback,
-                                                  on_socket_disconnect_callback=self.socket_disconnect_callback)
-        self.socket_monitor.start()
+                                                  on_socket_disconnect_callback=self.socket_disconnect_callback,
+                                                  threaded=threaded_monitor)  # started by start_socket_monitor
 
         self.heartbeat_config = heartbeat_config
         self.heartbeat_enabled = heartbeat_config is not None
-        self.heartbeat = self.init_heartbeat()
+        self.load_monitor = ZeroMQLoadMonitor() if self.heartbeat_enabled and heartbeat_config.report_load else None
+        self._heartbeat = None  # created on first use, see the heartbeat property
 
         signal.signal(signal.SIGINT, self.request_shutdown)
         signal.signal(signal.SIGTERM, self.request_shutdown)
@@ -64,6 +73,10 @@ class ZeroMQBase(threading.Thread):
             return zmq.REQ
         elif self.node_type == ZeroMQNodeType.ROUTER:
             return zmq.ROUTER
+        elif self.node_type == ZeroMQNodeType.PRODUCER:
+            return zmq.PUSH
+        elif self.node_type in {ZeroMQNodeType.PIPELINE_WORKER, ZeroMQNodeType.SINK}:
+            return zmq.PULL
         else:
             raise ValueError(f"Unknown node type: {self.node_type}")
 
@@ -88,6 +101,7 @@ class ZeroMQBase(threading.Thread):
         self.socket = self.context.socket(self.get_socket_type())
         logger.debug("New socket created")
         self.socket.setsockopt(zmq.IDENTITY, self.get_socket_identity())
+        self.connection.apply_socket_options(self.socket)
         logger.debug(f"New socket created st identity {self.get_socket_identity()}")
         self.socket_monitor.reset_socket(self.socket)
         self.socket_requires_reset = False
@@ -102,18 +116,47 @@ class ZeroMQBase(threading.Thread):
             f"heartbeat timeout: {self.heartbeat_config.timeout if self.heartbeat_enabled else 'N/A'}, "
             f"heartbeat max missed: {self.heartbeat_config.max_missed if self.heartbeat_enabled else 'N/A'}")
 
+    @property
+    def heartbeat(self):
+        """The heartbeat sender or receiver of the node (None if disabled), created on first use."""
+        if self._heartbeat is None and self.heartbeat_enabled:
+            self._heartbeat = self.init_heartbeat()
+        return self._heartbeat
+
+    def start_socket_monitor(self):
+        """
+        Start monitoring the node socket. To be called before the socket connects or binds, so the connection events
+        are captured. Deferred to that point so creating a node stays cheap, calling it again does nothing.
+
+        :return: None
+        """
+        self.socket_monitor.start()
+
     def init_heartbeat(self):
         if self.heartbeat_enabled:
-            # workers and client always send heartbeat
-            if self.node_type in {ZeroMQNodeType.WORKER, ZeroMQNodeType.CLIENT}:
-                return ZeroMQHeartbeatSender(context=self.context, node_id=self.node_id, session_id=self.session_id,
-                                             node_type=self.node_type, config=self.heartbeat_config)
+            # workers, clients and pipeline nodes always send heartbeat
+            if self.node_type in {ZeroMQNodeType.WORKER, ZeroMQNodeType.CLIENT, ZeroMQNodeType.PRODUCER,
+                                  ZeroMQNodeType.PIPELINE_WORKER, ZeroMQNodeType.SINK}:
+                return self.create_heartbeat_sender(self.heartbeat_config, self.connection)
             # Routers and servers always receive heartbeats
             elif self.node_type in {ZeroMQNodeType.SERVER, ZeroMQNodeType.ROUTER}:
                 return ZeroMQHeartbeatReceiver(context=self.context, node_id=self.node_id, session_id=self.session_id,
                                                node_type=self.node_type, config=self.heartbeat_config)
         return None
 
+    def create_heartbeat_sender(self, config: ZeroMQHeartbeatConfig, connection: ZeroMQConnection):
+        """
+        Create a heartbeat sender announcing this node.
+
+        :param config: The heartbeat configuration of the receiving node.
+        :param connection: The connection this node uses to reach the receiving node, announced as its endpoint.
+        :return: The heartbeat sender.
+        """
+        return ZeroMQHeartbeatSender(context=self.context, node_id=self.node_id, session_id=self.session_id,
+                                     node_type=self.node_type, config=config,
+                                     endpoint=connection.get_connection_string(bind=False),
+                                     load_provider=self.load_monitor.snapshot if self.load_monitor else None)
+
     def is_connected(self):
         return self._is_connected.is_set()
 
@@ -134,7 +177,7 @@ class ZeroMQBase(threading.Thread):
         """
         self._is_connected.set()
         self.socket_status = ZeroMQSocketStatus.CONNECTED
-        logger.debug(f"{self.node_type.value}: socket connection established")
+        logger.debug("{}: socket connection established", self.node_type.value)
 
     def socket_disconnect_callback(self):
         """
@@ -146,7 +189,7 @@ class ZeroMQBase(threading.Thread):
         """
         self._is_connected.clear()
         self.socket_status = ZeroMQSocketStatus.DISCONNECTED
-        logger.debug(f"{self.node_type.value}: socket disconnected")
+        logger.debug("{}: socket disconnected", self.node_type.value)
 
     def socket_closed_callback(self):
         """
@@ -157,7 +200,7 @@ class ZeroMQBase(threading.Thread):
         """
         self._is_connected.clear()
         self.socket_status = ZeroMQSocketStatus.CLOSED
-        logger.debug(f"{self.node_type.value}: socket closed")
+        logger.debug("{}: socket closed", self.node_type.value)
 
     def wait_for_connection(self, timeout: float = None):
         """
@@ -173,7 +216,18 @@ class ZeroMQBase(threading.Thread):
         if timeout is None:
             timeout = self._is_connected_timeout
 
-        if not self._is_connected.wait(timeout=timeout):
+        if self.connection.protocol == ZeroMQProtocol.INPROC and not self._is_connected.is_set():
+            # inproc connections report no monitor events, the socket is usable as soon as connect returned (messages
+            # are queued until the peer binds)
+            self.socket_connect_callback()
+
+        if not self.socket_monitor.threaded:
+            # the monitor events are processed on this thread, wait for them here
+            deadline = time.monotonic() + timeout
+            while not self._is_connected.is_set() and time.monotonic() < deadline:
+                self.socket_monitor.wait_for_events(int((deadline - time.monotonic()) * 1000) + 1)
+
+        if not self._is_connected.wait(timeout=timeout if self.socket_monitor.threaded else 0):
             logger.debug(f"Wait for connection timed out for node {self.node_id} after "
                          f"{self._is_connected_timeout} seconds")
             return False
@@ -183,21 +237,12 @@ class ZeroMQBase(threading.Thread):
         """
         Loads the node_id from the configuration file if it exists,
         otherwise generates a new node_id and saves it in the configuration file.
+        The id is read once per process and configuration section, see get_node_id.
 
         :return: The loaded or generated node_id
         :rtype: str
         """
-        try:
-            config = load_config(self.config_file, self.node_type.value.lower())
-            node_id = config.get('node_id')
-            if not node_id:
-                raise ValueError("node_id is empty in the configuration file.")
-        except ValueError:
-            logger.warning("node_id is empty in the configuration file.")
-            node_id = get_uuid_hex()
-            save_config(self.config_file, self.node_type.value.lower(), 'node_id', node_id)
-            logger.warning(f"New node id ({node_id}) is generated and saved in the config under node_id")
-        return node_id
+        return get_node_id(self.config_file, self.node_type.value.lower())
 
     def request_shutdown(self, signum, frame):
         logger.warning(f"Received signal {signum}, shutting down gracefully...")
@@ -216,7 +261,7 @@ class ZeroMQBase(threading.Thread):
     def cleanup(self):
         """
         Perform cleanup by stopping the socket monitor, stopping the heartbeat, closing the socket,
-        terminating the context, and logging the cleanup completion.
+        releasing the shared context (terminated by its last node), and logging the cleanup completion.
         If you are going to add more connections, working threads, etc...
         make sure the cleanup the resources in order.
         For example, you can't terminate the context before closing the socket, duh!!
@@ -229,13 +274,14 @@ class ZeroMQBase(threading.Thread):
             self.poller.unregister(socket)
         if self.socket_monitor:
             self.socket_monitor.stop()
-        if self.heartbeat:
+        if self._heartbeat:
             logger.debug(f"{self.node_type.value} is calling stop heartbeat...")
-            self.heartbeat.stop()  # Ensure heartbeat thread is stopped
+            self._heartbeat.stop()  # Ensure heartbeat thread is stopped
         if self.socket:
             logger.debug(f"{self.node_type.value} is closing socket...")
             self.socket.close()  # Close the socket
 
-        logger.debug(f"{self.node_type.value} is terminating context...")
-        self.context.term()  # Terminate the context
+        if self._shared_context:
+            logger.debug("{} is releasing the shared context...", self.node_type.value)
+            ZeroMQContextManager.release(self.context)  # terminated once no node uses it
         logger.debug("Cleanup complete.")
@@ -0,0 +1,190 @@
+import time
+import zlib
+from enum import Enum
+from typing import Optional, Tuple
+
+from loguru import logger
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional dependency
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+class ZeroMQCompressionCodec(Enum):
+    ZLIB = "zlib"
+    LZ4 = "lz4"
+    ZSTD = "zstd"
+
+
+def is_codec_available(codec: ZeroMQCompressionCodec) -> bool:
+    if codec == ZeroMQCompressionCodec.LZ4:
+        return lz4_frame is not None
+    if codec == ZeroMQCompressionCodec.ZSTD:
+        return zstandard is not None
+    return True  # zlib is part of the standard library
+
+
+def get_dictionary_id(dictionary: bytes) -> int:
+    """
+    Identify a shared dictionary, so a receiver with a different dictionary fails instead of decoding garbage.
+
+    :param dictionary: The dictionary content.
+    :return: The CRC32 of the dictionary.
+    """
+    return zlib.crc32(dictionary)
+
+
+class ZeroMQCompression:
+    """
+    Opt-in payload compression attached to a ZeroMQConnection.
+
+    Payloads smaller than ``min_size`` bytes are sent as-is. Compressed payloads are marked in the metadata frame
+    with the codec (and dictionary id) used, so a receiver can decode them whatever its own configuration is.
+    A receiver only needs a ZeroMQCompression object to use a shared dictionary and to collect the counters.
+
+    The counters are not synchronised, they are approximate if the connection is shared between threads.
+    """
+
+    def __init__(self, codec: Optional[ZeroMQCompressionCodec] = None, min_size: int = 1024,
+                 level: Optional[int] = None, dictionary: Optional[bytes] = None):
+        """
+        :param codec: The codec to use. If not specified, the best available codec is used (zstd, lz4 then zlib).
+        :param min_size: Payloads smaller than this (in bytes) are not compressed.
+        :param level: The codec compression level. If not specified, the codec default is used.
+        :param dictionary: Optional shared dictionary (zlib and zstd only), helps with small repetitive messages.
+                           Both ends must use the same dictionary.
+        :raises ValueError: If the codec is not installed or does not support dictionaries.
+        """
+        if codec is None:
+            codec = next(c for c in (ZeroMQCompressionCodec.ZSTD, ZeroMQCompressionCodec.LZ4,
+                                      ZeroMQCompressionCodec.ZLIB) if is_codec_available(c))
+        if not is_codec_available(codec):
+            raise ValueError(f"Compression codec {codec.value} is not installed.")
+        if dictionary and codec == ZeroMQCompressionCodec.LZ4:
+            raise ValueError("Shared dictionaries are only supported by the zlib and zstd codecs.")
+
+        self.codec = codec
+        self.min_size = min_size
+        self.level = level
+        self.dictionary = dictionary
+        self.dictionary_id = get_dictionary_id(dictionary) if dictionary else None
+        self._zstd_dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary and zstandard else None
+
+        # counters
+        self.messages_compressed = 0
+        self.messages_skipped = 0
+        self.messages_decompressed = 0
+        self.bytes_in = 0  # uncompressed size of the compressed messages
+        self.bytes_out = 0  # compressed size of the compressed messages
+        self.compress_seconds = 0.0
+        self.decompress_seconds = 0.0
+
+        logger.debug(f"Compression enabled: codec = {self.codec.value}, min_size = {self.min_size}, "
+                     f"dictionary id = {self.dictionary_id}")
+
+    def compress(self, data: bytes) -> Tuple[bytes, Optional[dict]]:
+        """
+        Compress the payload if it is large enough.
+
+        :param data: The payload.
+        :return: The (possibly) compressed payload and the metadata describing the compression, or None if the
+                 payload was not compressed.
+        """
+        if len(data) < self.min_size:
+            self.messages_skipped += 1
+            return data, None
+
+        start = time.perf_counter()
+        if self.codec == ZeroMQCompressionCodec.ZLIB:
+            level = self.level if self.level is not None else zlib.Z_DEFAULT_COMPRESSION
+            if self.dictionary:
+                compressor = zlib.compressobj(level, zdict=self.dictionary)
+                compressed = compressor.compress(data) + compressor.flush()
+            else:
+                compressed = zlib.compress(data, level)
+        elif self.codec == ZeroMQCompressionCodec.LZ4:
+            compressed = lz4_frame.compress(data, compression_level=self.level or 0)
+        else:
+            compressed = zstandard.ZstdCompressor(level=self.level if self.level is not None else 3,
+                                                  dict_data=self._zstd_dictionary).compress(data)
+        self.compress_seconds += time.perf_counter() - start
+
+        if len(compressed) >= len(data):  # not worth it, send as-is
+            self.messages_skipped += 1
+            return data, None
+
+        self.messages_compressed += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+        metadata = {"compression": self.codec.value}
+        if self.dictionary_id is not None:
+            metadata["dict"] = self.dictionary_id
+        return compressed, metadata
+
+    def decompress(self, data: bytes, metadata: dict) -> bytes:
+        """
+        Decompress a payload and update the counters.
+
+        :param data: The compressed payload.
+        :param metadata: The message metadata.
+        :return: The decompressed payload.
+        """
+        start = time.perf_counter()
+        decompressed = decompress_payload(data, metadata, self)
+        self.decompress_seconds += time.perf_counter() - start
+        self.messages_decompressed += 1
+        return decompressed
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def get_stats(self) -> dict:
+        return {
+            "codec": self.codec.value,
+            "messages_compressed": self.messages_compressed,
+            "messages_skipped": self.messages_skipped,
+            "messages_decompressed": self.messages_decompressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_saved,
+            "compress_seconds": self.compress_seconds,
+            "decompress_seconds": self.decompress_seconds,
+        }
+
+
+def decompress_payload(data: bytes, metadata: dict, compression: Optional[ZeroMQCompression] = None) -> bytes:
+    """
+    Decompress a payload marked as compressed in the message metadata.
+
+    :param data: The compressed payload.
+    :param metadata: The message metadata holding the codec and dictionary id.
+    :param compression: The receiver compression settings, required only if a shared dictionary was used.
+    :return: The decompressed payload.
+    :raises ValueError: If the codec is not installed or the shared dictionary does not match.
+    """
+    codec = ZeroMQCompressionCodec(metadata["compression"])
+    if not is_codec_available(codec):
+        raise ValueError(f"Received a payload compressed with {codec.value} which is not installed.")
+
+    dictionary = None
+    if "dict" in metadata:
+        if compression is None or compression.dictionary_id != metadata["dict"]:
+            raise ValueError(f"Received a payload compressed with the unknown dictionary {metadata['dict']}.")
+        dictionary = compression.dictionary
+
+    if codec == ZeroMQCompressionCodec.ZLIB:
+        if dictionary:
+            decompressor = zlib.decompressobj(zdict=dictionary)
+            return decompressor.decompress(data) + decompressor.flush()
+        return zlib.decompress(data)
+    if codec == ZeroMQCompressionCodec.LZ4:
+        return lz4_frame.decompress(data)
+    zstd_dictionary = compression._zstd_dictionary if dictionary else None
+    return zstandard.ZstdDecompressor(dict_data=zstd_dictionary).decompress(data)
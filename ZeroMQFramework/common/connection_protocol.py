@@ -1,7 +1,12 @@
 from enum import Enum
-from typing import Optional
+from typing import Optional, Union
 from abc import ABC, abstractmethod
+
+import zmq
 from loguru import logger
+from ZeroMQFramework.common.compression import ZeroMQCompression
+from ZeroMQFramework.common.socket_profile import ZeroMQSocketProfile
+from ZeroMQFramework.common.shared_memory import ZeroMQSharedMemoryPool
 
 
 class ZeroMQProtocol(Enum):
@@ -11,8 +16,40 @@ class ZeroMQProtocol(Enum):
 
 
 class ZeroMQConnection(ABC):
-    def __init__(self, protocol: ZeroMQProtocol):
+    def __init__(self, protocol: ZeroMQProtocol, compression: Optional[ZeroMQCompression] = None, affinity: int = 0,
+                 socket_profile: Optional[Union[ZeroMQSocketProfile, str]] = None):
         self.protocol = protocol
+        self.compression = compression  # opt-in payload compression, None to disable
+        # bitmask of the context I/O threads serving the sockets of this connection (ZMQ_AFFINITY), 0 for any. Only
+        # useful with several I/O threads, see ZeroMQContextManager.configure
+        self.affinity = affinity
+        # socket options (HWM, buffers, keepalive...) of the sockets of this connection, a profile or a preset name.
+        # Assigning a new profile applies it to the sockets created afterwards (a reconnection for example)
+        self.socket_profile = (ZeroMQSocketProfile.get(socket_profile) if isinstance(socket_profile, str)
+                               else socket_profile)
+        self.pass_objects = False  # send messages by reference, in-process connections only
+        self.shared_memory = None  # offload large payloads to shared memory, same host connections only
+
+    def apply_socket_options(self, socket: zmq.Socket):
+        """
+        Apply the affinity and the socket profile of this connection to a socket using it, before it connects or binds.
+
+        :param socket: The socket.
+        :return: None
+        """
+        if self.affinity:
+            socket.setsockopt(zmq.AFFINITY, self.affinity)
+        if self.socket_profile is not None:
+            self.socket_profile.apply(socket)
+
+    def get_socket_option(self, name: str, default=None):
+        """
+        :param name: A ZeroMQSocketProfile option name, such as "rcvhwm".
+        :param default: The value if the connection has no profile or the profile does not set the option.
+        :return: The value of the option.
+        """
+        value = getattr(self.socket_profile, name, None)
+        return default if value is None else value
 
     @abstractmethod
     def get_connection_string(self, bind: bool) -> str:
@@ -20,8 +57,10 @@ class ZeroMQConnection(ABC):
 
 
 class ZeroMQTCPConnection(ZeroMQConnection):
-    def __init__(self, port: int, host: Optional[str] = "localhost"):
-        super().__init__(ZeroMQProtocol.TCP)
+    def __init__(self, port: int, host: Optional[str] = "localhost",
+                 compression: Optional[ZeroMQCompression] = None, affinity: int = 0,
+                 socket_profile: Optional[Union[ZeroMQSocketProfile, str]] = None):
+        super().__init__(ZeroMQProtocol.TCP, compression, affinity, socket_profile)
         if port is None:
             raise ValueError("Port must be specified for TCP protocol.")
         if host is None:
@@ -38,22 +77,32 @@ class ZeroMQTCPConnection(ZeroMQConnection):
 
 
 class ZeroMQIPCConnection(ZeroMQConnection):
-    def __init__(self, ipc_path: str):
-        super().__init__(ZeroMQProtocol.IPC)
+    def __init__(self, ipc_path: str, compression: Optional[ZeroMQCompression] = None, affinity: int = 0,
+                 socket_profile: Optional[Union[ZeroMQSocketProfile, str]] = None,
+                 shared_memory: Optional[ZeroMQSharedMemoryPool] = None):
+        super().__init__(ZeroMQProtocol.IPC, compression, affinity, socket_profile)
         if not ipc_path:
             raise ValueError("IPC path must be specified for IPC protocol. Example: '/tmp/zmq.ipc'")
         self.ipc_path = ipc_path
+        # Claim-check: payloads above the pool threshold are written once to shared memory and only a handle is sent
+        # through the sockets (and the router), see ZeroMQSharedMemoryPool
+        self.shared_memory = shared_memory
 
     def get_connection_string(self, bind: bool) -> str:
         return f"ipc://{self.ipc_path}"
 
 
 class ZeroMQINPROCConnection(ZeroMQConnection):
-    def __init__(self, identifier: str):
-        super().__init__(ZeroMQProtocol.INPROC)
+    def __init__(self, identifier: str, compression: Optional[ZeroMQCompression] = None, affinity: int = 0,
+                 socket_profile: Optional[Union[ZeroMQSocketProfile, str]] = None, pass_objects: bool = False):
+        super().__init__(ZeroMQProtocol.INPROC, compression, affinity, socket_profile)
         if not identifier:
             raise ValueError("A unique identifier must be specified for INPROC protocol. Example: 'thread1'")
         self.identifier = identifier
+        # Fast path: the messages sent through this connection pass the Python objects by reference (see
+        # ZeroMQObjectRegistry) instead of serializing them, the handlers get the objects sent. Only if every node on
+        # the path (a router too) runs in this process, the messages are not compressed
+        self.pass_objects = pass_objects
 
     def get_connection_string(self, bind: bool) -> str:
         return f"inproc://{self.identifier}"
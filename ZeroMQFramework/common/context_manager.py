@@ -0,0 +1,119 @@
+import threading
+from typing import Optional
+
+import zmq
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class ZeroMQContextManager:
+    """
+    Process wide ZeroMQ context, shared by the nodes that are not given a context.
+
+    A context owns the I/O threads, so a process with many nodes (hundreds of clients for example) runs a single set
+    of I/O threads instead of one per node, and inproc connections work between any two nodes of the process. The
+    context is reference counted: every node acquires it and releases it during cleanup, the last release terminates
+    it. A later acquire creates a new context with the same settings.
+
+    The settings only apply to a new context, call configure() before creating the first node::
+
+        ZeroMQContextManager.configure(io_threads=4, max_sockets=4096)
+
+    Every node opens several sockets (a client has its request socket plus its heartbeat and hedge sockets, for
+    example), so the libzmq default of 1023 sockets per context is reached with a few hundred nodes, and creating a
+    socket then fails with "Too many open files". Unless max_sockets is given, the limit is set to the open files limit
+    of the process (RLIMIT_NOFILE, capped by ZMQ_SOCKET_LIMIT), which also bounds the sockets in practice: raise it
+    (ulimit -n) for more nodes.
+    """
+    _lock = threading.Lock()
+    _context: Optional[zmq.Context] = None
+    _references = 0
+    _io_threads = 1
+    _max_sockets: Optional[int] = None
+
+    @classmethod
+    def configure(cls, io_threads: int = 1, max_sockets: Optional[int] = None):
+        """
+        Set the options of the shared context.
+
+        :param io_threads: Number of I/O threads (ZMQ_IO_THREADS). One I/O thread handles about a gigabyte of data per
+                           second, use the socket affinity (see ZeroMQConnection) to spread sockets over them.
+        :param max_sockets: Maximum number of sockets (ZMQ_MAX_SOCKETS). If None, the open files limit of the process
+                            (see get_default_max_sockets).
+        :return: None
+        :raises RuntimeError: If the shared context is already in use.
+        """
+        with cls._lock:
+            if cls._context is not None:
+                raise RuntimeError("The shared context is in use, configure it before creating the first node")
+            cls._io_threads = io_threads
+            cls._max_sockets = max_sockets
+
+    @classmethod
+    def acquire(cls) -> zmq.Context:
+        """
+        Get the shared context, creating it if needed, and add a reference to it.
+
+        :return: The shared context.
+        """
+        with cls._lock:
+            if cls._context is None:
+                context = zmq.Context(io_threads=cls._io_threads)
+                max_sockets = cls._max_sockets if cls._max_sockets is not None else cls.get_default_max_sockets(context)
+                if max_sockets is not None:
+                    context.set(zmq.MAX_SOCKETS, max_sockets)
+                cls._context = context
+                logger.debug("Shared context created: io_threads = {}, max_sockets = {}", cls._io_threads,
+                             context.get(zmq.MAX_SOCKETS))
+            cls._references += 1
+            return cls._context
+
+    @staticmethod
+    def get_default_max_sockets(context: zmq.Context) -> Optional[int]:
+        """
+        :param context: The context, for its ZMQ_SOCKET_LIMIT.
+        :return: The soft open files limit of the process (RLIMIT_NOFILE) capped by the largest socket limit libzmq
+                 accepts, or None (the libzmq default) if the limit is unknown or lower than the default.
+        """
+        if resource is None:
+            return None
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        socket_limit = context.get(zmq.SOCKET_LIMIT)
+        if soft_limit == resource.RLIM_INFINITY:
+            return socket_limit
+        max_sockets = min(soft_limit, socket_limit)
+        return max_sockets if max_sockets > context.get(zmq.MAX_SOCKETS) else None
+
+    @classmethod
+    def release(cls, context: zmq.Context) -> bool:
+        """
+        Remove a reference to the shared context, terminating it with the last one. All the sockets of the releasing
+        node must be closed first.
+
+        :param context: The context acquired.
+        :return: True if the context was the shared context, False otherwise (nothing is done).
+        """
+        with cls._lock:
+            if context is not cls._context:
+                return False
+            cls._references -= 1
+            if cls._references > 0:
+                return True
+            cls._context = None
+        logger.debug("Shared context released by its last node, terminating it")
+        context.term()
+        return True
+
+    @classmethod
+    def is_shared(cls, context: zmq.Context) -> bool:
+        """:return: True if the context is the shared context."""
+        return context is not None and context is cls._context
+
+    @classmethod
+    def get_references(cls) -> int:
+        """:return: The number of nodes using the shared context."""
+        return cls._references
@@ -3,5 +3,9 @@ from enum import Enum
 
 class ZeroMQEvent(Enum):
     HEARTBEAT = "heartbeat"
+    HEARTBEAT_BINARY = "heartbeat_binary"  # struct-packed node info, see heartbeat.wire_format
     MESSAGE = "message"
     RESPONSE = "response"
+    MEMBERSHIP = "membership"  # answered by the router from its membership registry
+    STREAM_CREDIT = "stream_credit"  # chunks a client grants to the worker producing its stream, see stream_message
+    PROFILE = "profile"  # answered by the worker profiler, opens or closes a profiling window
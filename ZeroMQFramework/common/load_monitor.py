@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import psutil
+except ImportError:  # optional dependency, /proc is used instead on Linux
+    psutil = None
+
+
+class ZeroMQLoadMonitor:
+    """
+    Collects the load metrics a node reports in its heartbeats: requests in flight, backlog, recent handler latency
+    percentiles, CPU usage and resident memory.
+
+    The handler latencies are kept in a bounded window. The backlog is an estimate: the number of messages handled in
+    a row while more messages were already waiting on the socket.
+    """
+
+    def __init__(self, window_size: int = 1000):
+        self.in_flight = 0
+        self.queue_length = 0
+        self.latencies = deque(maxlen=window_size)  # handler latencies in ms
+        self.lock = threading.Lock()
+        self._last_cpu_time = self._get_cpu_time()
+        self._last_wall_time = time.monotonic()
+
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def request_finished(self, latency: float):
+        """
+        :param latency: The handler latency in milliseconds.
+        """
+        with self.lock:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+
+    def snapshot(self) -> dict:
+        """
+        Compact load report sent in the heartbeats. The CPU usage is averaged since the previous snapshot.
+
+        :return: A dict with the keys inflight, queue, p50, p99 (ms), cpu (percent of one core) and rss (bytes).
+        """
+        with self.lock:
+            ordered = sorted(self.latencies)
+            in_flight = self.in_flight
+            queue_length = self.queue_length
+
+        cpu_time = self._get_cpu_time()
+        wall_time = time.monotonic()
+        cpu = 100 * (cpu_time - self._last_cpu_time) / max(wall_time - self._last_wall_time, 1e-6)
+        self._last_cpu_time, self._last_wall_time = cpu_time, wall_time
+
+        return {
+            "inflight": in_flight,
+            "queue": queue_length,
+            "p50": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3) if ordered else None,
+            "cpu": round(cpu, 1),
+            "rss": self._get_rss(),
+        }
+
+    @staticmethod
+    def _get_cpu_time() -> float:
+        times = os.times()
+        return times.user + times.system
+
+    @staticmethod
+    def _get_rss() -> int:
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
@@ -6,4 +6,7 @@ class ZeroMQNodeType(Enum):
     WORKER = "worker"
     CLIENT = "client"
     SERVER = "server"
+    PRODUCER = "producer"
+    PIPELINE_WORKER = "pipeline_worker"
+    SINK = "sink"
     UNDEFINED = "undefined"
@@ -0,0 +1,107 @@
+import itertools
+import struct
+import threading
+import time
+from typing import Any
+
+# Third frame of a message passed by reference, instead of the JSON metadata: [event name, token, OBJECT_REF]
+OBJECT_REF = b'\x00ref'
+_TOKEN = struct.Struct("!Q")
+
+
+class ZeroMQObjectRegistry:
+    """
+    Objects in flight between the nodes of a process, keyed by a small token frame.
+
+    For in-process connections (see ZeroMQINPROCConnection pass_objects) the event data and metadata are stored here and
+    only the token goes through libzmq, so a message is neither serialized nor copied. An object is removed once read
+    as many times as it was sent (see retain), and after ``ttl`` seconds if never read (a lost message or a late reply
+    dropped by the client), so a lost message cannot leak memory forever.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        """
+        :param ttl: Seconds an object is kept if not read.
+        """
+        self.ttl = ttl
+        self.objects = {}  # token -> [object, pending reads, expiry], in insertion order
+        self.lock = threading.Lock()
+        self.expired = 0
+        self._counter = itertools.count(1)
+
+    def put(self, obj: Any) -> bytes:
+        """
+        :param obj: The object to pass.
+        :return: Its token.
+        """
+        token = _TOKEN.pack(next(self._counter))
+        now = time.monotonic()
+        with self.lock:
+            self.objects[token] = [obj, 1, now + self.ttl]
+            self._expire(now)
+        return token
+
+    def retain(self, token: bytes):
+        """
+        Expect one more read of an object, for a message sent again (a retry or a hedge).
+
+        :param token: The token.
+        :return: None
+        """
+        with self.lock:
+            entry = self.objects.get(token)
+            if entry is not None:
+                entry[1] += 1
+                entry[2] = time.monotonic() + self.ttl
+
+    def take(self, token: bytes) -> Any:
+        """
+        Read an object, removing it after its last expected read.
+
+        :param token: The token.
+        :return: The object.
+        :raises KeyError: If there is no object for this token (already read, expired, or from another process).
+        """
+        with self.lock:
+            entry = self.objects[token]
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.objects[token]
+        return entry[0]
+
+    def peek(self, token: bytes) -> Any:
+        """
+        Read an object without counting the read, for the nodes forwarding the message such as a router.
+
+        :param token: The token.
+        :return: The object.
+        :raises KeyError: If there is no object for this token.
+        """
+        return self.objects[token][0]
+
+    def _expire(self, now: float):
+        # the oldest objects come first, stop at the first one still valid
+        while self.objects:
+            token = next(iter(self.objects))
+            if self.objects[token][2] > now:
+                break
+            del self.objects[token]
+            self.expired += 1
+
+    def __len__(self):
+        return len(self.objects)
+
+
+object_registry = ZeroMQObjectRegistry()  # shared by every node of the process
+
+
+def retain_message(message: list):
+    """
+    Expect one more read of a message passed by reference, to be called before sending it again. Does nothing for a
+    serialized message.
+
+    :param message: The frames.
+    :return: None
+    """
+    if message[-1] == OBJECT_REF:
+        object_registry.retain(message[-2])
@@ -0,0 +1,154 @@
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+# tmpfs on Linux, the segments never touch a disk
+DEFAULT_DIRECTORY = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+_SEGMENT_NAME = re.compile(r"zmqfw-[0-9a-f]{32}")
+
+
+class ZeroMQSharedMemoryPool:
+    """
+    Claim-check offload of large payloads between processes of the same host (see ZeroMQIPCConnection).
+
+    A payload (after serialization and compression) of at least ``threshold`` bytes is written once to a shared memory
+    segment, a file of a tmpfs directory, and only the segment name travels through the sockets and the router, in the
+    message metadata. The receiver maps the segment and decodes the payload straight from the mapping, then deletes the
+    segment. The segments of a client request are kept until the reply is received instead (see release_message), as
+    the request may be sent again (retry, hedge). Segments never read, such as for lost messages, are deleted by the
+    pool that wrote them after ``ttl`` seconds.
+    """
+
+    def __init__(self, threshold: int = 1024 * 1024, directory: Optional[str] = None, ttl: float = 60.0):
+        """
+        :param threshold: Minimum payload size in bytes to offload, smaller payloads go through the sockets.
+        :param directory: Directory of the segments, identical for the senders and the receivers. /dev/shm if it
+                          exists, the temporary directory otherwise.
+        :param ttl: Seconds after which a segment written by this pool is deleted even if not read.
+        """
+        self.threshold = max(1, threshold)
+        self.directory = directory or DEFAULT_DIRECTORY
+        self.ttl = ttl
+        self.segments = OrderedDict()  # name -> expiry, in creation order
+        self.lock = threading.Lock()
+        self.segments_written = 0
+        self.bytes_written = 0
+        self.segments_evicted = 0
+
+    def offload(self, payload: bytes, keep: bool = False) -> dict:
+        """
+        Write a payload to a new segment.
+
+        :param payload: The payload.
+        :param keep: The receivers leave the segment in place, the sender releases it.
+        :return: The metadata to send instead of the payload.
+        """
+        name = f"zmqfw-{uuid.uuid4().hex}"
+        descriptor = os.open(os.path.join(self.directory, name), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        with open(descriptor, "wb") as segment:
+            segment.write(payload)
+        now = time.monotonic()
+        with self.lock:
+            self.segments[name] = now + self.ttl
+            self.segments_written += 1
+            self.bytes_written += len(payload)
+            self._evict(now)
+        metadata = {"shm": name, "shm_size": len(payload)}
+        if keep:
+            metadata["shm_keep"] = True
+        return metadata
+
+    def release(self, name: str):
+        """
+        Delete a segment written by this pool.
+
+        :param name: The segment name.
+        :return: None
+        """
+        with self.lock:
+            self.segments.pop(name, None)
+        _unlink(self.directory, name)
+
+    def release_message(self, message: list):
+        """
+        Delete the segment of a message created with keep, once it cannot be sent again. Does nothing if the payload
+        of the message was not offloaded.
+
+        :param message: The frames.
+        :return: None
+        """
+        if len(message) < 3 or not message[-1].startswith(b'{'):
+            return
+        metadata = json.loads(message[-1])
+        if "shm" in metadata:
+            self.release(metadata["shm"])
+
+    def _evict(self, now: float):
+        while self.segments:
+            name = next(iter(self.segments))
+            if self.segments[name] > now:
+                break
+            del self.segments[name]
+            if _unlink(self.directory, name):
+                self.segments_evicted += 1
+                logger.debug("Shared memory segment {} evicted, never read", name)
+
+    def close(self):
+        """Delete every segment written by this pool and not read yet."""
+        with self.lock:
+            names = list(self.segments)
+            self.segments.clear()
+        for name in names:
+            _unlink(self.directory, name)
+
+    def get_stats(self) -> dict:
+        return {
+            "segments_written": self.segments_written,
+            "bytes_written": self.bytes_written,
+            "segments_evicted": self.segments_evicted,
+            "segments_pending": len(self.segments),
+        }
+
+
+def _unlink(directory: str, name: str) -> bool:
+    try:
+        os.unlink(os.path.join(directory, name))
+        return True
+    except FileNotFoundError:  # already read (or evicted)
+        return False
+
+
+def open_shared_payload(metadata: dict, consume: bool = True, directory: Optional[str] = None) -> mmap.mmap:
+    """
+    Map the segment of an offloaded payload. The segment is deleted unless the sender keeps it or consume is False,
+    the mapping stays readable until closed.
+
+    :param metadata: The message metadata.
+    :param consume: False for a node forwarding the message, such as a router.
+    :param directory: The segment directory, DEFAULT_DIRECTORY if None.
+    :return: A read only mapping of the payload, to be closed by the caller.
+    :raises ValueError: If the segment name is invalid or the segment does not exist (already read, evicted or written
+                        on another host).
+    """
+    name = metadata["shm"]
+    if not isinstance(name, str) or not _SEGMENT_NAME.fullmatch(name):
+        raise ValueError(f"Invalid shared memory segment name {name!r}")
+    directory = directory or DEFAULT_DIRECTORY
+    try:
+        with open(os.path.join(directory, name), "rb") as segment:
+            mapping = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        raise ValueError(f"Shared memory segment {name} not found. Already read, evicted, or written on another host "
+                         f"(the shared memory offload needs the sender and the receiver on the same host)")
+    if consume and not metadata.get("shm_keep"):
+        _unlink(directory, name)
+    return mapping
@@ -1,6 +1,6 @@
 import zmq.utils.monitor
 import zmq
-from threading import Thread, Event, Lock
+from threading import Thread, Event
 from loguru import logger
 import atexit
 from ..helpers.utils import *
@@ -10,16 +10,21 @@ class ZeroMQSocketMonitor:
     _cleanup_registered = False
 
     def __init__(self, context: zmq.Context, socket: zmq.Socket, on_socket_closed_callback=None,
-                 on_socket_connect_callback=None, on_socket_disconnect_callback=None):
+                 on_socket_connect_callback=None, on_socket_disconnect_callback=None, threaded: bool = True):
+        """
+        :param threaded: Process the monitor events on a monitor thread. If False, the events are processed on the
+                         thread owning the socket when it calls drain_events() or wait_for_events(), so the socket
+                         state is only ever written by that thread and can be read without any locking.
+        """
+        self.threaded = threaded
         self.context = context
         self.socket = socket
         self.monitor_socket = None
         self.running_event = Event()
         self.reset_socket_event = Event()
         self.stop_warnings = Event()
-        self._is_connected = False
+        self._is_connected = False  # single writer (monitor thread or socket thread), plain reads are safe
         self.monitor_thread = None
-        self.lock = Lock()
         self.poller = zmq.Poller()
         self.poll_timeout = 500  # in ms
         self.on_socket_closed_callback = on_socket_closed_callback  # inform the main class about socket status
@@ -37,10 +42,12 @@ class ZeroMQSocketMonitor:
         :return: None
         """
         try:
-            if self.monitor_socket is None:  # avoid creating multiple threads
-                logger.info("starting monitor thread")
+            if self.monitor_socket is None:  # may already exist if the socket was reset before the monitor started
                 self.running_event.set()
                 self._initialize_monitor()
+            if self.threaded and self.monitor_thread is None:  # avoid creating multiple threads
+                logger.info("starting monitor thread")
+                self.running_event.set()
                 self.monitor_thread = Thread(target=self.monitor_events, daemon=True)
                 self.monitor_thread.start()
         except Exception as e:
@@ -66,7 +73,8 @@ class ZeroMQSocketMonitor:
         """
         logger.info("Resetting socket monitor")
         self.reset_socket_event.set()
-        time.sleep(self.poll_timeout / 1000)  # Convert to seconds, ensure poller finish its current polling
+        if self.monitor_thread is not None:
+            time.sleep(self.poll_timeout / 1000)  # Convert to seconds, ensure poller finish its current polling
         self.cleanup_monitor_socket()  # Ensure the old monitor socket is cleaned up
         self.socket = new_socket
         self._initialize_monitor()
@@ -112,34 +120,61 @@ class ZeroMQSocketMonitor:
 
             socks = dict(self.poller.poll(timeout=self.poll_timeout))  # ms
             if self.monitor_socket in socks:
-                try:
-                    event = self.monitor_socket.recv_multipart(flags=zmq.NOBLOCK)
-                    event_dict = zmq.utils.monitor.parse_monitor_message(event)
-                    event_type = event_dict['event']
-                    with self.lock:
-                        if event_type == zmq.EVENT_CONNECTED:
-                            self._is_connected = True
-                            logger.debug("socket connected")
-                            self.stop_warnings.clear()
-                            if self.on_socket_connect_callback:
-                                self.on_socket_connect_callback()
-                        elif event_type == zmq.EVENT_DISCONNECTED:
-                            self._is_connected = False
-                            logger.debug("socket disconnected")
-                            if self.on_socket_disconnect_callback:
-                                self.on_socket_disconnect_callback()
-                        elif event_type == zmq.EVENT_CLOSED:
-                            self._is_connected = False
-                            if not self.stop_warnings.is_set():
-                                logger.debug("socket closed. If the monitored socket is reinitialised, "
-                                             "make sure you call reset_socket() to set the new socket object")
-                                self.stop_warnings.set()  # to avoid repeated printing. Remove if not needed
-                            if self.on_socket_closed_callback:
-                                self.on_socket_closed_callback()
-                except zmq.error.Again:
-                    pass  # Handle non-blocking receive timeout
-                except Exception as e:
-                    logger.error(f"Socket monitor exception: {e}")
+                self._receive_event()
+
+    def drain_events(self) -> int:
+        """
+        Process the pending monitor events without blocking, on the calling thread. Used in non threaded mode by the
+        thread owning the monitored socket. It costs a single non-blocking check when there is no event.
+
+        :return: The number of events processed.
+        """
+        count = 0
+        while self.monitor_socket is not None and self.monitor_socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            self._receive_event()
+            count += 1
+        return count
+
+    def wait_for_events(self, timeout: int) -> int:
+        """
+        Wait up to timeout (ms) for monitor events and process them on the calling thread (non threaded mode).
+
+        :return: The number of events processed.
+        """
+        if self.monitor_socket is None or not self.monitor_socket.poll(timeout, zmq.POLLIN):
+            return 0
+        return self.drain_events()
+
+    def _receive_event(self):
+        try:
+            event = self.monitor_socket.recv_multipart(flags=zmq.NOBLOCK)
+            event_dict = zmq.utils.monitor.parse_monitor_message(event)
+            self._handle_event(event_dict['event'])
+        except zmq.error.Again:
+            pass  # Handle non-blocking receive timeout
+        except Exception as e:
+            logger.error(f"Socket monitor exception: {e}")
+
+    def _handle_event(self, event_type: int):
+        if event_type == zmq.EVENT_CONNECTED:
+            self._is_connected = True
+            logger.debug("socket connected")
+            self.stop_warnings.clear()
+            if self.on_socket_connect_callback:
+                self.on_socket_connect_callback()
+        elif event_type == zmq.EVENT_DISCONNECTED:
+            self._is_connected = False
+            logger.debug("socket disconnected")
+            if self.on_socket_disconnect_callback:
+                self.on_socket_disconnect_callback()
+        elif event_type == zmq.EVENT_CLOSED:
+            self._is_connected = False
+            if not self.stop_warnings.is_set():
+                logger.debug("socket closed. If the monitored socket is reinitialised, "
+                             "make sure you call reset_socket() to set the new socket object")
+                self.stop_warnings.set()  # to avoid repeated printing. Remove if not needed
+            if self.on_socket_closed_callback:
+                self.on_socket_closed_callback()
 
     def cleanup(self):
         self.running_event.clear()
@@ -149,9 +184,9 @@ class ZeroMQSocketMonitor:
                 logger.warning("Socket Monitor: Monitor thread did not terminate; may require forced shutdown.")
             self.monitor_thread = None
         self.cleanup_monitor_socket()
-        with self.lock:
-            self._is_connected = False
+        self._is_connected = False
 
     def is_connected(self):
-        with self.lock:
-            return self._is_connected
+        if not self.threaded:
+            self.drain_events()
+        return self._is_connected
@@ -0,0 +1,123 @@
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Optional
+
+import zmq
+
+from ZeroMQFramework.helpers.utils import load_config
+
+_SOCKET_OPTIONS = {
+    "sndhwm": zmq.SNDHWM,
+    "rcvhwm": zmq.RCVHWM,
+    "sndbuf": zmq.SNDBUF,
+    "rcvbuf": zmq.RCVBUF,
+    "tcp_keepalive": zmq.TCP_KEEPALIVE,
+    "tcp_keepalive_idle": zmq.TCP_KEEPALIVE_IDLE,
+    "tcp_keepalive_intvl": zmq.TCP_KEEPALIVE_INTVL,
+    "tcp_keepalive_cnt": zmq.TCP_KEEPALIVE_CNT,
+    "immediate": zmq.IMMEDIATE,
+    "maxmsgsize": zmq.MAXMSGSIZE,
+    "router_mandatory": zmq.ROUTER_MANDATORY,
+}
+
+
+@dataclass(frozen=True)
+class ZeroMQSocketProfile:
+    """
+    A named set of socket options, applied to every socket created for a connection (see ZeroMQConnection). An option
+    left to None keeps the libzmq default, or the value set by the node itself.
+
+    Presets: ``low-latency`` (short queues, no queuing on pending connections, fast dead peer detection),
+    ``high-throughput`` (long queues and large kernel buffers) and ``large-payload`` (few messages queued, large
+    kernel buffers and a maximum message size). Use ``ZeroMQSocketProfile.get(name)`` or pass the name to the
+    connection, ``replace(profile, sndhwm=...)`` to adjust a preset, and ``from_config`` to read one from config.ini.
+    """
+    name: str = "default"
+    sndhwm: Optional[int] = None  # messages queued per peer before sending blocks or drops
+    rcvhwm: Optional[int] = None  # messages queued per peer before the peer stops reading
+    sndbuf: Optional[int] = None  # kernel send buffer, bytes
+    rcvbuf: Optional[int] = None  # kernel receive buffer, bytes
+    tcp_keepalive: Optional[bool] = None
+    tcp_keepalive_idle: Optional[int] = None  # seconds
+    tcp_keepalive_intvl: Optional[int] = None  # seconds
+    tcp_keepalive_cnt: Optional[int] = None
+    immediate: Optional[bool] = None  # only queue messages to completed connections
+    maxmsgsize: Optional[int] = None  # bytes, larger messages disconnect the peer
+    router_mandatory: Optional[bool] = None  # ROUTER sockets only, fail on unroutable messages instead of dropping
+
+    def get_options(self) -> Dict[int, int]:
+        """:return: The options set by the profile, as {zmq option: value}."""
+        options = {}
+        for name, option in _SOCKET_OPTIONS.items():
+            value = getattr(self, name)
+            if value is not None:
+                options[option] = int(value)
+        return options
+
+    def apply(self, socket: zmq.Socket):
+        """
+        Set the options of the profile on a socket. Most options only apply to the connections made after they are
+        set, so call it before the socket connects or binds.
+
+        :param socket: The socket.
+        :return: None
+        """
+        for option, value in self.get_options().items():
+            if option == zmq.ROUTER_MANDATORY and socket.socket_type != zmq.ROUTER:
+                continue
+            socket.setsockopt(option, value)
+
+    @classmethod
+    def get(cls, name: str) -> "ZeroMQSocketProfile":
+        """
+        :param name: A preset name.
+        :return: The preset.
+        :raises ValueError: If there is no such preset.
+        """
+        if name not in SOCKET_PROFILES:
+            raise ValueError(f"Unknown socket profile {name}, expected one of {sorted(SOCKET_PROFILES)}")
+        return SOCKET_PROFILES[name]
+
+    @classmethod
+    def from_config(cls, config_file: str, section: str = "socket_profile") -> "ZeroMQSocketProfile":
+        """
+        Read a profile from a configuration file section, a preset (``profile = high-throughput``) adjusted by the
+        options of the section. The file is read on every call, so calling it again reloads the profile::
+
+            [socket_profile]
+            profile = high-throughput
+            sndhwm = 50000
+            tcp_keepalive = true
+
+        :param config_file: The path to the configuration file.
+        :param section: The section name.
+        :return: The profile, named after the section.
+        :raises ValueError: If the section, the preset or an option is unknown.
+        """
+        config = load_config(config_file, section)
+        unknown = set(config) - {field.name for field in fields(cls)} - {"profile"} - set(config.parser.defaults())
+        if unknown:
+            raise ValueError(f"Unknown socket options {sorted(unknown)} in section {section}")
+        profile = cls.get(config.get("profile", "default"))
+        overrides = {}
+        for field in fields(cls):
+            if field.name == "name" or field.name not in config:
+                continue
+            if field.name in {"tcp_keepalive", "immediate", "router_mandatory"}:
+                overrides[field.name] = config.getboolean(field.name)
+            else:
+                overrides[field.name] = config.getint(field.name)
+        return replace(profile, name=section, **overrides)
+
+
+SOCKET_PROFILES = {
+    "default": ZeroMQSocketProfile(),
+    "low-latency": ZeroMQSocketProfile(name="low-latency", sndhwm=1000, rcvhwm=1000, immediate=True,
+                                       tcp_keepalive=True, tcp_keepalive_idle=10, tcp_keepalive_intvl=2,
+                                       tcp_keepalive_cnt=3),
+    "high-throughput": ZeroMQSocketProfile(name="high-throughput", sndhwm=100000, rcvhwm=100000,
+                                           sndbuf=4 * 1024 * 1024, rcvbuf=4 * 1024 * 1024, tcp_keepalive=True,
+                                           tcp_keepalive_idle=60),
+    "large-payload": ZeroMQSocketProfile(name="large-payload", sndhwm=100, rcvhwm=100, sndbuf=8 * 1024 * 1024,
+                                         rcvbuf=8 * 1024 * 1024, maxmsgsize=256 * 1024 * 1024, tcp_keepalive=True,
+                                         tcp_keepalive_idle=60),
+}
@@ -0,0 +1,292 @@
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from ZeroMQFramework.helpers.log_sink import ZeroMQBatchingLogSink
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional dependency
+    otel_trace = None
+
+TRACE_MARKER = b'"trace"'  # a metadata frame without it carries no trace context, checked before parsing JSON
+
+
+class ZeroMQSpan:
+    """
+    A timed operation of a node on a traced request (client, router or worker), exported once ended. Timestamps are
+    wall clock nanoseconds (time.time_ns) so the spans of different hosts can be compared, as in OpenTelemetry.
+    """
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "start_time", "end_time", "attributes", "events",
+                 "status")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_span_id: Optional[str] = None,
+                 start_time: Optional[int] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_span_id = parent_span_id
+        self.start_time = start_time or time.time_ns()
+        self.end_time = None
+        self.attributes = attributes or {}
+        self.events = []  # (name, time)
+        self.status = "ok"
+
+    @property
+    def traceparent(self) -> str:
+        """:return: The trace context of the span, in the W3C traceparent format (sampled flag set)."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def add_event(self, name: str, timestamp: Optional[int] = None):
+        self.events.append((name, timestamp or time.time_ns()))
+
+    def get_event_time(self, name: str) -> Optional[int]:
+        return next((timestamp for event, timestamp in self.events if event == name), None)
+
+    def to_dict(self) -> dict:
+        """:return: The span with the field names of the OpenTelemetry (OTLP JSON) spans."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.end_time,
+            "attributes": self.attributes,
+            "events": [{"name": name, "time_unix_nano": timestamp} for name, timestamp in self.events],
+            "status": self.status,
+        }
+
+
+class ZeroMQJSONSpanExporter:
+    """
+    Writes the spans as JSON lines to a local file, for when no collector is available. The lines are written in
+    batches by a background thread (see ZeroMQBatchingLogSink), read them back with read_spans.
+    """
+
+    def __init__(self, path: str, batch_size: int = 512, flush_interval: float = 1.0, rotation: Optional[int] = None):
+        """
+        :param path: The file the spans are appended to.
+        :param batch_size: Maximum number of spans written at once.
+        :param flush_interval: Maximum time in seconds a span waits before being written.
+        :param rotation: Rotate the file once it is larger than this number of bytes.
+        """
+        self.sink = ZeroMQBatchingLogSink(path, batch_size=batch_size, flush_interval=flush_interval,
+                                          rotation=rotation)
+
+    def export(self, span: ZeroMQSpan):
+        self.sink.write(json.dumps(span.to_dict()) + "\n")
+
+    def close(self):
+        self.sink.stop()
+
+
+class ZeroMQOpenTelemetrySpanExporter:
+    """
+    Hands the spans to OpenTelemetry (the opentelemetry-api package, with an SDK and exporter configured by the
+    application), so they reach any OpenTelemetry collector.
+
+    The spans keep their trace id and are created as children of the propagated span context. OpenTelemetry assigns
+    them span ids of its own, the framework ids are kept in the ``zeromq.span_id`` attribute.
+    """
+
+    def __init__(self, tracer_provider=None):
+        """
+        :param tracer_provider: The OpenTelemetry tracer provider, the global one if None.
+        :raises ValueError: If opentelemetry-api is not installed.
+        """
+        if otel_trace is None:
+            raise ValueError("The OpenTelemetry exporter needs the opentelemetry-api package.")
+        provider = tracer_provider or otel_trace.get_tracer_provider()
+        self.tracer = provider.get_tracer("ZeroMQFramework")
+
+    def export(self, span: ZeroMQSpan):
+        parent = otel_trace.SpanContext(trace_id=int(span.trace_id, 16),
+                                        span_id=int(span.parent_span_id or span.span_id, 16), is_remote=True,
+                                        trace_flags=otel_trace.TraceFlags(otel_trace.TraceFlags.SAMPLED))
+        kind = {"client": otel_trace.SpanKind.CLIENT, "worker": otel_trace.SpanKind.SERVER}.get(
+            span.name, otel_trace.SpanKind.INTERNAL)
+        otel_span = self.tracer.start_span(span.name, context=otel_trace.set_span_in_context(
+            otel_trace.NonRecordingSpan(parent)), kind=kind, start_time=span.start_time,
+                                           attributes={**span.attributes, "zeromq.span_id": span.span_id})
+        for name, timestamp in span.events:
+            otel_span.add_event(name, timestamp=timestamp)
+        if span.status != "ok":
+            otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, span.status))
+        otel_span.end(end_time=span.end_time)
+
+    def close(self):
+        pass
+
+
+class ZeroMQTracer:
+    """
+    Opt-in request tracing, shared by the nodes of a process (ZeroMQClient, ZeroMQRouter and ZeroMQWorker tracer).
+
+    The client decides whether a request is traced (head sampling, ``sample_rate`` of the requests) and adds its
+    trace context to the request metadata. The routers forward it unchanged and the workers echo it in the reply
+    metadata. Every node records a span of its part of the request, with events at the steps in between:
+
+    - client: from send_message to the reply, ``sent`` when the request is handed to the socket.
+    - router: from the request received to the reply sent, ``forwarded`` when the request is sent to the workers.
+    - worker: from the request received to the reply sent, ``parsed`` then ``handled`` around the handler.
+
+    Requests that are not sampled carry no trace context, they cost the client a random draw and the routers and
+    workers a check of the metadata. See get_hop_breakdown for the time spent in each hop.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 0.01):
+        """
+        :param exporter: Receives the ended spans (ZeroMQJSONSpanExporter, ZeroMQOpenTelemetrySpanExporter or any
+                         object with export(span) and close()). Spans are dropped if None.
+        :param sample_rate: Ratio of the client requests traced, between 0 and 1.
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.spans_exported = 0
+
+    def start_trace(self, name: str, attributes: Optional[dict] = None) -> Optional[ZeroMQSpan]:
+        """
+        Start the root span of a new trace, if the request is sampled.
+
+        :param name: The span name.
+        :param attributes: The span attributes.
+        :return: The span, None if the request is not sampled.
+        """
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        return ZeroMQSpan(name, f"{random.getrandbits(128):032x}", f"{random.getrandbits(64):016x}",
+                          attributes=attributes)
+
+    def start_span(self, name: str, traceparent: str, start_time: Optional[int] = None,
+                   attributes: Optional[dict] = None) -> Optional[ZeroMQSpan]:
+        """
+        Start a span continuing a propagated trace context.
+
+        :param name: The span name.
+        :param traceparent: The trace context of the request (W3C traceparent).
+        :param start_time: Start of the span (time.time_ns), now if None.
+        :param attributes: The span attributes.
+        :return: The span, None if the trace context is invalid.
+        """
+        parts = traceparent.split("-") if isinstance(traceparent, str) else ()
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            logger.debug("Tracing: invalid trace context {}", traceparent)
+            return None
+        return ZeroMQSpan(name, parts[1], f"{random.getrandbits(64):016x}", parent_span_id=parts[2],
+                          start_time=start_time, attributes=attributes)
+
+    def end_span(self, span: ZeroMQSpan, status: Optional[str] = None):
+        """
+        End a span and export it.
+
+        :param span: The span.
+        :param status: Why the operation failed (an exception class name for instance), None if it succeeded.
+        :return: None
+        """
+        span.end_time = time.time_ns()
+        if status:
+            span.status = status
+        if self.exporter is not None:
+            try:
+                self.exporter.export(span)
+                self.spans_exported += 1
+            except Exception as e:
+                logger.warning("Tracing: cannot export span {}: {}", span.name, e)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+def get_traceparent(metadata_frame: bytes) -> Optional[str]:
+    """
+    :param metadata_frame: The metadata frame of a message.
+    :return: The trace context of the message, None if it has none.
+    """
+    if TRACE_MARKER not in metadata_frame:
+        return None
+    try:
+        return json.loads(metadata_frame).get("trace")
+    except (ValueError, AttributeError):
+        return None
+
+
+def read_spans(path: str) -> List[dict]:
+    """
+    :param path: A file written by ZeroMQJSONSpanExporter.
+    :return: The spans, as dictionaries.
+    """
+    with open(path) as spans_file:
+        return [json.loads(line) for line in spans_file if line.strip()]
+
+
+# hops of a traced request: (name, (span, event) at the start, (span, event) at the end), where event None is the
+# start of the span and "end" its end. A hop is skipped if one of its spans or events is missing
+HOPS = [
+    ("client_queue", ("client", None), ("client", "sent")),
+    ("client_to_router", ("client", "sent"), ("router", None)),
+    ("router_queue", ("router", None), ("router", "forwarded")),
+    ("backend_queue", ("router", "forwarded"), ("worker", None)),
+    ("worker_parse", ("worker", None), ("worker", "parsed")),
+    ("handler", ("worker", "parsed"), ("worker", "handled")),
+    ("worker_reply", ("worker", "handled"), ("worker", "end")),
+    ("worker_to_router", ("worker", "end"), ("router", "end")),
+    ("router_to_client", ("router", "end"), ("client", "end")),
+    ("client_to_worker", ("client", "sent"), ("worker", None)),  # server mode, or routers not traced
+    ("worker_to_client", ("worker", "end"), ("client", "end")),
+    ("total", ("client", None), ("client", "end")),
+]
+
+
+def _get_time(span: dict, event: Optional[str]) -> Optional[int]:
+    if event is None:
+        return span["start_time_unix_nano"]
+    if event == "end":
+        return span["end_time_unix_nano"]
+    return next((item["time_unix_nano"] for item in span["events"] if item["name"] == event), None)
+
+
+def get_hop_breakdown(spans: Iterable[dict]) -> Dict[str, dict]:
+    """
+    Split the traced requests into hops (client queue, network, router queue, backend queue, handler, ...).
+
+    The hops between two nodes compare the clocks of their hosts, they are only meaningful with synchronised clocks
+    (or nodes on the same host).
+
+    :param spans: The spans of the traced requests, see read_spans.
+    :return: For every hop: number of requests, mean, p50, p99 and max in milliseconds.
+    """
+    traces = defaultdict(dict)
+    for span in spans:
+        if span.get("status", "ok") == "ok":
+            traces[span["trace_id"]][span["name"]] = span
+    durations = defaultdict(list)
+    for trace in traces.values():
+        for hop, start, end in HOPS:
+            if hop in ("client_to_worker", "worker_to_client") and "router" in trace:
+                continue
+            if start[0] not in trace or end[0] not in trace:
+                continue
+            start_time, end_time = _get_time(trace[start[0]], start[1]), _get_time(trace[end[0]], end[1])
+            if start_time is not None and end_time is not None:
+                durations[hop].append((end_time - start_time) / 1e6)
+    breakdown = {}
+    for hop, _, _ in HOPS:
+        values = sorted(durations.get(hop, []))
+        if values:
+            breakdown[hop] = {
+                "count": len(values),
+                "mean_ms": round(statistics.mean(values), 3),
+                "p50_ms": round(values[len(values) // 2], 3),
+                "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))], 3),
+                "max_ms": round(values[-1], 3),
+            }
+    return breakdown
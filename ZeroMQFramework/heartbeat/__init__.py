@@ -3,3 +3,4 @@ from .heartbeat_config import ZeroMQHeartbeatConfig
 from .heartbeat_receiver import ZeroMQHeartbeatReceiver
 from .heartbeat_sender import ZeroMQHeartbeatSender
 from .node_info import ZeroMQNodeInfo
+from .wire_format import ZeroMQHeartbeatWireFormat
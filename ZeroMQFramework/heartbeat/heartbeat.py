@@ -26,6 +26,7 @@ class ZeroMQHeartbeat(ABC):
         self.config = config
         self.running = True
         self.socket = self.context.socket(self.get_socket_type())
+        self.config.connection.apply_socket_options(self.socket)
         self.socket_monitor = ZeroMQSocketMonitor(context, self.socket)
         self.heartbeat_thread = None
 
@@ -88,6 +89,7 @@ class ZeroMQHeartbeat(ABC):
         if self.socket:
             self.socket.close()
         new_socket = self.context.socket(self.get_socket_type())
+        self.config.connection.apply_socket_options(new_socket)
         self.socket = new_socket
         self.socket_monitor.reset_socket(new_socket)
 
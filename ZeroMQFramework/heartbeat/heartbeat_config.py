@@ -1,9 +1,15 @@
 from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+from ZeroMQFramework.heartbeat.wire_format import ZeroMQHeartbeatWireFormat
 
 
 class ZeroMQHeartbeatConfig:
-    def __init__(self, connection: ZeroMQConnection, interval: int = 10, timeout: int = 30, max_missed: int = 3):
+    def __init__(self, connection: ZeroMQConnection, interval: int = 10, timeout: int = 30, max_missed: int = 3,
+                 report_load: bool = False, load_window: int = 5,
+                 wire_format: ZeroMQHeartbeatWireFormat = ZeroMQHeartbeatWireFormat.JSON):
         self.connection = connection
         self.interval = interval
         self.timeout = timeout
         self.max_missed = max_missed
+        self.report_load = report_load  # senders include load metrics in their heartbeats
+        self.load_window = load_window  # number of load reports the receiver averages per node
+        self.wire_format = wire_format  # format of the heartbeats sent, receivers accept both formats
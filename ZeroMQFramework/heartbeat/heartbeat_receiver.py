@@ -1,23 +1,29 @@
 import threading
-from typing import Dict
+from collections import deque
+from typing import Dict, Callable, Optional
 
 import zmq
 
 from ..heartbeat.node_info import ZeroMQNodeInfo
 from ..heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
 from ..heartbeat.heartbeat import ZeroMQHeartbeat, ZeroMQHeartbeatType
+from ..heartbeat.wire_format import parse_heartbeat_message
 from ZeroMQFramework.common.node_type import ZeroMQNodeType
-from ZeroMQFramework.common.event import ZeroMQEvent
 from ..helpers.utils import *
 
 
 class ZeroMQHeartbeatReceiver(ZeroMQHeartbeat):
     def __init__(self, context: zmq.Context, node_id: str, session_id: str, node_type: ZeroMQNodeType,
-                 config: ZeroMQHeartbeatConfig):
+                 config: ZeroMQHeartbeatConfig,
+                 on_node_heartbeat_callback: Optional[Callable[[ZeroMQNodeInfo], None]] = None,
+                 on_node_disconnected_callback: Optional[Callable[[ZeroMQNodeInfo], None]] = None):
         super().__init__(context, node_id, session_id, node_type, config)
-        self.node_heartbeats: Dict[str, ZeroMQNodeInfo] = {}
+        self.node_heartbeats: Dict[tuple, ZeroMQNodeInfo] = {}
         self.lock = threading.Lock()
         self.connected_nodes = set()
+        self.load_windows: Dict[tuple, deque] = {}  # recent load reports per node
+        self.on_node_heartbeat_callback = on_node_heartbeat_callback  # inform the owner about every heartbeat
+        self.on_node_disconnected_callback = on_node_disconnected_callback  # inform the owner about lost nodes
 
     def get_socket_type(self):
         return zmq.ROUTER
@@ -25,28 +31,49 @@ class ZeroMQHeartbeatReceiver(ZeroMQHeartbeat):
     def get_heartbeat_type(self):
         return ZeroMQHeartbeatType.RECEIVER
 
-    def get_node_key(self, node_id: str, session_id: str):
-        return f"{node_id}_{session_id}"
+    def get_node_key(self, node_id: str, session_id: str) -> tuple:
+        return node_id, session_id  # hashed as is, no string built per heartbeat
 
     def handle_heartbeat(self, node_info: ZeroMQNodeInfo):
         with (self.lock):
             node_key = self.get_node_key(node_info.node_id, node_info.session_id)
-            if node_key not in self.connected_nodes:
-                self.connected_nodes.add(node_key)
-                logger.info(f"node connected: {self.get_details_string(node_info)}")
             node_info.last_heartbeat = get_current_time()
             node_info.missed_count = 0
+            if node_info.load is not None:
+                node_info.load = self.update_load_window(node_key, node_info.load)
             self.node_heartbeats[node_key] = node_info
-            self.log_connected_nodes()
+            if node_key not in self.connected_nodes:
+                self.connected_nodes.add(node_key)
+                logger.info(f"node connected: {self.get_details_string(node_info)}")
+                self.log_connected_nodes()  # only when the nodes change, it is O(nodes)
+        if self.on_node_heartbeat_callback:
+            self.on_node_heartbeat_callback(node_info)
+
+    def update_load_window(self, node_key: tuple, load: dict) -> dict:
+        """
+        Add a load report to the moving window of a node.
+
+        :param node_key: The node key.
+        :param load: The load reported in the heartbeat.
+        :return: The average of the numeric metrics over the window.
+        """
+        window = self.load_windows.get(node_key)
+        if window is None:
+            window = self.load_windows[node_key] = deque(maxlen=self.config.load_window)
+        window.append(load)
+        averaged = {}
+        for metric, value in load.items():
+            values = [report[metric] for report in window if isinstance(report.get(metric), (int, float))]
+            averaged[metric] = sum(values) / len(values) if values else value
+        return averaged
 
     def log_connected_nodes(self):
         if self.connected_nodes:
-            logger.debug("Connected nodes:")
-            for node_key in self.connected_nodes:
-                node_info = self.node_heartbeats[node_key]
-                logger.debug(
-                    f"Node ID: {node_info.node_id}, Session ID: {node_info.session_id},"
-                    f"Type: {node_info.node_type.value}")
+            # lazy: the list is only built if debug logs are enabled, it is O(nodes) on every join
+            logger.opt(lazy=True).debug("Connected nodes:\n{}", lambda: "\n".join(
+                f"Node ID: {node_info.node_id}, Session ID: {node_info.session_id}, "
+                f"Type: {node_info.node_type.value}"
+                for node_info in (self.node_heartbeats[node_key] for node_key in self.connected_nodes)))
 
     def get_details_string(self, node_info: ZeroMQNodeInfo) -> str:
         return (f"node_type = {node_info.node_type.value}, node_id: {node_info.node_id}, "
@@ -68,18 +95,20 @@ class ZeroMQHeartbeatReceiver(ZeroMQHeartbeat):
                     else:
                         self.node_heartbeats[node_key] = node_info
 
+            removed_nodes = [self.node_heartbeats.pop(node_key) for node_key in nodes_to_remove]
+            self.connected_nodes.difference_update(nodes_to_remove)
             for node_key in nodes_to_remove:
-                del self.node_heartbeats[node_key]
-                self.connected_nodes.discard(node_key)
+                self.load_windows.pop(node_key, None)
+
+        if self.on_node_disconnected_callback:
+            for node_info in removed_nodes:
+                self.on_node_disconnected_callback(node_info)
 
     def poll_sockets(self, poller):
         socks = dict(poller.poll(self.config.interval * 1000))
         if self.socket in socks and socks[self.socket] == zmq.POLLIN:
-            message = self.socket.recv_multipart()
-            parsed_message = parse_message(message)
-            if parsed_message["event_name"] == ZeroMQEvent.HEARTBEAT.value:
-                node_info_dict = parsed_message["event_data"]
-                node_info = ZeroMQNodeInfo.from_dict(node_info_dict)
+            node_info = parse_heartbeat_message(self.socket.recv_multipart())  # JSON or binary
+            if node_info is not None:
                 self.handle_heartbeat(node_info)
 
     def _run(self):
@@ -1,20 +1,24 @@
-import json
 import time
+from typing import Optional, Callable
+
 import zmq
 
 from ..heartbeat.node_info import ZeroMQNodeInfo
 from ..heartbeat.heartbeat import ZeroMQHeartbeat, ZeroMQHeartbeatType
 from ..heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
+from ..heartbeat.wire_format import create_heartbeat_message
 from ZeroMQFramework.common.node_type import ZeroMQNodeType
-from ZeroMQFramework.common.event import ZeroMQEvent
 from loguru import logger
-from ..helpers.utils import create_message, get_current_time
+from ..helpers.utils import get_current_time
 
 
 class ZeroMQHeartbeatSender(ZeroMQHeartbeat):
     def __init__(self, context: zmq.Context, node_id: str, session_id: str, node_type: ZeroMQNodeType,
-                 config: ZeroMQHeartbeatConfig):
+                 config: ZeroMQHeartbeatConfig, endpoint: Optional[str] = None,
+                 load_provider: Optional[Callable[[], dict]] = None):
         super().__init__(context, node_id, session_id, node_type, config)
+        self.endpoint = endpoint  # announced to the receiver, used for membership and endpoint discovery
+        self.load_provider = load_provider  # returns the load metrics included in each heartbeat
 
     def get_socket_type(self):
         return zmq.DEALER
@@ -40,13 +44,11 @@ class ZeroMQHeartbeatSender(ZeroMQHeartbeat):
                     node_id=self.node_id,
                     session_id=self.session_id,
                     node_type=self.node_type,
-                    last_heartbeat=get_current_time()
+                    last_heartbeat=get_current_time(),
+                    endpoint=self.endpoint,
+                    load=self.load_provider() if self.load_provider else None
                 )
-                message = create_message(ZeroMQEvent.HEARTBEAT.value,
-                                         node_info.to_dict(),
-                                         include_empty_frame=True)
-                # print(message)
-                self.socket.send_multipart(message)
+                self.socket.send_multipart(create_heartbeat_message(node_info, self.config.wire_format))
             except zmq.ZMQError as e:
                 logger.error(f"Heartbeat sender: ZMQ Error occurred: {e}")
                 self.connect()
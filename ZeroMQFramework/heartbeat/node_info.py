@@ -1,18 +1,35 @@
-from dataclasses import dataclass, asdict
+from typing import Optional
 from ZeroMQFramework.common.node_type import ZeroMQNodeType
 
 
-@dataclass
 class ZeroMQNodeInfo:
-    node_id: str
-    session_id: str
-    node_type: ZeroMQNodeType
-    last_heartbeat: int
-    missed_count: int = 0
+    # receivers keep one per node, no per instance __dict__. Declared by hand, dataclass(slots=True) needs Python 3.10
+    __slots__ = ("node_id", "session_id", "node_type", "last_heartbeat", "missed_count", "endpoint", "load")
+
+    def __init__(self, node_id: str, session_id: str, node_type: ZeroMQNodeType, last_heartbeat: int,
+                 missed_count: int = 0, endpoint: Optional[str] = None, load: Optional[dict] = None):
+        self.node_id = node_id
+        self.session_id = session_id
+        self.node_type = node_type
+        self.last_heartbeat = last_heartbeat
+        self.missed_count = missed_count
+        self.endpoint = endpoint  # the endpoint the node is connected (or bound) to
+        self.load = load  # load metrics reported by the node, if any
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ZeroMQNodeInfo):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"ZeroMQNodeInfo({fields})"
 
     def to_dict(self) -> dict:
-        data = asdict(self)
+        data = {name: getattr(self, name) for name in self.__slots__}
         data['node_type'] = self.node_type.value
+        if self.load is not None:
+            data['load'] = dict(self.load)
         return data
 
     @staticmethod
@@ -22,5 +39,7 @@ class ZeroMQNodeInfo:
             session_id=data['session_id'],
             node_type=ZeroMQNodeType(data['node_type']),
             last_heartbeat=data['last_heartbeat'],
-            missed_count=data.get('missed_count', 0)
+            missed_count=data.get('missed_count', 0),
+            endpoint=data.get('endpoint'),
+            load=data.get('load')
         )
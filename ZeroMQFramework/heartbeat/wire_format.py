@@ -0,0 +1,163 @@
+import json
+import math
+import struct
+from enum import Enum
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from ZeroMQFramework.common.event import ZeroMQEvent
+from ZeroMQFramework.common.node_type import ZeroMQNodeType
+from ZeroMQFramework.heartbeat.node_info import ZeroMQNodeInfo
+from ZeroMQFramework.helpers.utils import create_message, parse_message
+
+
+class ZeroMQHeartbeatWireFormat(Enum):
+    JSON = "json"  # a regular framework message, the node info as JSON event data
+    BINARY = "binary"  # fixed layout struct-packed node info, see pack_node_info
+
+
+# Binary layout (network byte order):
+#   header: version (B), node type (B), flags (B), last heartbeat in ms (Q)
+#   node id, session id, endpoint: each a length (B) followed by the bytes, hex ids are sent as raw bytes
+#   load (if FLAG_LOAD): inflight, queue, p50, p99, cpu, rss as doubles (NaN for None)
+#   extra load metrics (if FLAG_LOAD_EXTRA): the JSON of the metrics missing from the fixed block
+BINARY_VERSION = 1
+FLAG_HEX_IDS = 0x01
+FLAG_ENDPOINT = 0x02
+FLAG_LOAD = 0x04
+FLAG_LOAD_EXTRA = 0x08
+
+_HEADER = struct.Struct("!BBBQ")
+_LOAD_METRICS = ("inflight", "queue", "p50", "p99", "cpu", "rss")
+_LOAD = struct.Struct(f"!{len(_LOAD_METRICS)}d")
+# wire codes of the node types. Fixed: a new node type gets a new code, existing codes never change
+NODE_TYPE_CODES = {
+    ZeroMQNodeType.ROUTER: 0,
+    ZeroMQNodeType.WORKER: 1,
+    ZeroMQNodeType.CLIENT: 2,
+    ZeroMQNodeType.SERVER: 3,
+    ZeroMQNodeType.PRODUCER: 4,
+    ZeroMQNodeType.PIPELINE_WORKER: 5,
+    ZeroMQNodeType.SINK: 6,
+    ZeroMQNodeType.UNDEFINED: 7,
+}
+_NODE_TYPES = {code: node_type for node_type, code in NODE_TYPE_CODES.items()}
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+_HEARTBEAT = ZeroMQEvent.HEARTBEAT.value.encode('utf-8')
+_HEARTBEAT_BINARY = ZeroMQEvent.HEARTBEAT_BINARY.value.encode('utf-8')
+
+
+def _is_hex_id(value: str) -> bool:
+    return len(value) % 2 == 0 and len(value) <= 510 and _HEX_DIGITS.issuperset(value)
+
+
+@lru_cache(maxsize=256)
+def _pack_ids(node_id: str, session_id: str, endpoint: Optional[str]) -> Tuple[int, bytes]:
+    # a sender always sends the same ids and endpoint, they are packed once
+    hex_ids = _is_hex_id(node_id) and _is_hex_id(session_id)
+    flags = FLAG_HEX_IDS if hex_ids else 0
+    values = [bytes.fromhex(value) if hex_ids else value.encode('utf-8') for value in (node_id, session_id)]
+    if endpoint:
+        flags |= FLAG_ENDPOINT
+        values.append(endpoint.encode('utf-8'))
+    parts = []
+    for value in values:
+        if len(value) > 255:
+            raise ValueError(f"{value!r} is too long for the binary heartbeat format (255 bytes max)")
+        parts.append(bytes((len(value),)))
+        parts.append(value)
+    return flags, b''.join(parts)
+
+
+def pack_node_info(node_info: ZeroMQNodeInfo) -> bytes:
+    """
+    Pack a node info into the fixed layout binary format. The missed count is not sent, it is receiver state.
+
+    :param node_info: The node info to pack.
+    :return: The packed bytes.
+    :raises ValueError: If an id or the endpoint is longer than 255 bytes.
+    :raises KeyError: If the node type has no wire code (see NODE_TYPE_CODES).
+    """
+    flags, ids = _pack_ids(node_info.node_id, node_info.session_id, node_info.endpoint)
+    parts = [ids]
+    if node_info.load is not None:
+        flags |= FLAG_LOAD
+        load = node_info.load
+        parts.append(_LOAD.pack(*[math.nan if load.get(metric) is None else load[metric]
+                                  for metric in _LOAD_METRICS]))
+        extra = {metric: value for metric, value in load.items() if metric not in _LOAD_METRICS}
+        if extra:
+            flags |= FLAG_LOAD_EXTRA
+            parts.append(json.dumps(extra).encode('utf-8'))
+    header = _HEADER.pack(BINARY_VERSION, NODE_TYPE_CODES[node_info.node_type], flags, node_info.last_heartbeat)
+    return header + b''.join(parts)
+
+
+def unpack_node_info(data: bytes) -> ZeroMQNodeInfo:
+    """
+    Unpack a node info packed by pack_node_info.
+
+    :param data: The packed bytes.
+    :return: The node info.
+    :raises ValueError: If the data is malformed or of an unsupported version.
+    """
+    try:
+        version, node_type, flags, last_heartbeat = _HEADER.unpack_from(data)
+        if version != BINARY_VERSION:
+            raise ValueError(f"unsupported heartbeat version {version}")
+        if node_type not in _NODE_TYPES:
+            raise ValueError(f"unknown node type code {node_type}")
+        offset = _HEADER.size
+        values = []
+        for _ in range(3 if flags & FLAG_ENDPOINT else 2):
+            length = data[offset]
+            value = data[offset + 1:offset + 1 + length]
+            offset += 1 + length
+            values.append(value.hex() if flags & FLAG_HEX_IDS and len(values) < 2 else value.decode('utf-8'))
+        load = None
+        if flags & FLAG_LOAD:
+            load = {metric: None if math.isnan(value) else (int(value) if value.is_integer() else value)
+                    for metric, value in zip(_LOAD_METRICS, _LOAD.unpack_from(data, offset))}
+            offset += _LOAD.size
+            if flags & FLAG_LOAD_EXTRA:
+                load.update(json.loads(data[offset:]))
+        return ZeroMQNodeInfo(node_id=values[0], session_id=values[1], node_type=_NODE_TYPES[node_type],
+                              last_heartbeat=last_heartbeat, endpoint=values[2] if len(values) > 2 else None,
+                              load=load)
+    except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed binary heartbeat: {e}")
+
+
+def create_heartbeat_message(node_info: ZeroMQNodeInfo,
+                             wire_format: ZeroMQHeartbeatWireFormat = ZeroMQHeartbeatWireFormat.JSON) -> list:
+    """
+    Create a heartbeat message (with the leading empty frame of the DEALER sender) in the given wire format.
+
+    :param node_info: The node info to send.
+    :param wire_format: The wire format.
+    :return: A list of frames.
+    """
+    if wire_format == ZeroMQHeartbeatWireFormat.BINARY:
+        return [b'', _HEARTBEAT_BINARY, pack_node_info(node_info)]
+    return create_message(ZeroMQEvent.HEARTBEAT.value, node_info.to_dict(), include_empty_frame=True)
+
+
+def parse_heartbeat_message(message: list) -> Optional[ZeroMQNodeInfo]:
+    """
+    Parse a heartbeat message received by the ROUTER of a heartbeat receiver. Both wire formats are accepted, so the
+    senders can be switched to the binary format one at a time.
+
+    :param message: The frames, starting with the sender identity.
+    :return: The node info or None if the message is not a heartbeat.
+    :raises ValueError: If the message is malformed.
+    """
+    start = message.index(b'') + 1 if b'' in message[:2] else 0
+    if len(message) < start + 2:
+        raise ValueError(f"Malformed message: {message}")
+    event_name = message[start]
+    if event_name == _HEARTBEAT_BINARY:
+        return unpack_node_info(message[start + 1])
+    if event_name == _HEARTBEAT:
+        return ZeroMQNodeInfo.from_dict(parse_message(message[start:])["event_data"])
+    return None
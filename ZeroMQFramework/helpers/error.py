@@ -18,6 +18,11 @@ class ZeroMQTimeoutError(ZeroMQClientError):
     pass
 
 
+class ZeroMQCircuitOpenError(ZeroMQClientError):
+    """Raised when a request is rejected because the circuit of its endpoint is open."""
+    pass
+
+
 class ZeroMQSocketError(ZeroMQError):
     """Base class for ZeroMQ socket errors."""
     pass
@@ -0,0 +1,126 @@
+from typing import Dict, Iterable, Optional
+
+
+class ZeroMQLatencyHistogram:
+    """
+    HDR style histogram of integer values (latencies in microseconds, for instance) with a fixed relative precision.
+
+    Values below ``2 ** sub_bucket_bits`` are counted exactly. Above, every power of two range is split into the same
+    number of linear buckets, so a value is known within ``10 ** -significant_digits`` of itself whatever its
+    magnitude: 1 ms and 1 minute latencies fit in the same few thousand counters. Recording is a bit_length and a list
+    increment, cheap enough to record every request of a load test. Histograms with the same precision can be merged
+    (add), including across processes through to_dict and from_dict.
+    """
+
+    def __init__(self, significant_digits: int = 3):
+        """
+        :param significant_digits: Precision of the recorded values, between 1 and 5.
+        """
+        if not 1 <= significant_digits <= 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        self.significant_digits = significant_digits
+        # smallest power of two range holding 2 * 10 ** digits buckets, so the buckets of its upper half (the ones
+        # used for the larger magnitudes) are at most 10 ** -digits of their values wide
+        self.sub_bucket_bits = (2 * 10 ** significant_digits - 1).bit_length()
+        self.sub_bucket_half = 1 << (self.sub_bucket_bits - 1)
+        self.counts = []
+        self.total_count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _get_index(self, value: int) -> int:
+        magnitude = value.bit_length() - self.sub_bucket_bits
+        if magnitude <= 0:
+            return value
+        return magnitude * self.sub_bucket_half + (value >> magnitude)
+
+    def _get_value(self, index: int) -> int:
+        """:return: The highest value counted in the bucket of an index."""
+        magnitude = index // self.sub_bucket_half - 1
+        if magnitude <= 0:
+            return index
+        return ((index - magnitude * self.sub_bucket_half + 1) << magnitude) - 1
+
+    def record(self, value: int, count: int = 1):
+        """
+        :param value: The value to record, negative values are recorded as 0.
+        :param count: Number of times the value is recorded.
+        :return: None
+        """
+        value = max(0, int(value))
+        index = self._get_index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += count
+        self.total_count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def add(self, other: "ZeroMQLatencyHistogram"):
+        """
+        Merge the values of another histogram into this one.
+
+        :param other: A histogram with the same significant digits.
+        :return: None
+        """
+        if other.significant_digits != self.significant_digits:
+            raise ValueError("Cannot merge histograms of different precisions")
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total_count += other.total_count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def get_value_at_percentile(self, percentile: float) -> Optional[int]:
+        """
+        :param percentile: Between 0 and 100.
+        :return: The value below or at which ``percentile`` percent of the values are (within the precision),
+                 None if the histogram is empty.
+        """
+        if not self.total_count:
+            return None
+        rank = max(1, round(self.total_count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._get_value(index), self.max)
+        return self.max
+
+    def get_percentiles(self, percentiles: Iterable[float] = (50, 90, 99, 99.9, 99.99)) -> Dict[float, int]:
+        return {percentile: self.get_value_at_percentile(percentile) for percentile in percentiles}
+
+    def get_mean(self) -> Optional[float]:
+        return self.total / self.total_count if self.total_count else None
+
+    def to_dict(self) -> dict:
+        """:return: A JSON serialisable form of the histogram, only the non empty buckets are kept."""
+        return {
+            "significant_digits": self.significant_digits,
+            "counts": {index: count for index, count in enumerate(self.counts) if count},
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ZeroMQLatencyHistogram":
+        histogram = cls(data["significant_digits"])
+        counts = {int(index): count for index, count in data["counts"].items()}  # JSON object keys are strings
+        histogram.counts = [0] * (max(counts) + 1 if counts else 0)
+        for index, count in counts.items():
+            histogram.counts[index] = count
+        histogram.total_count = sum(counts.values())
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
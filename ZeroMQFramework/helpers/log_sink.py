@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, TextIO, Tuple, Union
+
+from loguru import logger
+
+
+class ZeroMQBatchingLogSink:
+    """
+    Queue backed loguru sink: the logging thread only appends the formatted message to a deque and a background
+    thread writes them in batches (a single write and flush per batch), so a slow disk or console never blocks a
+    message loop.
+
+    Usage: ``logger.add(ZeroMQBatchingLogSink("app.log"), level="DEBUG", format=...)``. loguru calls ``stop()`` when
+    the handler is removed (and at exit), which writes the pending messages.
+    """
+
+    def __init__(self, target: Union[str, TextIO], batch_size: int = 512, flush_interval: float = 0.1,
+                 max_queue: int = 100000, rotation: Optional[int] = None, retention: Optional[float] = None):
+        """
+        :param target: A file path (opened in append mode) or a text stream such as sys.stderr.
+        :param batch_size: Maximum number of messages written at once.
+        :param flush_interval: Maximum time in seconds a message waits in the queue.
+        :param max_queue: Messages are dropped (and counted in ``dropped``) once the queue is full, so a stuck disk
+                          cannot make the process run out of memory.
+        :param rotation: For file targets, rotate the file (to ``<path>.1``, ``<path>.2``, ...) once it is larger
+                         than this number of bytes.
+        :param retention: For rotated files, remove the ones last written more than this number of seconds ago,
+                          checked at every rotation (like the retention of a loguru file sink).
+        """
+        self.path = target if isinstance(target, str) else None
+        self.stream = open(target, "a", encoding="utf-8") if self.path else target
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.rotation = rotation
+        self.retention = retention
+        self.queue = deque()
+        self.dropped = 0
+        self.written = 0
+        self.running = True
+        self.wakeup = threading.Event()
+        self.writer_thread = threading.Thread(target=self._run, daemon=True)
+        self.writer_thread.start()
+
+    def write(self, message: str):
+        # called by loguru on the logging thread. deque.append is thread safe and never blocks
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.queue.append(message)
+        if len(self.queue) >= self.batch_size:
+            self.wakeup.set()
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self._write_pending()
+
+    def _write_pending(self):
+        while self.queue:
+            batch = []
+            while self.queue and len(batch) < self.batch_size:
+                batch.append(self.queue.popleft())
+            self.stream.write("".join(batch))
+            self.stream.flush()
+            self.written += len(batch)
+            if self.rotation and self.path and self.stream.tell() >= self.rotation:
+                self._rotate()
+
+    def _rotate(self):
+        self.stream.close()
+        rotated = self._rotated_files()
+        # after the last index, so the numbering stays chronological once the retention removed the first files
+        os.rename(self.path, f"{self.path}.{max(rotated, default=0) + 1}")
+        self.stream = open(self.path, "a", encoding="utf-8")
+        if self.retention is not None:
+            self._apply_retention(rotated.values())
+
+    def _rotated_files(self) -> Dict[int, str]:
+        folder, name = os.path.split(os.path.abspath(self.path))
+        rotated = {}
+        for filename in os.listdir(folder):
+            suffix = filename[len(name) + 1:]
+            if filename.startswith(name + ".") and suffix.isdigit():
+                rotated[int(suffix)] = os.path.join(folder, filename)
+        return rotated
+
+    def _apply_retention(self, paths):
+        expired = time.time() - self.retention
+        for path in paths:
+            try:
+                if os.path.getmtime(path) < expired:
+                    os.remove(path)
+            except OSError:  # removed meanwhile, or not removable: keep writing the logs
+                continue
+
+    def stop(self):
+        """Write the pending messages and stop the writer thread."""
+        self.running = False
+        self.wakeup.set()
+        self.writer_thread.join(timeout=max(self.flush_interval * 10, 1))
+        self._write_pending()
+        if self.path:
+            self.stream.close()
+
+
+class ZeroMQLogRateLimiter:
+    """
+    Per key token bucket for log calls made for every message, such as errors in a message loop. A burst of identical
+    errors is logged ``burst`` times then at most ``rate`` times per second, the next logged message reports how many
+    were suppressed.
+
+    Usage: ``limiter.log("malformed", "ERROR", "Malformed message received: {}", message)``. Pass the values as
+    arguments rather than in an f-string, the message is then only formatted if it is logged.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 5):
+        """
+        :param rate: Calls allowed per second and per key once the burst is used.
+        :param burst: Calls allowed at once.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[str, list] = {}  # key -> [tokens, last refill time, suppressed count]
+        self.lock = threading.Lock()
+
+    def allow(self, key: str) -> Tuple[bool, int]:
+        """
+        :param key: The kind of log call.
+        :return: Whether the call is allowed and, if so, how many calls were suppressed since the previous one.
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False, 0
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+            return True, suppressed
+
+    def log(self, key: str, level: str, message: str, *args):
+        """
+        Log a message through loguru if the key is not over its rate, reported at the location of the caller.
+
+        :param key: The kind of log call.
+        :param level: The loguru level name.
+        :param message: The message, formatted with args by loguru.
+        :return: None
+        """
+        allowed, suppressed = self.allow(key)
+        if not allowed:
+            return
+        if suppressed:
+            message = f"{message} ({suppressed} similar messages suppressed)"
+        logger.opt(depth=1).log(level, message, *args)
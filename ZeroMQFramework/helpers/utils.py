@@ -1,13 +1,24 @@
 import configparser
+import contextlib
 import datetime
 import json
 import os
 import sys
+import tempfile
+import threading
 import time
 import uuid
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 from loguru import logger
-from concurrent.futures import ThreadPoolExecutor
+from ZeroMQFramework.common.compression import ZeroMQCompression, decompress_payload
+from ZeroMQFramework.common.object_registry import OBJECT_REF, object_registry
+from ZeroMQFramework.common.shared_memory import ZeroMQSharedMemoryPool, open_shared_payload
+from ZeroMQFramework.helpers.log_sink import ZeroMQBatchingLogSink, ZeroMQLogRateLimiter
 
 
 def get_uuid_hex(length=32):
@@ -39,12 +50,47 @@ def get_current_time():
     return int(time.time() * 1000)
 
 
-def create_message(event_name: str, event_data: dict, include_empty_frame=False) -> list:
+def create_message(event_name: str, event_data: dict, include_empty_frame=False, metadata: dict = None,
+                   compression: ZeroMQCompression = None, by_reference: bool = False,
+                   shared_memory: ZeroMQSharedMemoryPool = None, keep_shared_memory: bool = False) -> list:
+    """
+    Create a multipart message from an event name and its data.
+
+    :param event_name: The name of the event.
+    :param event_data: The (JSON serialisable) event data.
+    :param include_empty_frame: Insert an empty delimiter frame at the beginning of the message.
+    :param metadata: Optional framework metadata (stream info, request ids, ...). It is sent as a third frame and
+                     is not part of the event data.
+    :param compression: Optional compression settings, the event data is compressed if it is large enough.
+    :param by_reference: Pass the event data and metadata objects through the object registry instead of
+                         serializing them, only a token is sent. Every node on the path must be in this process.
+    :param shared_memory: Optional shared memory pool, a payload large enough is written to a segment and only the
+                          segment name is sent. The receivers must be on this host.
+    :param keep_shared_memory: The receivers leave the segment in place, for a message that may be sent again. The
+                               caller releases it with shared_memory.release_message.
+    :return: A list of frames.
+    :raises ValueError: If the message cannot be created.
+    """
     try:
+        if by_reference:
+            message = [event_name.encode('utf-8'), object_registry.put((event_data, metadata)), OBJECT_REF]
+            if include_empty_frame:
+                message.insert(0, b'')
+            return message
+        payload = json.dumps(event_data).encode('utf-8')
+        if compression is not None:
+            payload, compression_metadata = compression.compress(payload)
+            if compression_metadata:
+                metadata = {**metadata, **compression_metadata} if metadata else compression_metadata
+        if shared_memory is not None and len(payload) >= shared_memory.threshold:
+            metadata = {**(metadata or {}), **shared_memory.offload(payload, keep=keep_shared_memory)}
+            payload = b''
         message = [
             event_name.encode('utf-8'),  # Event Name
-            json.dumps(event_data).encode('utf-8')  # Event Data
+            payload  # Event Data
         ]
+        if metadata:
+            message.append(json.dumps(metadata).encode('utf-8'))  # Metadata
         if include_empty_frame:
             # Insert an empty frame at the beginning. This is used in some cases.
             # This is used in the heartbeat sender as the socket type is a dealer
@@ -57,29 +103,62 @@ def create_message(event_name: str, event_data: dict, include_empty_frame=False)
         raise ValueError(f"Error creating message for event {event_name} and data {event_data}: {e}")
 
 
-def parse_message(message: list) -> dict:
+def parse_message(message: list, compression: ZeroMQCompression = None, consume: bool = True,
+                  shared_memory: ZeroMQSharedMemoryPool = None) -> dict:
     """
-    Parse a message and return a dictionary containing the event_name and event_data.
+    Parse a message and return a dictionary containing the event_name, event_data and metadata.
+    Compressed event data is decompressed, objects passed by reference are read from the object registry and
+    offloaded payloads from their shared memory segment, whatever the receiver settings are.
 
     :param message: A list representing the message to parse.
-    :return: A dictionary with the keys "event_name" and "event_data".
+    :param compression: Optional compression settings, needed for shared dictionaries and the counters.
+    :param consume: For a message passed by reference or offloaded to shared memory, count this read (the segment is
+                    deleted). False for a node forwarding the message.
+    :param shared_memory: Optional shared memory pool of the receiver, for its segment directory.
+    :return: A dictionary with the keys "event_name", "event_data" and "metadata" (empty if not sent).
     :raises ValueError: If the message is malformed or cannot be parsed.
     """
     if len(message) < 2:
         raise ValueError(f"Malformed message: {message}")
     try:
-        if message[0] == b'':  # Case: [empty frame, event name, event data]
-            event_name = message[1].decode('utf-8')
-            event_data = json.loads(message[2].decode('utf-8'))
-        elif len(message) == 4 and message[1] == b'':  # Case: [address, empty frame, event name, event data]
-            event_name = message[2].decode('utf-8')
-            event_data = json.loads(message[3].decode('utf-8'))
-        else:  # Case: [event name, event data]
-            event_name = message[0].decode('utf-8')
-            event_data = json.loads(message[1].decode('utf-8'))
+        if message[0] == b'':  # Case: [empty frame, event name, event data, (metadata)]
+            frames = message[1:]
+        elif len(message) >= 4 and message[1] == b'':  # Case: [address, empty frame, event name, event data, ...]
+            frames = message[2:]
+        else:  # Case: [event name, event data, (metadata)]
+            frames = message
+        event_name = frames[0].decode('utf-8')
+        if len(frames) > 2 and frames[2] == OBJECT_REF:
+            try:
+                event_data, metadata = object_registry.take(frames[1]) if consume else object_registry.peek(frames[1])
+            except KeyError:
+                raise ValueError("Object passed by reference not found. Already read, expired, or sent from another "
+                                 "process (passing objects needs every node of the path in the same process)")
+            return {
+                "event_name": event_name,
+                "event_data": event_data,
+                "metadata": metadata or {}
+            }
+        metadata = json.loads(frames[2].decode('utf-8')) if len(frames) > 2 else {}
+        payload = frames[1]
+        segment = None
+        if "shm" in metadata:  # decoded straight from the mapped segment
+            payload = segment = open_shared_payload(metadata, consume,
+                                                    shared_memory.directory if shared_memory else None)
+        try:
+            if "compression" in metadata:
+                if compression is not None:
+                    payload = compression.decompress(payload, metadata)
+                else:
+                    payload = decompress_payload(payload, metadata)
+            event_data = json.loads(str(payload, 'utf-8'))
+        finally:
+            if segment is not None:
+                segment.close()
         return {
             "event_name": event_name,
-            "event_data": event_data
+            "event_data": event_data,
+            "metadata": metadata
         }
     except Exception as e:
         raise ValueError(f"Error parsing message: {message}", e)
@@ -104,37 +183,108 @@ def load_config(config_file, section):
 def save_config(config_file, section, key, value):
     """
     Save a key-value pair to a specified section of a configuration file.
+    The file is rewritten atomically, under the configuration file lock.
 
     :param config_file: The path to the configuration file.
     :param section: The section name in the configuration file to save to.
     :param key: The key to save.
     :param value: The value to save.
     """
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    if section not in config:
-        config.add_section(section)
-    config.set(section, key, value)
-    with open(config_file, 'w') as configfile:
-        config.write(configfile)
+    with _config_file_lock(config_file):
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        if section not in config:
+            config.add_section(section)
+        config.set(section, key, value)
+        _write_config(config_file, config)
 
 
-#####################
-##### Used for logger
+# node ids per (configuration file, section), read once per process
+_node_ids = {}
+_node_ids_lock = threading.Lock()
+_config_lock = threading.RLock()
+
+
+def get_node_id(config_file, section):
+    """
+    Get the node id of a configuration section, generating and saving one if the section has none.
 
-# Create a thread pool for logging
-log_executor = ThreadPoolExecutor(max_workers=1)
+    The id is cached for the lifetime of the process, so creating many nodes reads the configuration file once. A new
+    id is generated and saved under the configuration file lock, so concurrent processes starting with the same file
+    end up with the same id.
 
+    :param config_file: The path to the configuration file.
+    :param section: The section name of the node (its node type).
+    :return: The node id.
+    """
+    key = (os.path.abspath(config_file), section)
+    node_id = _node_ids.get(key)
+    if node_id:
+        return node_id
+    with _node_ids_lock:
+        node_id = _node_ids.get(key)
+        if not node_id:
+            with _config_file_lock(config_file):
+                config = configparser.ConfigParser()
+                config.read(config_file)
+                node_id = config.get(section, 'node_id', fallback=None)
+                if not node_id:
+                    logger.warning("node_id is empty in the configuration file.")
+                    node_id = get_uuid_hex()
+                    if section not in config:
+                        config.add_section(section)
+                    config.set(section, 'node_id', node_id)
+                    _write_config(config_file, config)
+                    logger.warning(f"New node id ({node_id}) is generated and saved in the config under node_id")
+            _node_ids[key] = node_id
+    return node_id
+
+
+@contextlib.contextmanager
+def _config_file_lock(config_file):
+    # The threads of this process, then the other processes through a lock file (not the configuration file itself,
+    # it is replaced on every write). Without fcntl (Windows) only the threads are serialised
+    with _config_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{config_file}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_config(config_file, config):
+    # write a temporary file and rename it, readers never see a partially written file
+    folder = os.path.dirname(os.path.abspath(config_file))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".config-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            config.write(tmp_file)
+        os.replace(tmp_path, config_file)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
 
-def setup_logging(log_folder):
+
+#####################
+##### Used for logger
+
+def setup_logging(log_folder, async_logging: bool = True, batch_size: int = 512, flush_interval: float = 0.1):
     """
     :param log_folder: The folder to store the log files.
+    :param async_logging: Write the logs from a background thread, in batches (see ZeroMQBatchingLogSink). The
+                          calling thread only formats the message and appends it to a queue.
+    :param batch_size: Maximum number of messages written at once (async logging).
+    :param flush_interval: Maximum time in seconds a message waits before being written (async logging).
     :return: None
 
     This method sets up logging for the application. It creates the log folder if it does not already exist,
     creates a timestamp for the log file name, sets the log file path, adds the log file to the logger,
-    removes the default stderr logger, configures non-blocking logging using a thread pool,
-    and optionally cleans up old log files in the log folder.
+    removes the default stderr logger, adds a console logger and optionally cleans up old log files in the log
+    folder.
     """
     if not os.path.exists(log_folder):
         os.makedirs(log_folder)
@@ -142,28 +292,28 @@ def setup_logging(log_folder):
     # Create a timestamp for the log file name
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_file = os.path.join(log_folder, f'debug_{timestamp}.log')
-
-    logger.add(log_file, level="DEBUG", format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{line} - {message}",
-               rotation="10 MB", retention="7 days")
+    file_format = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{line} - {message}"
+    console_format = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> - <level>{message}</level>"
 
     # Remove the default stderr logger
     logger.remove(0)
 
-    # Add a logger for the console with a simpler format
-    logger.add(sys.stderr, level="INFO", format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> - <level>{message}</level>")
-
-    # Setup non-blocking logging using the thread pool
-    logger.configure(patcher=patch_logging)
+    if async_logging:
+        # same rotation and retention as the loguru file sink below, the retention is applied at every rotation
+        logger.add(ZeroMQBatchingLogSink(log_file, batch_size=batch_size, flush_interval=flush_interval,
+                                         rotation=10 * 1024 * 1024, retention=7 * 24 * 3600),
+                   level="DEBUG", format=file_format)
+        logger.add(ZeroMQBatchingLogSink(sys.stderr, batch_size=batch_size, flush_interval=flush_interval),
+                   level="INFO", format=console_format, colorize=sys.stderr.isatty())
+    else:
+        logger.add(log_file, level="DEBUG", format=file_format, rotation="10 MB", retention="7 days")
+        # Add a logger for the console with a simpler format
+        logger.add(sys.stderr, level="INFO", format=console_format)
 
     # Optionally, if you want to keep old logs clean
     # cleanup_old_logs(log_folder)
 
 
-def patch_logging(record):
-    pass
-    # log_executor.submit(logger.complete, record)
-
-
 def cleanup_old_logs(log_folder):
     now = datetime.datetime.now()
     for filename in os.listdir(log_folder):
@@ -0,0 +1,3 @@
+from .producer import ZeroMQProducer
+from .pipeline_worker import ZeroMQPipelineWorker
+from .sink import ZeroMQSink
@@ -0,0 +1,82 @@
+from typing import Callable, Any, Optional
+
+import zmq
+from loguru import logger
+
+from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+from ZeroMQFramework.common.node_type import ZeroMQNodeType
+from ZeroMQFramework.heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
+from ZeroMQFramework.helpers.utils import create_message, parse_message
+from ZeroMQFramework.worker.worker import ZeroMQWorker
+
+
+class ZeroMQPipelineWorker(ZeroMQWorker):
+    """
+    PUSH/PULL variant of ZeroMQWorker.
+
+    The worker pulls messages from a producer and passes them to ``handle_message``. Nothing is sent back to the
+    producer. If a ``sink_connection`` is given, non-None results are pushed to the sink, otherwise they are dropped.
+    """
+
+    def __init__(self, config_file: str, connection: ZeroMQConnection, handle_message: Callable[[dict], Any] = None,
+                 sink_connection: Optional[ZeroMQConnection] = None, context: zmq.Context = None,
+                 heartbeat_config: ZeroMQHeartbeatConfig = None, hwm: Optional[int] = None):
+        super().__init__(config_file, connection, handle_message, context, ZeroMQNodeType.PIPELINE_WORKER,
+                         heartbeat_config)
+        # an explicit hwm wins over the socket profile of the connection, 1000 if neither sets it
+        self.hwm = hwm if hwm is not None else connection.get_socket_option("rcvhwm", 1000)
+        self.socket.setsockopt(zmq.RCVHWM, self.hwm)
+        self.sink_connection = sink_connection
+        self.sink_socket = None
+        if self.sink_connection is not None:
+            self.sink_socket = self.context.socket(zmq.PUSH)
+            self.sink_connection.apply_socket_options(self.sink_socket)
+            self.sink_socket.setsockopt(zmq.LINGER, 0)
+            self.sink_socket.setsockopt(zmq.SNDHWM, hwm if hwm is not None
+                                        else sink_connection.get_socket_option("sndhwm", 1000))
+
+    def start_worker(self):
+        connection_string = self.connection.get_connection_string(bind=False)
+        self.start_socket_monitor()
+        self.socket.connect(connection_string)
+        logger.info(f"{self.node_type.value} pulling from {connection_string}")
+        if self.sink_socket is not None:
+            sink_connection_string = self.sink_connection.get_connection_string(bind=False)
+            self.sink_socket.connect(sink_connection_string)
+            logger.info(f"{self.node_type.value} pushing results to {sink_connection_string}")
+
+        if self.heartbeat_enabled:
+            self.heartbeat.start()
+        self.process_messages()
+
+    def process_messages(self):
+        self.poller.register(self.socket, zmq.POLLIN)
+
+        while not self.shutdown_requested:
+            try:
+                socks = dict(self.poller.poll(timeout=self.poller_timeout))
+                if self.socket in socks:
+                    message = self.socket.recv_multipart()
+                    parsed_message = parse_message(message, compression=self.connection.compression,
+                                                   shared_memory=self.connection.shared_memory)
+                    result = self.handle_message(parsed_message)
+                    if result is not None and self.sink_socket is not None:
+                        # Blocks when the sink HWM is reached, which in turn stops pulling from the producer
+                        self.sink_socket.send_multipart(create_message(
+                            parsed_message["event_name"], result, compression=self.sink_connection.compression,
+                            by_reference=self.sink_connection.pass_objects,
+                            shared_memory=self.sink_connection.shared_memory))
+
+            except zmq.ZMQError as e:
+                self.log_limiter.log("zmq_error", "ERROR", "ZMQ Error occurred: {}", e)
+            except Exception as e:
+                self.log_limiter.log("exception", "ERROR", "Unknown exception occurred: {}", e)
+
+        # Exited the loop (self.shutdown_requested is true)
+        self.cleanup()
+
+    def cleanup(self):
+        if self.sink_socket is not None:
+            self.sink_socket.close()
+            self.sink_socket = None
+        super().cleanup()
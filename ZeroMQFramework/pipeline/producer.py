@@ -0,0 +1,87 @@
+import zmq
+
+from ZeroMQFramework.common.connection_protocol import *
+from ZeroMQFramework.helpers.utils import *
+from ZeroMQFramework.helpers.error import *
+from ZeroMQFramework.common.base import ZeroMQBase
+from ZeroMQFramework.heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
+from ZeroMQFramework.common.node_type import ZeroMQNodeType
+
+
+class ZeroMQProducer(ZeroMQBase):
+    """
+    Fire-and-forget producer for the PUSH/PULL pipeline mode.
+
+    The producer binds a PUSH socket and distributes messages round-robin to the connected pipeline workers.
+    No reply is expected. Flow control is done by the high water mark (HWM): once every connected worker queue is
+    full, ``send_message`` blocks for up to ``timeout`` seconds and then raises ``ZeroMQTimeoutError``.
+    """
+
+    def __init__(self, config_file: str, connection: ZeroMQConnection,
+                 heartbeat_config: ZeroMQHeartbeatConfig = None, hwm: Optional[int] = None, timeout: int = 5,
+                 bind: bool = True):
+        super().__init__(config_file, connection, ZeroMQNodeType.PRODUCER, None, None, heartbeat_config)
+        # an explicit hwm wins over the socket profile of the connection, 1000 if neither sets it
+        self.hwm = hwm if hwm is not None else connection.get_socket_option("sndhwm", 1000)
+        self.timeout = timeout * 1000  # convert to ms
+        self.bind = bind
+        self.connection_string = self.connection.get_connection_string(bind=self.bind)
+        self.heartbeat_started = False
+        self._configure_socket()
+
+    def _configure_socket(self):
+        """Configure the PUSH socket with the HWM based flow control options."""
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.SNDHWM, self.hwm)
+        self.socket.setsockopt(zmq.SNDTIMEO, self.timeout)  # milliseconds
+
+    def connect(self):
+        """
+        Bind (or connect) the producer socket and start the heartbeat if enabled.
+
+        :return: None
+        """
+        if self.heartbeat_enabled and not self.heartbeat_started:
+            logger.info('Producer: Starting heartbeat')
+            self.heartbeat.start()
+            self.heartbeat_started = True
+
+        self.start_socket_monitor()
+        if self.bind:
+            self.socket.bind(self.connection_string)
+            logger.info(f'Producer: bound to {self.connection_string}')
+        else:
+            self.socket.connect(self.connection_string)
+            logger.info(f'Producer: connected to {self.connection_string}')
+
+    def send_message(self, event_name: str, event_data: dict):
+        """
+        Push a message to the pipeline without waiting for a reply.
+
+        :param event_name: The name of the event being sent.
+        :param event_data: The data associated with the event.
+        :return: None
+        :raises ZeroMQTimeoutError: If the pipeline stays full (HWM reached) for the whole timeout period.
+        :raises ZeroMQClientError: If a general ZMQError occurs.
+        """
+        message = create_message(event_name, event_data, compression=self.connection.compression,
+                                 by_reference=self.connection.pass_objects,
+                                 shared_memory=self.connection.shared_memory)
+        try:
+            self.socket.send_multipart(message)
+        except zmq.Again:
+            err = f"Producer: pipeline is full, message not queued within {self.timeout / 1000} seconds"
+            self.log_limiter.log("pipeline_full", "WARNING", err)
+            raise ZeroMQTimeoutError(err)
+        except zmq.ZMQError as e:
+            err = f"Producer: ZMQError occurred: {e}."
+            self.log_limiter.log("zmq_error", "ERROR", err)
+            raise ZeroMQClientError(err)
+
+    def shutdown_initiated(self):
+        pass
+
+    def cleanup(self):
+        logger.info("Producer: Cleaning up producer...")
+        super().cleanup()
+        logger.info("Producer: Cleaned up ZeroMQ sockets and context.")
@@ -0,0 +1,67 @@
+from typing import Callable, Any, Optional
+
+import zmq
+from loguru import logger
+
+from ZeroMQFramework.common.base import ZeroMQBase
+from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+from ZeroMQFramework.common.node_type import ZeroMQNodeType
+from ZeroMQFramework.heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
+from ZeroMQFramework.helpers.utils import parse_message
+
+
+class ZeroMQSink(ZeroMQBase):
+    """
+    Optional collector at the end of a PUSH/PULL pipeline.
+
+    The sink binds a PULL socket, pipeline workers push their results to it and every result is passed to
+    ``handle_result``.
+    """
+
+    def __init__(self, config_file: str, connection: ZeroMQConnection, handle_result: Callable[[dict], Any] = None,
+                 context: zmq.Context = None, heartbeat_config: ZeroMQHeartbeatConfig = None,
+                 hwm: Optional[int] = None):
+        super().__init__(config_file, connection, ZeroMQNodeType.SINK, handle_result, context, heartbeat_config)
+        # an explicit hwm wins over the socket profile of the connection, 1000 if neither sets it
+        self.hwm = hwm if hwm is not None else connection.get_socket_option("rcvhwm", 1000)
+        self.socket.setsockopt(zmq.RCVHWM, self.hwm)
+        self.received_count = 0
+
+    def run(self):
+        connection_string = self.connection.get_connection_string(bind=True)
+        self.start_socket_monitor()
+        self.socket.bind(connection_string)
+        logger.info(f"{self.node_type.value} bound to {connection_string}")
+
+        if self.heartbeat_enabled:
+            self.heartbeat.start()
+        self.collect_results()
+
+    def collect_results(self):
+        self.poller.register(self.socket, zmq.POLLIN)
+
+        while not self.shutdown_requested:
+            try:
+                socks = dict(self.poller.poll(timeout=self.poller_timeout))
+                if self.socket in socks:
+                    message = self.socket.recv_multipart()
+                    self.received_count += 1
+                    if self.handle_message:
+                        self.handle_message(parse_message(message, compression=self.connection.compression,
+                                                          shared_memory=self.connection.shared_memory))
+            except zmq.ZMQError as e:
+                self.log_limiter.log("zmq_error", "ERROR", "ZMQ Error occurred: {}", e)
+            except Exception as e:
+                self.log_limiter.log("exception", "ERROR", "Unknown exception occurred: {}", e)
+
+        self.cleanup()
+
+    def shutdown_initiated(self):
+        pass
+
+    def cleanup(self):
+        logger.info(f"{self.node_type.value} is shutting down, performing cleanup...")
+        if self.socket in self.poller:
+            self.poller.unregister(self.socket)
+        self.socket.close()
+        super().cleanup()
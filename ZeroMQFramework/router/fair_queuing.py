@@ -0,0 +1,308 @@
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import zmq
+from loguru import logger
+
+from ..router.routing_strategy import ZeroMQRoutingStrategy
+from ..router.traffic_capture import REPLY, REQUEST
+
+
+@dataclass(frozen=True)
+class ZeroMQClientLimit:
+    """
+    Share and rate limit of a client of the fair queuing strategy.
+
+    :param rate: Sustained requests per second forwarded for the client, unlimited if None (token bucket refill rate).
+    :param burst: Requests the client can send at once above the rate (token bucket size), the rate if None.
+    :param weight: Share of the workers the client gets relative to the others when they compete (DRR weight).
+    """
+    rate: Optional[float] = None
+    burst: Optional[int] = None
+    weight: float = 1.0
+
+
+class ZeroMQClientQueue:
+    """The queue, scheduling state and metrics of a client of the fair queuing strategy."""
+
+    def __init__(self, key: bytes, limit: ZeroMQClientLimit):
+        self.key = key
+        self.limit = limit
+        self.queue = deque()
+        self.active = False  # in the DRR round
+        self.deficit = 0.0
+        self.tokens = float(limit.burst or limit.rate or 0)
+        self.last_refill = time.monotonic()
+        self.last_seen = self.last_refill
+        self.in_flight = 0
+        self.received = 0
+        self.forwarded = 0
+        self.completed = 0
+        self.dropped = 0
+        self.throttled = 0  # scheduling turns skipped for lack of tokens
+        self.latency_total = 0.0  # seconds, of the completed requests
+        self._last_forwarded = 0  # throughput since the previous get_stats
+        self._last_stats = self.last_refill
+
+    def take_token(self, now: float) -> bool:
+        if self.limit.rate is None:
+            return True
+        burst = self.limit.burst or self.limit.rate
+        self.tokens = min(burst, self.tokens + (now - self.last_refill) * self.limit.rate)
+        self.last_refill = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def get_stats(self, now: float) -> dict:
+        throughput = (self.forwarded - self._last_forwarded) / max(now - self._last_stats, 1e-6)
+        self._last_forwarded, self._last_stats = self.forwarded, now
+        return {
+            "queued": len(self.queue),
+            "in_flight": self.in_flight,
+            "received": self.received,
+            "forwarded": self.forwarded,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+            "throughput": round(throughput, 3),
+            "latency_ms": round(self.latency_total / self.completed * 1000, 3) if self.completed else None,
+        }
+
+
+class ZeroMQFairQueuingStrategy(ZeroMQRoutingStrategy):
+    """
+    Multi-tenant routing: requests wait in one queue per client identity (the ROUTER envelope frame) and are
+    forwarded to the workers with a deficit round-robin across the clients, so a client flooding the router only
+    fills its own queue and every other client keeps its share of the workers.
+
+    The router keeps at most ``max_in_flight`` requests at the workers (counted until their reply), the rest wait in
+    the client queues where the scheduling happens. Set it to about the number of requests the workers process at
+    once: higher values hand the ordering over to the worker queues, lower values leave workers idle.
+    Each client can be rate limited with a token bucket (see ZeroMQClientLimit): its requests above the rate wait in
+    its queue (up to ``max_queue``, the oldest are dropped beyond). Per client metrics are returned by get_stats.
+    """
+
+    def __init__(self, max_in_flight: int = 100, max_queue: int = 1000,
+                 default_limit: Optional[ZeroMQClientLimit] = None,
+                 limits: Optional[Dict[str, ZeroMQClientLimit]] = None, quantum: float = 1.0,
+                 cost: Optional[Callable[[list], float]] = None,
+                 client_key: Optional[Callable[[bytes], bytes]] = None, in_flight_timeout: float = 30.0,
+                 idle_timeout: float = 300.0):
+        """
+        :param max_in_flight: Maximum number of requests forwarded to the workers and not answered yet.
+        :param max_queue: Maximum number of requests waiting per client.
+        :param default_limit: Limit of the clients without one of their own, no rate limit and weight 1 if None.
+        :param limits: Limits by client identity, or by client node id to cover every session of a client.
+        :param quantum: Cost a client of weight 1 may send per DRR round.
+        :param cost: Cost of a request (its frames, envelope included), 1 per request if None. For example the
+                     payload size, to share bandwidth rather than requests.
+        :param client_key: Maps a client identity to the key of its queue, the identity itself if None. A REQ client
+                           has a single request in flight, so a tenant flooding the router does it with many sockets:
+                           use node_id_key to share one queue (and one limit) between every socket of a node.
+        :param in_flight_timeout: Seconds after which a request without reply (a lost worker) stops counting as in
+                                  flight.
+        :param idle_timeout: Seconds after which the state of a client with nothing queued or in flight is dropped.
+        """
+        self.shutdown_requested = False
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.default_limit = default_limit or ZeroMQClientLimit()
+        self.limits = limits or {}
+        self.quantum = quantum
+        self.cost = cost or (lambda message: 1)
+        self.client_key = client_key
+        self.in_flight_timeout = in_flight_timeout
+        self.idle_timeout = idle_timeout
+        self.clients: Dict[bytes, ZeroMQClientQueue] = {}
+        self.active = deque()  # clients with queued requests, in DRR order
+        self.in_flight = {}  # request envelope -> (client, forward time), in forward order
+        self._resume = False  # the client at the head of the round was interrupted and keeps its turn
+        self._last_prune = time.monotonic()
+
+    @staticmethod
+    def node_id_key(identity: bytes) -> bytes:
+        """
+        :param identity: The client identity.
+        :return: The node id of the client, its identity being the node id and the session id (see
+                 ZeroMQBase.get_socket_identity).
+        """
+        return identity.rsplit(b'_', 1)[0]
+
+    def get_limit(self, key: bytes) -> ZeroMQClientLimit:
+        """
+        :param key: The client identity (or queue key, see client_key).
+        :return: The limit of the key, else of its node id, else the default one.
+        """
+        name = key.decode('utf-8', errors='replace')
+        limit = self.limits.get(name) or self.limits.get(name.rsplit('_', 1)[0])
+        return limit or self.default_limit
+
+    def route(self, frontend_socket: zmq.Socket, backend_socket: zmq.Socket, poller: zmq.Poller = None,
+              poll_timeout: int = 1000):
+        while not self.shutdown_requested:
+            # poll more often while requests are waiting (for tokens or for room at the workers)
+            socks = dict(poller.poll(min(poll_timeout, 10) if self.active else poll_timeout))
+            if frontend_socket in socks and socks[frontend_socket] == zmq.POLLIN:
+                message = frontend_socket.recv_multipart()
+                if self.capture is not None:
+                    self.capture.record(message, REQUEST)
+                if not self.is_stream_credit(message) and not self.handle_membership_request(frontend_socket,
+                                                                                             message):
+                    if self.tracer is not None:
+                        self.trace_request(message)
+                    self.queue(self.disable_stream_credit(message))  # the DEALER backend cannot address a worker
+
+            if backend_socket in socks and socks[backend_socket] == zmq.POLLIN:
+                message = backend_socket.recv_multipart()
+                if self.is_probe(message):
+                    continue
+                self.complete(message)
+                if self.capture is not None:
+                    self.capture.record(message, REPLY)
+                if self.tracer is not None:
+                    self.trace_reply(message)
+                frontend_socket.send_multipart(message)
+
+            now = time.monotonic()
+            self.expire_in_flight(now)
+            self.schedule(backend_socket, now)
+            if now - self._last_prune > 1:
+                self.prune(now)
+
+    def queue(self, message: list):
+        """
+        Queue a request in the queue of its client.
+
+        :param message: The request, including its envelope (the client identity first).
+        :return: None
+        """
+        key = self.client_key(message[0]) if self.client_key else message[0]
+        client = self.clients.get(key)
+        if client is None:
+            client = self.clients[key] = ZeroMQClientQueue(key, self.get_limit(key))
+        client.received += 1
+        client.last_seen = time.monotonic()
+        if len(client.queue) >= self.max_queue:
+            client.queue.popleft()
+            client.dropped += 1
+            self.log_limiter.log("fair_queuing_drop", "WARNING",
+                                 "Fair queuing: queue of {} full, dropping its oldest request", key)
+        client.queue.append(message)
+        if not client.active:
+            client.active = True
+            self.active.append(client)
+
+    def schedule(self, backend_socket: zmq.Socket, now: float):
+        """
+        Forward queued requests while there is room at the workers, deficit round-robin across the clients.
+
+        :param backend_socket: The backend socket.
+        :param now: The current monotonic time.
+        :return: None
+        """
+        throttled_turns = 0  # consecutive turns of throttled clients, a full round of them ends the pass
+        while self.active and len(self.in_flight) < self.max_in_flight and throttled_turns < len(self.active):
+            client = self.active[0]
+            if not self._resume:
+                client.deficit += self.quantum * client.limit.weight
+            self._resume = False
+            throttled = False
+            out_of_deficit = False
+            while client.queue and len(self.in_flight) < self.max_in_flight:
+                cost = self.cost(client.queue[0])
+                if cost > client.deficit:
+                    out_of_deficit = True
+                    break
+                if not client.take_token(now):
+                    throttled = True
+                    client.throttled += 1
+                    break
+                try:
+                    backend_socket.send_multipart(client.queue[0], zmq.NOBLOCK)
+                except zmq.Again:  # no worker connected or all of them full, retried on the next pass
+                    if client.limit.rate is not None:
+                        client.tokens += 1
+                    self._resume = True
+                    return
+                self.forward(client, client.queue.popleft(), now)
+                client.deficit -= cost
+
+            if not client.queue:  # left the round, an idle client accumulates no deficit
+                client.deficit = 0.0
+                client.active = False
+                self.active.popleft()
+            elif not throttled and not out_of_deficit:
+                self._resume = True  # interrupted by the in flight limit, keeps the rest of its turn
+                return
+            else:
+                if throttled:
+                    client.deficit = 0.0  # a throttled client does not save up deficit while waiting for tokens
+                self.active.rotate(-1)
+            throttled_turns = throttled_turns + 1 if throttled else 0
+
+    def forward(self, client: ZeroMQClientQueue, message: list, now: float):
+        client.forwarded += 1
+        client.in_flight += 1
+        key = self.get_request_key(message)
+        previous = self.in_flight.pop(key, None)
+        if previous is not None:  # the client sent again before the reply, the previous request counts as lost
+            previous[0].in_flight -= 1
+        self.in_flight[key] = (client, now)
+        if self.tracer is not None:
+            self.trace_forward(message)
+
+    def complete(self, message: list):
+        """
+        Account for a reply from the workers. Only the last message of a streamed response completes the request.
+
+        :param message: The reply, including its envelope.
+        :return: None
+        """
+        if message[-1][:1] == b'{' and b'"stream"' in message[-1] and not json.loads(message[-1]).get("end"):
+            return
+        request = self.in_flight.pop(self.get_request_key(message), None)
+        if request is not None:
+            client, forwarded_at = request
+            client.in_flight -= 1
+            client.completed += 1
+            client.latency_total += time.monotonic() - forwarded_at
+
+    @staticmethod
+    def get_request_key(message: list) -> tuple:
+        # the envelope: the client identity, plus the request id frame of correlated REQ sockets
+        return tuple(message[:message.index(b'')]) if b'' in message else (message[0],)
+
+    def expire_in_flight(self, now: float):
+        # the oldest requests come first, stop at the first one still valid
+        while self.in_flight:
+            key = next(iter(self.in_flight))
+            client, forwarded_at = self.in_flight[key]
+            if now - forwarded_at < self.in_flight_timeout:
+                break
+            del self.in_flight[key]
+            client.in_flight -= 1
+
+    def prune(self, now: float):
+        self._last_prune = now
+        for key, client in list(self.clients.items()):
+            if not client.active and not client.in_flight and now - client.last_seen > self.idle_timeout:
+                del self.clients[key]
+
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        :return: The metrics of every client, by identity (or queue key): requests queued, in flight, received,
+                 forwarded, completed and dropped, scheduling turns throttled by the rate limit, forwarded requests per
+                 second since the previous call and mean latency at the workers (ms).
+        """
+        now = time.monotonic()
+        return {key.decode('utf-8', errors='replace'): client.get_stats(now)
+                for key, client in list(self.clients.items())}
+
+    def shutdown_routing(self):
+        logger.info("Shutting down fair queuing routing...")
+        self.shutdown_requested = True
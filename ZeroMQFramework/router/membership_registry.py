@@ -0,0 +1,120 @@
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from ZeroMQFramework.common.node_type import ZeroMQNodeType
+from ZeroMQFramework.heartbeat.node_info import ZeroMQNodeInfo
+from ZeroMQFramework.helpers.utils import get_current_time
+
+
+@dataclass
+class ZeroMQMember:
+    node_id: str
+    session_id: str
+    node_type: ZeroMQNodeType
+    endpoint: Optional[str]
+    load: Optional[dict]
+    first_seen: int
+    last_seen: int
+    reachable: bool = True  # cleared when the router fails to route to the node, set again by its next heartbeat
+
+    @property
+    def identity(self) -> bytes:
+        """The socket identity of the node, see ZeroMQBase.get_socket_identity"""
+        return f"{self.node_id}_{self.session_id}".encode('utf-8')
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data['node_type'] = self.node_type.value
+        return data
+
+
+class ZeroMQMembershipRegistry:
+    """
+    Cluster membership as seen by a router, fed by the heartbeats it receives.
+
+    A member is alive if its last heartbeat is more recent than ``timeout`` and the router did not fail to reach it
+    since. This is stricter than the heartbeat receiver, which only forgets a node after ``max_missed`` checks, so
+    routing strategies can skip a dead worker right away.
+    """
+
+    def __init__(self, timeout: int = 30):
+        """
+        :param timeout: Time in seconds after the last heartbeat when a member is considered dead.
+        """
+        self.timeout = timeout * 1000  # ms
+        self.members: Dict[bytes, ZeroMQMember] = {}
+        self.lock = threading.Lock()
+
+    def update(self, node_info: ZeroMQNodeInfo):
+        """
+        Record a heartbeat. To be used as the heartbeat receiver on_node_heartbeat_callback.
+
+        :param node_info: The node info carried by the heartbeat.
+        :return: None
+        """
+        now = get_current_time()
+        identity = f"{node_info.node_id}_{node_info.session_id}".encode('utf-8')
+        with self.lock:
+            member = self.members.get(identity)
+            if member is None:
+                self.members[identity] = ZeroMQMember(node_id=node_info.node_id, session_id=node_info.session_id,
+                                                      node_type=node_info.node_type, endpoint=node_info.endpoint,
+                                                      load=node_info.load, first_seen=now, last_seen=now)
+                logger.debug(f"Membership: {node_info.node_type.value} {identity} joined")
+            else:
+                member.endpoint = node_info.endpoint
+                member.load = node_info.load
+                member.last_seen = now
+                member.reachable = True
+
+    def remove(self, node_info: ZeroMQNodeInfo):
+        """
+        Forget a node. To be used as the heartbeat receiver on_node_disconnected_callback.
+
+        :param node_info: The node info of the lost node.
+        :return: None
+        """
+        identity = f"{node_info.node_id}_{node_info.session_id}".encode('utf-8')
+        with self.lock:
+            if self.members.pop(identity, None) is not None:
+                logger.debug(f"Membership: {node_info.node_type.value} {identity} left")
+
+    def mark_unreachable(self, identity: bytes):
+        """
+        Mark a member as unreachable (e.g. routing to it failed) until its next heartbeat.
+
+        :param identity: The socket identity of the member.
+        :return: None
+        """
+        with self.lock:
+            member = self.members.get(identity)
+            if member is not None and member.reachable:
+                member.reachable = False
+                logger.debug(f"Membership: {identity} marked unreachable")
+
+    def is_alive(self, member: ZeroMQMember, now: Optional[int] = None) -> bool:
+        now = now if now is not None else get_current_time()
+        return member.reachable and now - member.last_seen <= self.timeout
+
+    def get_members(self, node_type: Optional[ZeroMQNodeType] = None, alive_only: bool = True) -> List[ZeroMQMember]:
+        """
+        Query the members.
+
+        :param node_type: Only return members of this type, all types if None.
+        :param alive_only: Only return members that are alive.
+        :return: The matching members, ordered by join time.
+        """
+        now = get_current_time()
+        with self.lock:
+            return [member for member in self.members.values()
+                    if (node_type is None or member.node_type == node_type)
+                    and (not alive_only or self.is_alive(member, now))]
+
+    def get_alive_identities(self, node_type: ZeroMQNodeType = ZeroMQNodeType.WORKER) -> List[bytes]:
+        return [member.identity for member in self.get_members(node_type)]
+
+    def to_dicts(self, node_type: Optional[ZeroMQNodeType] = None, alive_only: bool = True) -> List[dict]:
+        return [member.to_dict() for member in self.get_members(node_type, alive_only)]
@@ -0,0 +1,123 @@
+from collections import deque
+from typing import Optional
+
+import zmq
+from loguru import logger
+
+from ..router.routing_strategy import ZeroMQRoutingStrategy
+from ..router.traffic_capture import REPLY, REQUEST
+
+
+class ZeroMQMembershipRoutingStrategy(ZeroMQRoutingStrategy):
+    """
+    Routes every request to a worker known to be alive by the router membership registry.
+
+    The backend socket is a ROUTER socket, so each request is addressed to a worker identity. Workers are picked
+    round-robin among the alive ones, a worker that cannot be reached is marked as such and skipped right away, a
+    worker whose queue is full (high water mark) is skipped for this request. Requests are queued (up to
+    ``max_pending``) while no worker can take them.
+    Workers must send heartbeats to the router to be routed to.
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self.shutdown_requested = False
+        self.max_pending = max_pending
+        self.pending = deque()
+        self._next_worker = 0
+
+    def get_backend_socket_type(self) -> int:
+        return zmq.ROUTER
+
+    def select_worker(self, message: list) -> Optional[bytes]:
+        """
+        Select the worker a request is sent to. Override to change the selection policy.
+
+        :param message: The request, including its envelope.
+        :return: The identity of the selected worker, or None if no worker is available.
+        """
+        identities = self.membership_registry.get_alive_identities()
+        if not identities:
+            return None
+        self._next_worker = (self._next_worker + 1) % len(identities)
+        return identities[self._next_worker]
+
+    def dispatch(self, backend_socket: zmq.Socket, message: list) -> bool:
+        """
+        Send a request to a selected worker, skipping the unreachable ones and the ones whose queue is full.
+
+        :param backend_socket: The backend (ROUTER) socket.
+        :param message: The request, including its envelope.
+        :return: True if the request was sent, False if no worker can take it.
+        """
+        full = set()
+        attempts = len(self.membership_registry.get_alive_identities())
+        while attempts > 0:
+            identity = self.select_worker(message)
+            if identity is None:
+                return False
+            if identity in full:
+                attempts -= 1
+                continue
+            try:
+                backend_socket.send_multipart([identity] + message, zmq.NOBLOCK)
+            except zmq.Again:  # the queue of the worker is full (ROUTER_MANDATORY)
+                full.add(identity)
+                attempts -= 1
+                self.log_limiter.log("membership_full", "WARNING",
+                                     "Membership routing: the queue of worker {} is full, trying another one", identity)
+                continue
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EHOSTUNREACH:
+                    raise
+                self.membership_registry.mark_unreachable(identity)
+                continue
+            if self.tracer is not None:
+                self.trace_forward(message)
+            self.track_stream(message, identity)
+            return True
+        return False
+
+    def route(self, frontend_socket: zmq.Socket, backend_socket: zmq.Socket, poller: zmq.Poller = None,
+              poll_timeout: int = 1000):
+        if self.membership_registry is None:
+            raise ValueError("Membership routing requires the router membership registry")
+
+        while not self.shutdown_requested:
+            # poll more often while requests are waiting for a worker
+            socks = dict(poller.poll(min(poll_timeout, 10) if self.pending else poll_timeout))
+            if frontend_socket in socks and socks[frontend_socket] == zmq.POLLIN:
+                message = frontend_socket.recv_multipart()
+                if self.capture is not None:
+                    self.capture.record(message, REQUEST)
+                if self.is_stream_credit(message):
+                    self.forward_stream_credit(backend_socket, message)
+                elif not self.handle_membership_request(frontend_socket, message):
+                    if self.tracer is not None:
+                        self.trace_request(message)
+                    if self.pending or not self.dispatch(backend_socket, message):
+                        self.queue(message)
+
+            if backend_socket in socks and socks[backend_socket] == zmq.POLLIN:
+                message = backend_socket.recv_multipart()[1:]  # drop the worker identity
+                if not self.is_probe(message):
+                    if self.capture is not None:
+                        self.capture.record(message, REPLY)
+                    if self.tracer is not None:
+                        self.trace_reply(message)
+                    self.end_stream(message)
+                    frontend_socket.send_multipart(message)
+
+            while self.pending and self.dispatch(backend_socket, self.pending[0]):
+                self.pending.popleft()
+
+    def queue(self, message: list):
+        if len(self.pending) >= self.max_pending:
+            dropped = self.pending.popleft()
+            self.log_limiter.log("membership_drop", "WARNING",
+                                 "Membership routing: no worker available, dropping the oldest request from {}",
+                                 dropped[0])
+        self.pending.append(message)
+
+    def shutdown_routing(self):
+        logger.info("Shutting down membership routing...")
+        self.shutdown_requested = True
@@ -1,17 +1,23 @@
-from ZeroMQFramework import ZeroMQBase
+from ZeroMQFramework.common.base import ZeroMQBase
 from ZeroMQFramework.common.connection_protocol import *
 from ZeroMQFramework.router.routing_proxy import ZeroMQRoutingProxy
 from ZeroMQFramework.router.routing_strategy import ZeroMQRoutingStrategy
+from ZeroMQFramework.router.membership_registry import ZeroMQMembershipRegistry
+from ZeroMQFramework.router.traffic_capture import ZeroMQTrafficCapture
+from ZeroMQFramework.common.tracing import ZeroMQTracer
 from loguru import logger
 from ZeroMQFramework.common.node_type import ZeroMQNodeType
 from ZeroMQFramework.heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
 import zmq
+from typing import List
 
 
 class ZeroMQRouter(ZeroMQBase):
     def __init__(self, config_file: str, frontend_connection: ZeroMQConnection, backend_connection: ZeroMQConnection,
                  heartbeat_config: ZeroMQHeartbeatConfig = None,
-                 strategy: Optional[ZeroMQRoutingStrategy] = None):
+                 strategy: Optional[ZeroMQRoutingStrategy] = None,
+                 peer_heartbeat_configs: Optional[List[ZeroMQHeartbeatConfig]] = None, backend_bind: bool = True,
+                 capture: Optional[ZeroMQTrafficCapture] = None, tracer: Optional[ZeroMQTracer] = None):
         super().__init__(config_file, connection=frontend_connection, node_type=ZeroMQNodeType.ROUTER,
                          handle_message=None, context=None, heartbeat_config=heartbeat_config)
 
@@ -21,18 +27,49 @@ class ZeroMQRouter(ZeroMQBase):
         self.backend_connection = backend_connection
         self.backend_socket = None
         self.backend_connection_string = None
+        self.backend_bind = backend_bind  # connect instead to chain routers, the backend being a router frontend
         self.strategy = strategy if strategy else ZeroMQRoutingProxy()
+
+        # Fed by the heartbeats received by the router, queryable with get_members and by the clients
+        self.membership = ZeroMQMembershipRegistry(timeout=heartbeat_config.timeout if heartbeat_config else 30)
+        if self.heartbeat_enabled:
+            self.heartbeat.on_node_heartbeat_callback = self.membership.update
+            self.heartbeat.on_node_disconnected_callback = self.membership.remove
+        self.strategy.set_membership_registry(self.membership)
+        self.strategy.set_backend_bind(backend_bind)
+
+        # Records the frontend traffic (requests and replies) for deterministic replay, see benchmarks/replay_capture.py
+        self.capture = capture
+        self.strategy.set_capture(capture)
+
+        # Records a span for the requests traced by the clients (router queue and reply times), see ZeroMQTracer
+        self.tracer = tracer
+        if tracer is not None:
+            self.strategy.set_tracer(tracer, {"node.type": self.node_type.value, "node.id": self.node_id})
+
+        # High availability: the router announces itself (and its frontend endpoint) to the other routers by sending
+        # heartbeats to them, so each router membership knows its peers and clients can discover them for failover
+        self.peer_heartbeats = [self.create_heartbeat_sender(config, self.frontend_connection)
+                                for config in peer_heartbeat_configs or []]
         self.configure_socket()
 
     def configure_socket(self):
         self.frontend_socket = self.context.socket(zmq.ROUTER)
         self.frontend_socket.setsockopt(zmq.IDENTITY, self.get_socket_identity())
+        # a client resets its socket after a timeout and reconnects with the same identity, the new connection takes
+        # the identity over instead of being dropped while the old one is not closed yet
+        self.frontend_socket.setsockopt(zmq.ROUTER_HANDOVER, 1)
+        self.frontend_connection.apply_socket_options(self.frontend_socket)
 
-        self.backend_socket = self.context.socket(zmq.DEALER)
+        self.backend_socket = self.context.socket(self.strategy.get_backend_socket_type())
         self.backend_socket.setsockopt(zmq.IDENTITY, self.get_socket_identity())
+        self.backend_connection.apply_socket_options(self.backend_socket)
+        if self.backend_socket.socket_type == zmq.ROUTER:
+            # fail instead of silently dropping messages addressed to a worker that is gone
+            self.backend_socket.setsockopt(zmq.ROUTER_MANDATORY, 1)
 
         self.frontend_connection_string = self.frontend_connection.get_connection_string(bind=True)
-        self.backend_connection_string = self.backend_connection.get_connection_string(bind=True)
+        self.backend_connection_string = self.backend_connection.get_connection_string(bind=self.backend_bind)
 
         self.poller.register(self.frontend_socket, zmq.POLLIN)
         self.poller.register(self.backend_socket, zmq.POLLIN)
@@ -41,10 +78,16 @@ class ZeroMQRouter(ZeroMQBase):
 
         try:
             self.frontend_socket.bind(self.frontend_connection_string)
-            self.backend_socket.bind(self.backend_connection_string)
+            if self.backend_bind:
+                self.backend_socket.bind(self.backend_connection_string)
+            else:
+                self.backend_socket.connect(self.backend_connection_string)
+            self.strategy.setup_sockets(self.context, self.poller)
 
             if self.heartbeat_enabled:
                 self.heartbeat.start()
+            for peer_heartbeat in self.peer_heartbeats:
+                peer_heartbeat.start()
 
             logger.info(f"router started and bound to frontend {self.frontend_connection_string} "
                         f"and backend {self.backend_connection_string}")
@@ -62,6 +105,16 @@ class ZeroMQRouter(ZeroMQBase):
         finally:
             self.cleanup()
 
+    def get_members(self, node_type: Optional[ZeroMQNodeType] = None, alive_only: bool = True) -> list:
+        """
+        Query the membership registry.
+
+        :param node_type: Only return members of this type, all types if None.
+        :param alive_only: Only return members that are alive.
+        :return: A list of ZeroMQMember.
+        """
+        return self.membership.get_members(node_type, alive_only)
+
     def shutdown_initiated(self):
         self.strategy.shutdown_routing()
 
@@ -74,5 +127,10 @@ class ZeroMQRouter(ZeroMQBase):
             self.backend_socket.close()
             self.poller.unregister(self.backend_socket)
         # self.strategy.shutdown_routing()
+        self.strategy.cleanup_sockets(self.poller)
+        for peer_heartbeat in self.peer_heartbeats:
+            peer_heartbeat.stop()
+        if self.capture is not None:
+            self.capture.close()
         super().cleanup()
         logger.info("Cleaned up ZeroMQ sockets and context.")
@@ -1,23 +1,130 @@
+from collections import deque
+
 import zmq
 from loguru import logger
 from ..router.routing_strategy import ZeroMQRoutingStrategy
+from ..router.traffic_capture import REPLY, REQUEST
 
 
 class ZeroMQRoutingProxy(ZeroMQRoutingStrategy):
-    def __init__(self):
+    """
+    The default strategy: requests are sent round-robin to the connected workers, replies back to their clients.
+
+    When the router binds its backend, the backend is a ROUTER socket: the workers announce themselves as they connect
+    (ZMQ_PROBE_ROUTER) and every request is addressed to one of them, so the credits of a streamed response reach the
+    worker producing it (see ZeroMQClient.stream_message). A worker whose queue is full is skipped, a worker that is
+    gone is forgotten, and requests are queued (up to ``max_pending``) while no worker can take them.
+    When the backend connects to the frontend of another router (backend_bind False), it is a DEALER socket and
+    streams are not flow controlled.
+    """
+
+    def __init__(self, max_pending: int = 10000):
         self.shutdown_requested = False
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.workers = deque()  # identities of the connected workers, in round-robin order
+        self._known_workers = set()
+
+    def get_backend_socket_type(self) -> int:
+        return zmq.ROUTER if self.backend_bind else zmq.DEALER
 
     def route(self, frontend_socket: zmq.Socket, backend_socket: zmq.Socket, poller: zmq.Poller = None,
               poll_timeout: int = 1000):
+        if backend_socket.socket_type == zmq.DEALER:
+            self.forward(frontend_socket, backend_socket, poller, poll_timeout)
+            return
+
+        while not self.shutdown_requested:
+            # poll more often while requests are waiting for a worker
+            socks = dict(poller.poll(min(poll_timeout, 10) if self.pending else poll_timeout))
+            if frontend_socket in socks and socks[frontend_socket] == zmq.POLLIN:
+                message = frontend_socket.recv_multipart()
+                if self.capture is not None:
+                    self.capture.record(message, REQUEST)
+                if self.is_stream_credit(message):
+                    self.forward_stream_credit(backend_socket, message)
+                elif not self.handle_membership_request(frontend_socket, message):
+                    if self.tracer is not None:
+                        self.trace_request(message)
+                    if self.pending or not self.dispatch(backend_socket, message):
+                        self.queue(message)
+
+            if backend_socket in socks and socks[backend_socket] == zmq.POLLIN:
+                message = backend_socket.recv_multipart()
+                identity, message = message[0], message[1:]
+                if identity not in self._known_workers:
+                    self._known_workers.add(identity)
+                    self.workers.append(identity)
+                if not self.is_probe(message):
+                    if self.capture is not None:
+                        self.capture.record(message, REPLY)
+                    if self.tracer is not None:
+                        self.trace_reply(message)
+                    self.end_stream(message)
+                    frontend_socket.send_multipart(message)
+
+            while self.pending and self.dispatch(backend_socket, self.pending[0]):
+                self.pending.popleft()
+
+    def dispatch(self, backend_socket: zmq.Socket, message: list) -> bool:
+        """
+        Send a request to the next worker able to take it.
+
+        :param backend_socket: The backend (ROUTER) socket.
+        :param message: The request, including its envelope.
+        :return: True if the request was sent, False if no worker can take it.
+        """
+        for _ in range(len(self.workers)):
+            identity = self.workers[0]
+            self.workers.rotate(-1)
+            try:
+                backend_socket.send_multipart([identity] + message, zmq.NOBLOCK)
+            except zmq.Again:  # the queue of the worker is full
+                continue
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EHOSTUNREACH:
+                    raise
+                self.workers.remove(identity)  # disconnected, announces itself again if it reconnects
+                self._known_workers.discard(identity)
+                continue
+            if self.tracer is not None:
+                self.trace_forward(message)
+            self.track_stream(message, identity)
+            return True
+        return False
+
+    def queue(self, message: list):
+        if len(self.pending) >= self.max_pending:
+            dropped = self.pending.popleft()
+            self.log_limiter.log("proxy_drop", "WARNING",
+                                 "Routing proxy: no worker available, dropping the oldest request from {}", dropped[0])
+        self.pending.append(message)
 
+    def forward(self, frontend_socket: zmq.Socket, backend_socket: zmq.Socket, poller: zmq.Poller,
+                poll_timeout: int):
+        # DEALER backend: libzmq balances the requests, no worker can be addressed
         while not self.shutdown_requested:
             socks = dict(poller.poll(poll_timeout))
             if frontend_socket in socks and socks[frontend_socket] == zmq.POLLIN:
                 message = frontend_socket.recv_multipart()
-                backend_socket.send_multipart(message)
+                if self.capture is not None:
+                    self.capture.record(message, REQUEST)
+                if not self.is_stream_credit(message) and not self.handle_membership_request(frontend_socket,
+                                                                                             message):
+                    if self.tracer is not None:
+                        self.trace_request(message)
+                    backend_socket.send_multipart(self.disable_stream_credit(message))
+                    if self.tracer is not None:
+                        self.trace_forward(message)
 
             if backend_socket in socks and socks[backend_socket] == zmq.POLLIN:
                 message = backend_socket.recv_multipart()
+                if self.is_probe(message):
+                    continue
+                if self.capture is not None:
+                    self.capture.record(message, REPLY)
+                if self.tracer is not None:
+                    self.trace_reply(message)
                 frontend_socket.send_multipart(message)
 
     def shutdown_routing(self):
@@ -1,11 +1,35 @@
+import json
 from abc import ABC, abstractmethod
+from typing import Dict, Optional
 
 import zmq
+from loguru import logger
 
-from ZeroMQFramework import ZeroMQConnection
+from ZeroMQFramework.common.event import ZeroMQEvent
+from ZeroMQFramework.common.node_type import ZeroMQNodeType
+from ZeroMQFramework.router.membership_registry import ZeroMQMembershipRegistry
+from ZeroMQFramework.helpers.utils import create_message, parse_message
+from ZeroMQFramework.helpers.log_sink import ZeroMQLogRateLimiter
+from ZeroMQFramework.router.traffic_capture import REPLY, ZeroMQTrafficCapture
+from ZeroMQFramework.common.tracing import ZeroMQSpan, ZeroMQTracer, get_traceparent
+from ZeroMQFramework.common.object_registry import OBJECT_REF, object_registry
+
+MEMBERSHIP_EVENT = ZeroMQEvent.MEMBERSHIP.value.encode('utf-8')
+STREAM_CREDIT_EVENT = ZeroMQEvent.STREAM_CREDIT.value.encode('utf-8')
+CREDIT_MARKER = b'"credit"'  # in the metadata of a flow controlled stream request, checked before parsing JSON
+END_MARKER = b'"end": true'  # in the metadata of the last message of a stream
 
 
 class ZeroMQRoutingStrategy(ABC):
+    membership_registry: Optional[ZeroMQMembershipRegistry] = None
+    log_limiter = ZeroMQLogRateLimiter()  # shared by the strategies, for the logs made per routed message
+    capture: Optional[ZeroMQTrafficCapture] = None  # records the frontend traffic, see set_capture
+    tracer: Optional[ZeroMQTracer] = None  # records a span per traced request, see set_tracer
+    max_traced_requests = 10000  # spans waiting for their reply, the oldest are dropped (lost replies, streams)
+    backend_bind = True  # False when the router backend connects to the frontend of another router
+    stream_workers: Optional[Dict[str, bytes]] = None  # stream id: identity of the worker producing it
+    max_streams = 10000  # streams tracked, the oldest are dropped (streams abandoned by their worker)
+
     @abstractmethod
     def route(self, frontend_socket: zmq.Socket, backend_socket: zmq.Socket, poller: zmq.Poller = None,
               poll_timeout: int = 1000):
@@ -13,4 +37,229 @@ class ZeroMQRoutingStrategy(ABC):
 
     @abstractmethod
     def shutdown_routing(self):
-        pass
\ No newline at end of file
+        pass
+
+    def get_backend_socket_type(self) -> int:
+        """
+        :return: The type of the router backend socket. DEALER by default, strategies addressing individual
+                 workers need a ROUTER socket.
+        """
+        return zmq.DEALER
+
+    def setup_sockets(self, context: zmq.Context, poller: zmq.Poller):
+        """
+        Called by the router before routing, for strategies that need sockets of their own (registered on the
+        router poller).
+        """
+        pass
+
+    def cleanup_sockets(self, poller: zmq.Poller):
+        """Called by the router during cleanup to close the sockets created in setup_sockets."""
+        pass
+
+    def set_backend_bind(self, backend_bind: bool):
+        """Called by the router before creating its backend socket: bound, or connected to another router frontend."""
+        self.backend_bind = backend_bind
+
+    def set_membership_registry(self, registry: ZeroMQMembershipRegistry):
+        """Called by the router to share its membership registry with the strategy."""
+        self.membership_registry = registry
+
+    def set_capture(self, capture: Optional[ZeroMQTrafficCapture]):
+        """
+        Called by the router to record its frontend traffic. Strategies record every message received from the
+        frontend socket (REQUEST) and every message sent to it (REPLY) when a capture is set.
+        """
+        self.capture = capture
+
+    def set_tracer(self, tracer: Optional[ZeroMQTracer], attributes: Optional[dict] = None):
+        """
+        Called by the router to trace the requests carrying a trace context. Strategies call trace_request when a
+        request is received from the frontend socket, trace_forward once it is sent to the workers and trace_reply
+        before sending a reply to the frontend socket, when a tracer is set.
+
+        :param tracer: The tracer, None to stop tracing.
+        :param attributes: The attributes of the router spans.
+        """
+        self.tracer = tracer
+        self.trace_attributes = attributes or {}
+        self.traced_requests: Dict[str, ZeroMQSpan] = {}  # trace context of the request: router span
+
+    def trace_request(self, message: list):
+        traceparent = get_traceparent(message[-1])
+        if traceparent is None:
+            return
+        span = self.tracer.start_span("router", traceparent, attributes=self.trace_attributes)
+        if span is None:
+            return
+        if len(self.traced_requests) >= self.max_traced_requests:
+            del self.traced_requests[next(iter(self.traced_requests))]
+        self.traced_requests[traceparent] = span
+
+    def trace_forward(self, message: list):
+        if not self.traced_requests:
+            return
+        span = self.traced_requests.get(get_traceparent(message[-1]))
+        if span is not None:
+            span.add_event("forwarded")
+
+    def trace_reply(self, message: list):
+        if not self.traced_requests:
+            return
+        span = self.traced_requests.pop(get_traceparent(message[-1]), None)
+        if span is not None:
+            self.tracer.end_span(span)
+
+    def handle_membership_request(self, frontend_socket: zmq.Socket, message: list) -> bool:
+        """
+        Answer a client membership (endpoint discovery) request from the membership registry.
+
+        :param frontend_socket: The frontend socket the request was received on.
+        :param message: The request, including its envelope.
+        :return: True if the message was a membership request and was answered, False otherwise.
+        """
+        if self.membership_registry is None or MEMBERSHIP_EVENT not in message or b'' not in message:
+            return False  # cheap checks first, this is called for every frontend message
+        delimiter = message.index(b'')
+        if len(message) < delimiter + 3 or message[delimiter + 1] != MEMBERSHIP_EVENT:
+            return False
+
+        metadata = None
+        try:
+            request = parse_message(message[delimiter + 1:])
+            query = request["event_data"] or {}
+            node_type = ZeroMQNodeType(query["node_type"]) if query.get("node_type") else None
+            members = self.membership_registry.to_dicts(node_type=node_type)
+            if request["metadata"].get("request_id"):
+                metadata = {"request_id": request["metadata"]["request_id"]}
+        except Exception as e:
+            self.log_limiter.log("membership_request", "ERROR", "Invalid membership request: {}", e)
+            members = []
+        reply = message[:delimiter + 1] + create_message(ZeroMQEvent.MEMBERSHIP.value, members, metadata=metadata)
+        if self.capture is not None:
+            self.capture.record(reply, REPLY)
+        frontend_socket.send_multipart(reply)
+        return True
+
+    @staticmethod
+    def is_probe(message: list) -> bool:
+        """
+        :param message: A message received from the backend, without the worker identity.
+        :return: True for the empty message a worker sends when it connects (ZMQ_PROBE_ROUTER), which is not a reply.
+        """
+        return len(message) == 1 and not message[0]
+
+    @staticmethod
+    def is_stream_credit(message: list) -> bool:
+        """
+        :param message: A message received from the frontend, including its envelope.
+        :return: True if the message carries the credits of a stream (see ZeroMQClient.stream_message).
+        """
+        if STREAM_CREDIT_EVENT not in message or b'' not in message:
+            return False  # cheap checks first, this is called for every frontend message
+        delimiter = message.index(b'')
+        return len(message) > delimiter + 1 and message[delimiter + 1] == STREAM_CREDIT_EVENT
+
+    @staticmethod
+    def get_metadata(message: list) -> dict:
+        """
+        :param message: A message, including its envelope.
+        :return: The metadata of the message, its event data is not read.
+        :raises ValueError: If the metadata cannot be parsed.
+        """
+        if len(message) - message.index(b'') < 4:
+            return {}
+        if message[-1] == OBJECT_REF:
+            try:
+                return object_registry.peek(message[-2])[1] or {}
+            except KeyError:
+                raise ValueError("Object passed by reference not found")
+        return json.loads(message[-1])
+
+    def get_credit_stream(self, message: list) -> Optional[str]:
+        """
+        :param message: A request, including its envelope.
+        :return: The stream id of a flow controlled stream request, None for any other request.
+        """
+        if CREDIT_MARKER not in message[-1] and message[-1] != OBJECT_REF:
+            return None
+        try:
+            metadata = self.get_metadata(message)
+        except ValueError:
+            return None
+        return metadata.get("stream") if "credit" in metadata else None
+
+    def track_stream(self, message: list, identity: bytes):
+        """
+        Remember the worker a flow controlled stream request was sent to, so its credits reach it. For the strategies
+        addressing the workers (ROUTER backend), called once a request is sent.
+
+        :param message: The request, including its envelope.
+        :param identity: The identity of the worker.
+        :return: None
+        """
+        stream_id = self.get_credit_stream(message)
+        if stream_id is None:
+            return
+        if self.stream_workers is None:
+            self.stream_workers = {}
+        if len(self.stream_workers) >= self.max_streams:
+            del self.stream_workers[next(iter(self.stream_workers))]
+        self.stream_workers[stream_id] = identity
+
+    def forward_stream_credit(self, backend_socket: zmq.Socket, message: list):
+        """
+        Send the credits of a stream to the worker producing it (ROUTER backend). Credits of unknown streams (ended or
+        cancelled) are dropped.
+
+        :param backend_socket: The backend (ROUTER) socket.
+        :param message: The credit message, including its envelope.
+        :return: None
+        """
+        try:
+            stream_id = self.get_metadata(message).get("stream")
+        except ValueError:
+            stream_id = None
+        identity = self.stream_workers.get(stream_id) if self.stream_workers else None
+        if identity is None:
+            return
+        if b'"cancel"' in message[message.index(b'') + 2]:
+            del self.stream_workers[stream_id]
+        try:
+            backend_socket.send_multipart([identity] + message, zmq.NOBLOCK)
+        except zmq.ZMQError as e:
+            self.log_limiter.log("stream_credit", "WARNING", "Cannot send the credits of stream {} to worker {}: {}",
+                                 stream_id, identity, e)
+
+    def end_stream(self, reply: list):
+        """
+        Forget the worker of a stream once its last message is replied.
+
+        :param reply: A reply, including its envelope.
+        :return: None
+        """
+        if not self.stream_workers or (END_MARKER not in reply[-1] and reply[-1] != OBJECT_REF):
+            return
+        try:
+            metadata = self.get_metadata(reply)
+        except ValueError:
+            return
+        if metadata.get("end"):
+            self.stream_workers.pop(metadata.get("stream"), None)
+
+    def disable_stream_credit(self, message: list) -> list:
+        """
+        For the strategies that cannot address a worker (DEALER backends), whose credits would reach any worker:
+        remove the credit of a flow controlled stream request, the worker then streams without waiting for credits
+        and the credit messages of the client are dropped by the router.
+
+        :param message: A request, including its envelope.
+        :return: The request, without credit.
+        """
+        if self.get_credit_stream(message) is None:
+            return message
+        metadata = self.get_metadata(message)
+        del metadata["credit"]
+        if message[-1] == OBJECT_REF:  # the worker reads this very object
+            return message
+        return message[:-1] + [json.dumps(metadata).encode('utf-8')]
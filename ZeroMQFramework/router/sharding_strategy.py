@@ -0,0 +1,153 @@
+import bisect
+import hashlib
+from typing import Dict, List, Optional, Union
+
+import zmq
+from loguru import logger
+
+from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+from ZeroMQFramework.helpers.utils import parse_message
+from ..router.routing_strategy import ZeroMQRoutingStrategy
+from ..router.traffic_capture import REPLY, REQUEST
+
+
+class ZeroMQHashRing:
+    """
+    Consistent hash ring over named backend pools. A key always maps to the same pool, and adding or removing a pool
+    only remaps the keys of that pool.
+    """
+
+    def __init__(self, pools: List[str], key_field: str, virtual_nodes: int = 100):
+        """
+        :param pools: The names of the pools on the ring.
+        :param key_field: The event_data field used as the key.
+        :param virtual_nodes: Number of points per pool on the ring, more points spread the keys more evenly.
+        """
+        if not pools:
+            raise ValueError("A hash ring needs at least one pool")
+        self.pools = pools
+        self.key_field = key_field
+        self.virtual_nodes = virtual_nodes
+        points = sorted((self.hash(f"{pool}#{index}"), pool) for pool in pools for index in range(virtual_nodes))
+        self._hashes = [point[0] for point in points]
+        self._pools = [point[1] for point in points]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def get_pool(self, key) -> str:
+        index = bisect.bisect(self._hashes, self.hash(str(key))) % len(self._hashes)
+        return self._pools[index]
+
+
+class ZeroMQShardingStrategy(ZeroMQRoutingStrategy):
+    """
+    Routes requests to named backend pools by event name, or by a key field of the event data through consistent
+    hash rings, so hot event types scale independently and the same key always reaches the same pool (the same
+    worker if the pool has a single worker).
+
+    Each pool has its own backend socket, bound on its connection (or connected to it, to chain routers into tiers:
+    a pool can be the frontend of another router). Events without a route go to the router backend, or to
+    ``default`` if given.
+    """
+
+    def __init__(self, pools: Dict[str, ZeroMQConnection],
+                 routes: Optional[Dict[str, Union[str, ZeroMQHashRing]]] = None,
+                 default: Union[None, str, ZeroMQHashRing] = None, bind_pools: bool = True):
+        """
+        :param pools: The backend pools, by name.
+        :param routes: Event name to pool name, or to a hash ring of pool names.
+        :param default: The pool (or hash ring) of the events without a route. The router backend if None.
+        :param bind_pools: Bind the pools sockets, or connect them (to the frontend of a next tier router).
+        """
+        self.shutdown_requested = False
+        self.pools = pools
+        self.routes = routes or {}
+        self.default = default
+        self.bind_pools = bind_pools
+        self.pool_sockets: Dict[str, zmq.Socket] = {}
+        self.routed_counts: Dict[str, int] = {}  # per pool, None being the router backend
+
+        for target in list(self.routes.values()) + [default]:
+            names = target.pools if isinstance(target, ZeroMQHashRing) else [target] if target else []
+            unknown = [name for name in names if name not in pools]
+            if unknown:
+                raise ValueError(f"Unknown backend pools {unknown}")
+        self._routes = {event_name.encode('utf-8'): target for event_name, target in self.routes.items()}
+
+    def setup_sockets(self, context: zmq.Context, poller: zmq.Poller):
+        for name, connection in self.pools.items():
+            socket = context.socket(zmq.DEALER)
+            socket.setsockopt(zmq.LINGER, 0)
+            connection.apply_socket_options(socket)
+            connection_string = connection.get_connection_string(bind=self.bind_pools)
+            if self.bind_pools:
+                socket.bind(connection_string)
+            else:
+                socket.connect(connection_string)
+            poller.register(socket, zmq.POLLIN)
+            self.pool_sockets[name] = socket
+            logger.info(f"Sharding: backend pool {name} on {connection_string}")
+
+    def cleanup_sockets(self, poller: zmq.Poller):
+        for socket in self.pool_sockets.values():
+            if socket in poller.sockets:
+                poller.unregister(socket)
+            socket.close()
+        self.pool_sockets = {}
+
+    def select_pool(self, message: list) -> Optional[str]:
+        """
+        :param message: The request, including its envelope.
+        :return: The name of the pool the request is routed to, None for the router backend.
+        """
+        delimiter = message.index(b'')
+        target = self._routes.get(message[delimiter + 1], self.default)
+        if isinstance(target, ZeroMQHashRing):
+            # the request is forwarded, a message passed by reference is left for the worker
+            event_data = parse_message(message[delimiter + 1:], consume=False)["event_data"]
+            key = event_data.get(target.key_field) if isinstance(event_data, dict) else None
+            return target.get_pool(key)
+        return target
+
+    def route(self, frontend_socket: zmq.Socket, backend_socket: zmq.Socket, poller: zmq.Poller = None,
+              poll_timeout: int = 1000):
+        backends = [backend_socket] + list(self.pool_sockets.values())
+
+        while not self.shutdown_requested:
+            socks = dict(poller.poll(poll_timeout))
+            if frontend_socket in socks and socks[frontend_socket] == zmq.POLLIN:
+                message = frontend_socket.recv_multipart()
+                if self.capture is not None:
+                    self.capture.record(message, REQUEST)
+                if not self.is_stream_credit(message) and not self.handle_membership_request(frontend_socket,
+                                                                                             message):
+                    message = self.disable_stream_credit(message)  # the pools cannot address a worker
+                    try:
+                        pool = self.select_pool(message)
+                    except Exception as e:
+                        self.log_limiter.log("sharding_error", "ERROR",
+                                             "Sharding: cannot route message, sending it to the router backend: {}", e)
+                        pool = None
+                    self.routed_counts[pool] = self.routed_counts.get(pool, 0) + 1
+                    if self.tracer is not None:
+                        self.trace_request(message)
+                    (self.pool_sockets[pool] if pool else backend_socket).send_multipart(message)
+                    if self.tracer is not None:
+                        self.trace_forward(message)
+
+            for socket in backends:
+                if socket in socks and socks[socket] == zmq.POLLIN:
+                    message = socket.recv_multipart()
+                    if self.is_probe(message):
+                        continue
+                    if self.capture is not None:
+                        self.capture.record(message, REPLY)
+                    if self.tracer is not None:
+                        self.trace_reply(message)
+                    frontend_socket.send_multipart(message)
+
+    def shutdown_routing(self):
+        logger.info("Shutting down sharding routing...")
+        self.shutdown_requested = True
@@ -0,0 +1,215 @@
+import glob
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Iterator, List, NamedTuple, Optional
+
+from loguru import logger
+
+# File layout: MAGIC, then records of RECORD_HEADER (timestamp, direction, frame count) each followed by its frames,
+# every frame prefixed by FRAME_LENGTH. Little endian, no padding
+MAGIC = b'ZMQCAP\x01\n'
+RECORD_HEADER = struct.Struct("<dBH")
+FRAME_LENGTH = struct.Struct("<I")
+REQUEST = 0  # received by the router frontend, from a client
+REPLY = 1  # sent by the router frontend, to a client
+
+
+class ZeroMQCaptureRecord(NamedTuple):
+    timestamp: float  # seconds since the epoch
+    direction: int  # REQUEST or REPLY
+    frames: List[memoryview]  # the frames as seen by the frontend socket, the client identity first
+
+
+class ZeroMQTrafficCapture:
+    """
+    Records the traffic of a router frontend (see ZeroMQRouter capture) to an append-only file, for replaying it
+    later against another build or topology.
+
+    Every request received from a client and every reply sent to a client is written as a timestamped record of its
+    frames. The writes go through a buffer of ``buffer_size`` bytes, flushed at least every ``flush_interval`` seconds,
+    so capturing costs the router a struct pack and a memory copy per message. Once the file reaches ``max_bytes`` it
+    is rotated like a log file (path.1 being the previous one), keeping ``max_files`` rotated files.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, max_files: int = 10,
+                 buffer_size: int = 1024 * 1024, flush_interval: float = 1.0, capture_replies: bool = True):
+        """
+        :param path: The capture file, appended to if it exists.
+        :param max_bytes: Size from which the file is rotated, 0 to never rotate.
+        :param max_files: Number of rotated files kept, the oldest are deleted.
+        :param buffer_size: Write buffer size in bytes.
+        :param flush_interval: Maximum seconds a record stays in the buffer.
+        :param capture_replies: Also record the replies, to compare the original latencies on replay.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.capture_replies = capture_replies
+        self.records = 0
+        self.bytes_written = 0
+        self.rotations = 0
+        self._file = None
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "ab", buffering=self.buffer_size)
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(MAGIC)
+            self._file.flush()  # readers tell a capture from another file by its header
+            self._size = len(MAGIC)
+
+    def record(self, frames: list, direction: int = REQUEST):
+        """
+        Append a message to the capture.
+
+        :param frames: The frames of the message, the client identity first.
+        :param direction: REQUEST or REPLY.
+        :return: None
+        """
+        if direction == REPLY and not self.capture_replies or self._file is None:
+            return
+        parts = [RECORD_HEADER.pack(time.time(), direction, len(frames))]
+        for frame in frames:
+            parts.append(FRAME_LENGTH.pack(len(frame)))
+            parts.append(frame)
+        record = b''.join(parts)
+        self._file.write(record)
+        self._size += len(record)
+        self.records += 1
+        self.bytes_written += len(record)
+        if self.max_bytes and self._size >= self.max_bytes:
+            self.rotate()
+        else:
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = now
+
+    def rotate(self):
+        """
+        Close the current file, shift the rotated ones (path.1 to path.2, ...) and start a new file.
+
+        :return: None
+        """
+        self._file.close()
+        for index in range(self.max_files - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.max_files > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.unlink(self.path)
+        stale = f"{self.path}.{self.max_files + 1}"
+        if os.path.exists(stale):
+            os.unlink(stale)
+        self.rotations += 1
+        logger.debug("Traffic capture: {} rotated", self.path)
+        self._open()
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info("Traffic capture: {} records ({} bytes) written to {}", self.records, self.bytes_written,
+                        self.path)
+
+    def get_stats(self) -> dict:
+        return {"records": self.records, "bytes_written": self.bytes_written, "rotations": self.rotations}
+
+
+class ZeroMQCaptureReader:
+    """
+    Reads a capture file through a read only memory map: the frames of the records are memoryviews of the map, so
+    reading a capture copies nothing and a replay can send the frames as they are. A record truncated by a crash of
+    the router (the end of the file) is ignored.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The capture file.
+        :raises ValueError: If the file is not a capture file.
+        """
+        self.path = path
+        self._map = None
+        with open(path, "rb") as capture_file:
+            header = capture_file.read(len(MAGIC))
+            if not MAGIC.startswith(header):
+                raise ValueError(f"{path} is not a traffic capture file")
+            if len(header) == len(MAGIC):  # else a file just created, nothing flushed yet
+                self._map = mmap.mmap(capture_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def get_files(path: str) -> List[str]:
+        """
+        :param path: The capture file given to ZeroMQTrafficCapture.
+        :return: The capture file and its rotated files, oldest first.
+        """
+        rotated = [(int(match.group(1)), name) for name in glob.glob(glob.escape(path) + ".*")
+                   for match in [re.fullmatch(re.escape(path) + r"\.(\d+)", name)] if match]
+        files = [name for _, name in sorted(rotated, reverse=True)]
+        return files + [path] if os.path.exists(path) else files
+
+    def __iter__(self) -> Iterator[ZeroMQCaptureRecord]:
+        if self._map is None:
+            return
+        view = memoryview(self._map)
+        offset = len(MAGIC)
+        end = len(self._map)
+        while offset + RECORD_HEADER.size <= end:
+            timestamp, direction, count = RECORD_HEADER.unpack_from(self._map, offset)
+            position = offset + RECORD_HEADER.size
+            frames = []
+            for _ in range(count):
+                if position + FRAME_LENGTH.size > end:
+                    return
+                (length,) = FRAME_LENGTH.unpack_from(self._map, position)
+                position += FRAME_LENGTH.size
+                if position + length > end:
+                    return
+                frames.append(view[position:position + length])
+                position += length
+            yield ZeroMQCaptureRecord(timestamp, direction, frames)
+            offset = position
+
+    def close(self):
+        """
+        Unmap the file, the frames of its records must not be used anymore (or be released first).
+
+        :return: None
+        """
+        if self._map is None:
+            return
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # frames still referenced, the map is released with them
+
+
+def read_capture(path: str, direction: Optional[int] = None) -> Iterator[ZeroMQCaptureRecord]:
+    """
+    Iterate over the records of a capture and of its rotated files, oldest first.
+
+    :param path: The capture file given to ZeroMQTrafficCapture.
+    :param direction: Only the records of this direction (REQUEST or REPLY), all of them if None.
+    :return: An iterator of records. Their frames are only valid until the next file is opened, copy them to keep
+             them longer.
+    """
+    for name in ZeroMQCaptureReader.get_files(path):
+        reader = ZeroMQCaptureReader(name)
+        for record in reader:
+            if direction is None or record.direction == direction:
+                yield record
@@ -0,0 +1,59 @@
+from typing import Dict, Optional
+
+from ..router.membership_registry import ZeroMQMember
+from ..router.membership_routing import ZeroMQMembershipRoutingStrategy
+
+
+class ZeroMQWeightedRoutingStrategy(ZeroMQMembershipRoutingStrategy):
+    """
+    Load aware variant of the membership routing: alive workers are weighted by the capacity they report in their
+    heartbeats (see ZeroMQHeartbeatConfig.report_load) and picked with a smooth weighted round-robin, so each worker
+    gets traffic in proportion to what it can handle.
+
+    The capacity of a worker is estimated from its median handler latency (requests per second it can serve),
+    reduced by the requests it already has in flight or waiting. Workers not reporting any load get the average
+    weight of the others.
+    """
+
+    def __init__(self, max_pending: int = 10000, min_latency: float = 0.1):
+        """
+        :param max_pending: Maximum number of requests queued while no worker is available.
+        :param min_latency: Lower bound (ms) of the latency used to compute a capacity, avoids huge weights for
+                            near zero latencies.
+        """
+        super().__init__(max_pending)
+        self.min_latency = min_latency
+        self.current_weights: Dict[bytes, float] = {}
+
+    def get_weight(self, member: ZeroMQMember) -> Optional[float]:
+        """
+        :param member: The worker.
+        :return: The weight of the worker, or None if it does not report its load.
+        """
+        load = member.load
+        if not load or load.get("p50") is None:
+            return None
+        capacity = 1000.0 / max(load["p50"], self.min_latency)
+        return capacity / (1 + (load.get("inflight") or 0) + (load.get("queue") or 0))
+
+    def select_worker(self, message: list) -> Optional[bytes]:
+        members = self.membership_registry.get_members()
+        if not members:
+            return None
+
+        weights = {member.identity: self.get_weight(member) for member in members}
+        known = [weight for weight in weights.values() if weight is not None]
+        default_weight = sum(known) / len(known) if known else 1.0
+
+        total = 0.0
+        selected = None
+        current_weights = {}
+        for identity, weight in weights.items():
+            weight = weight if weight is not None else default_weight
+            total += weight
+            current_weights[identity] = self.current_weights.get(identity, 0.0) + weight
+            if selected is None or current_weights[identity] > current_weights[selected]:
+                selected = identity
+        current_weights[selected] -= total
+        self.current_weights = current_weights  # also forgets the workers that are gone
+        return selected
@@ -1 +1,4 @@
 from .worker import ZeroMQWorker
+from .idempotency_store import ZeroMQIdempotencyStore
+from .reactor_workers import ZeroMQReactorWorkers
+from .profiler import ZeroMQHandlerProfiler, ZeroMQProfilerMode
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+PENDING = object()  # the response of a request whose handler is running
+
+
+class ZeroMQIdempotencyStore:
+    """
+    Bounded, TTL evicting cache of the responses sent by a worker, keyed by the client generated request id.
+
+    A replayed request (a client retry after a timeout, or a hedged request) gets the cached response instead of
+    running the handler a second time. A worker claims a request id before running the handler (see claim), so a
+    duplicate arriving while the first request is still running waits for its response instead of running the
+    handler concurrently. The store is local to a worker (or to the workers sharing the same object), so it only
+    suppresses duplicates that reach the same worker process.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60, pending_timeout: float = 5):
+        """
+        :param max_entries: Maximum number of cached responses. The oldest are evicted first.
+        :param ttl: Time in seconds a response stays cached, and a running request stays claimed.
+        :param pending_timeout: Time in seconds a duplicate waits for the response of a running request.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self._entries = OrderedDict()  # request_id -> (expires_at, response). Insertion order is expiry order
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)  # notified when a running request gets its response
+        self.hits = 0
+        self.misses = 0
+
+    def claim(self, request_id: str) -> bool:
+        """
+        Mark a request as running, unless it already is or already has a response (put if absent). The worker that
+        claimed it runs the handler then calls put, or release if the handler failed.
+
+        :param request_id: The request id.
+        :return: True if the request was claimed, False if it is a duplicate.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self._entries.get(request_id)
+            if entry is not None and entry[0] >= now:
+                return False
+            self._set(request_id, PENDING, now)
+            return True
+
+    def release(self, request_id: str):
+        """
+        Drop the claim of a request whose handler failed, so it can be run again.
+
+        :param request_id: The request id.
+        :return: None
+        """
+        with self.lock:
+            entry = self._entries.get(request_id)
+            if entry is not None and entry[1] is PENDING:
+                del self._entries[request_id]
+                self.condition.notify_all()
+
+    def get(self, request_id: str, timeout: float = 0) -> Optional[list]:
+        """
+        Get the cached response of a request, waiting for it if the request is still running.
+
+        :param request_id: The request id.
+        :param timeout: Time in seconds to wait for the response of a running request.
+        :return: The cached response, or None if the request was not seen, its response expired, or it is still
+                 running after the timeout (or failed).
+        """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                entry = self._entries.get(request_id)
+                now = time.monotonic()
+                if entry is None or entry[0] < now:
+                    self.misses += 1
+                    return None
+                if entry[1] is not PENDING:
+                    self.hits += 1
+                    return entry[1]
+                if now >= deadline:
+                    self.misses += 1
+                    return None
+                self.condition.wait(deadline - now)
+
+    def put(self, request_id: str, response: list):
+        """
+        Cache the response of a request and evict the expired and overflowing entries.
+
+        :param request_id: The request id.
+        :param response: The response message.
+        :return: None
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._set(request_id, response, now)
+            self.condition.notify_all()
+
+    def _set(self, request_id: str, response, now: float):
+        self._entries[request_id] = (now + self.ttl, response)
+        self._entries.move_to_end(request_id)
+        while self._entries:
+            oldest_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at >= now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[oldest_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+        logger.debug("Idempotency store cleared")
@@ -1,9 +1,12 @@
 import signal
-from typing import Callable
+from typing import Any, Callable
 
-from ZeroMQFramework import *
-from ZeroMQFramework import ZeroMQHeartbeatConfig
-from ZeroMQFramework import logger
+from loguru import logger
+
+from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+from ZeroMQFramework.common.context_manager import ZeroMQContextManager
+from ZeroMQFramework.heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
+from ZeroMQFramework.worker.worker import ZeroMQWorker
 
 
 class ZeroMQMultiThreadedWorkers:
@@ -16,7 +19,7 @@ class ZeroMQMultiThreadedWorkers:
         self.workers = []
         self.handle_message_factory = handle_message_factory
         self.shutdown_requested = False
-        self.context = zmq.Context()  # Shared context for all workers
+        self.context = ZeroMQContextManager.acquire()  # Shared context for all workers
 
         signal.signal(signal.SIGINT, self.request_shutdown)
         signal.signal(signal.SIGTERM, self.request_shutdown)
@@ -40,5 +43,6 @@ class ZeroMQMultiThreadedWorkers:
         logger.info("All workers have been stopped.")
 
     def cleanup(self):
-        if not self.context.closed:
-            self.context.term()
+        if self.context is not None:
+            ZeroMQContextManager.release(self.context)  # after the workers closed their sockets
+            self.context = None
@@ -0,0 +1,327 @@
+import cProfile
+import os
+import pstats
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from ZeroMQFramework.helpers.log_sink import ZeroMQLogRateLimiter
+
+_UNSAFE_FILE_NAME_CHARACTERS = re.compile(r"[^\w.-]")
+
+
+class ZeroMQProfilerMode(Enum):
+    SAMPLE = "sample"  # statistical: the stacks of the handler threads are sampled, collapsed stack files
+    CPROFILE = "cprofile"  # deterministic: every call of the handlers is counted, pstats files
+
+
+def get_collapsed_stack(frame, stop_code) -> str:
+    """
+    :param frame: The innermost frame of a thread.
+    :param stop_code: The code object of the frame the stack starts under (excluded).
+    :return: The stack in the collapsed format of flamegraph.pl and speedscope, outermost frame first.
+    """
+    names = []
+    while frame is not None and frame.f_code is not stop_code:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ZeroMQHandlerProfiler:
+    """
+    Opt-in profiler of the handlers of ZeroMQWorker (see the worker profiler parameter), for the time spent in the
+    handlers rather than in the framework.
+
+    Profiling runs in time boxed windows, started with ``start``, by a control event (a request with the event name
+    ``profile``, see ZeroMQEvent.PROFILE) or by a signal. During a window the handler executions are profiled per
+    event name, either by sampling the stacks of the handler threads every ``sample_interval`` seconds (SAMPLE, low
+    overhead, collapsed stack files for flame graphs) or with cProfile (CPROFILE, exact call counts and times, pstats
+    files). The files are written to ``output_dir`` when the window ends.
+
+    With ``slow_threshold_ms``, the stacks of the requests running longer than the threshold are sampled whether a
+    window is open or not: the slow requests are logged with their most frequent stacks, kept in ``slow_requests``
+    and appended to ``slow_requests.collapsed``.
+
+    Outside of a window and without a slow threshold, a profiled handler costs one attribute check. One profiler can
+    be shared by the workers of a process.
+    """
+
+    def __init__(self, output_dir: str = "profiles", mode: ZeroMQProfilerMode = ZeroMQProfilerMode.SAMPLE,
+                 sample_interval: float = 0.005, slow_threshold_ms: Optional[float] = None, max_slow_requests: int = 100,
+                 control_event: bool = True, signal_number: Optional[int] = None, signal_duration: float = 30):
+        """
+        :param output_dir: Directory of the profile files, created if needed.
+        :param mode: Default profiling mode of the windows.
+        :param sample_interval: Seconds between two stack samples (SAMPLE mode and slow requests).
+        :param slow_threshold_ms: Handler duration from which a request is sampled and logged as slow, no slow
+                                  request log if None.
+        :param max_slow_requests: Number of slow requests kept in ``slow_requests``.
+        :param control_event: Let clients start a window with the profile event.
+        :param signal_number: Signal starting a window (signal.SIGUSR1 for instance), installed from the main thread.
+        :param signal_duration: Duration in seconds of the windows started by the signal.
+        """
+        self.output_dir = output_dir
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.slow_threshold = slow_threshold_ms / 1000 if slow_threshold_ms is not None else None
+        self.control_event = control_event
+        self.signal_duration = signal_duration
+        self.log_limiter = ZeroMQLogRateLimiter()
+
+        self.active = False
+        self.window_mode = mode
+        self.window_events = None  # event names profiled in the window, all if None
+        self.window_start = 0.0
+        self.window_end = 0.0
+        self.windows = 0
+        self.files: List[str] = []  # written by the last window
+        self.slow_requests = deque(maxlen=max_slow_requests)
+        self.slow_count = 0
+
+        self.lock = threading.Lock()
+        self._running: Dict[int, list] = {}  # thread id: [event name, start, stack samples of a slow request]
+        self._samples: Dict[str, Counter] = {}  # event name: collapsed stack counts, SAMPLE windows
+        self._profiles: Dict[tuple, cProfile.Profile] = {}  # (thread id, event name): profile, CPROFILE windows
+        self._profiling = 0  # handler executions running under cProfile
+        self._timer = None
+        self._sampler = None
+        self._switch_interval = None  # of the interpreter, restored at the end of a SAMPLE window
+        self._run_code = ZeroMQHandlerProfiler.run.__code__
+
+        if self.slow_threshold is not None:
+            self._start_sampler()
+        if signal_number is not None:
+            signal.signal(signal_number, lambda signum, frame: self.start(self.signal_duration))
+
+    def start(self, duration: float, mode: Optional[ZeroMQProfilerMode] = None,
+              events: Optional[Iterable[str]] = None) -> dict:
+        """
+        Open a profiling window.
+
+        :param duration: Length of the window in seconds.
+        :param mode: The profiling mode, the profiler one if None.
+        :param events: Only profile these event names, all of them if None.
+        :return: The window: mode, events, duration and output directory.
+        :raises ValueError: If a window is already open.
+        """
+        with self.lock:
+            if self.active:
+                raise ValueError(f"A profiling window is already open until {time.ctime(self.window_end)}")
+            self.window_mode = mode or self.mode
+            self.window_events = set(events) if events else None
+            self.window_start = time.time()
+            self.window_end = self.window_start + duration
+            self._samples = {}
+            self._profiles = {}
+            self.files = []
+            self.active = True
+            self.windows += 1
+        self._timer = threading.Timer(duration, self.stop)
+        self._timer.daemon = True
+        self._timer.start()
+        if self.window_mode == ZeroMQProfilerMode.SAMPLE:
+            # the sampler thread needs the GIL to look at the handler threads: with the default switch interval
+            # (5 ms), handlers shorter than that would only be sampled while the worker waits on its sockets
+            self._switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self._switch_interval, self.sample_interval / 5))
+            self._start_sampler()
+        logger.info("Profiler: {} window of {} s started for {}", self.window_mode.value, duration,
+                    sorted(self.window_events) if self.window_events else "all events")
+        return {"mode": self.window_mode.value, "events": sorted(self.window_events) if self.window_events else None,
+                "duration": duration, "output_dir": self.output_dir}
+
+    def stop(self):
+        """
+        Close the profiling window and write its files. With cProfile, the files are written once the handlers
+        running under it return.
+
+        :return: None
+        """
+        with self.lock:
+            if not self.active:
+                return
+            self.active = False
+            if self._timer is not None:
+                self._timer.cancel()
+            ready = self._profiling == 0
+        if self.window_mode == ZeroMQProfilerMode.SAMPLE:
+            sys.setswitchinterval(self._switch_interval)
+            self._write_samples()
+        elif ready:
+            self._write_profiles()
+
+    def run(self, event_name: str, handler: Callable, message: Any) -> Any:
+        """
+        Run a handler, profiled if a window is open for its event name. Called by the worker.
+
+        :param event_name: The event name of the request.
+        :param handler: The handler.
+        :param message: The argument of the handler.
+        :return: The handler result.
+        """
+        if not self.active and self.slow_threshold is None:
+            return handler(message)
+        profiled = self.active and (self.window_events is None or event_name in self.window_events)
+        thread_id = threading.get_ident()
+        self._running[thread_id] = entry = [event_name if profiled else None, time.monotonic(), None]
+        try:
+            if profiled and self.window_mode == ZeroMQProfilerMode.CPROFILE:
+                return self._run_cprofile(thread_id, event_name, handler, message)
+            return handler(message)
+        finally:
+            del self._running[thread_id]
+            duration = time.monotonic() - entry[1]
+            if self.slow_threshold is not None and duration >= self.slow_threshold:
+                self._record_slow(event_name, duration, entry[2])
+
+    def _run_cprofile(self, thread_id: int, event_name: str, handler: Callable, message: Any) -> Any:
+        with self.lock:
+            profile = self._profiles.get((thread_id, event_name))
+            if profile is None:
+                profile = self._profiles[(thread_id, event_name)] = cProfile.Profile()
+            self._profiling += 1
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is active on this thread
+            with self.lock:
+                self._profiling -= 1
+            return handler(message)
+        try:
+            return handler(message)
+        finally:
+            profile.disable()
+            with self.lock:
+                self._profiling -= 1
+                write = not self.active and self._profiling == 0 and self._profiles
+            if write:  # the window closed while handlers were running under cProfile
+                self._write_profiles()
+
+    def handle_control(self, data: Optional[dict]) -> dict:
+        """
+        Answer a profile control event: {"duration": seconds, "mode": "sample" or "cprofile", "events": [...]} opens
+        a window, {"stop": true} closes it, an empty request returns the state of the profiler.
+
+        :param data: The event data of the control request.
+        :return: The response data.
+        """
+        data = data if isinstance(data, dict) else {}
+        if not self.control_event:
+            return {"error": "profiling control events are disabled"}
+        try:
+            if data.get("stop"):
+                self.stop()
+            elif data.get("duration"):
+                return self.start(float(data["duration"]), ZeroMQProfilerMode(data["mode"]) if data.get("mode")
+                                  else None, data.get("events"))
+        except ValueError as e:
+            return {"error": str(e)}
+        return self.get_stats()
+
+    def _start_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name="ZeroMQHandlerProfiler", daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while self.slow_threshold is not None or (self.active and self.window_mode == ZeroMQProfilerMode.SAMPLE):
+            time.sleep(self.sample_interval)
+            if not self._running:
+                continue
+            sampling = self.active and self.window_mode == ZeroMQProfilerMode.SAMPLE
+            now = time.monotonic()
+            frames = None
+            for thread_id, entry in list(self._running.items()):
+                slow = self.slow_threshold is not None and now - entry[1] >= self.slow_threshold
+                if not slow and not (sampling and entry[0] is not None):
+                    continue
+                frames = frames or sys._current_frames()
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = get_collapsed_stack(frame, self._run_code)
+                if sampling and entry[0] is not None:
+                    self._samples.setdefault(entry[0], Counter())[stack] += 1
+                if slow:
+                    if entry[2] is None:
+                        entry[2] = Counter()
+                    entry[2][stack] += 1
+
+    def _record_slow(self, event_name: str, duration: float, samples: Optional[Counter]):
+        self.slow_count += 1
+        top = samples.most_common(5) if samples else []
+        self.slow_requests.append({"event": event_name, "duration_ms": round(duration * 1000, 3),
+                                   "time": time.time(), "stacks": top})
+        self.log_limiter.log("slow_request", "WARNING", "Profiler: slow {} request, {:.1f} ms, top stack: {}",
+                             event_name, duration * 1000, top[0][0] if top else "not sampled")
+        if samples:
+            self._write_lines("slow_requests.collapsed", [f"{event_name};{stack} {count}"
+                                                          for stack, count in samples.items()])
+
+    def _get_file_name(self, event_name: str, extension: str) -> str:
+        # the event name comes from the client, only keep the characters that are safe in a file name
+        prefix = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.window_start))
+        return f"profile_{prefix}_{_UNSAFE_FILE_NAME_CHARACTERS.sub('_', event_name)}.{extension}"
+
+    def _write_samples(self):
+        for event_name, samples in self._samples.items():
+            try:
+                self.files.append(self._write_lines(self._get_file_name(event_name, "collapsed"),
+                                                    [f"{stack} {count}" for stack, count in samples.items()]))
+            except Exception as e:  # the other events of the window are still written
+                self.log_limiter.log("write_error", "ERROR", "Profiler: cannot write the {} samples: {}",
+                                     event_name, e)
+        self._log_files()
+
+    def _write_profiles(self):
+        with self.lock:
+            profiles, self._profiles = self._profiles, {}
+        by_event: Dict[str, list] = {}
+        for (_, event_name), profile in profiles.items():
+            by_event.setdefault(event_name, []).append(profile)
+        os.makedirs(self.output_dir, exist_ok=True)
+        for event_name, event_profiles in by_event.items():
+            path = os.path.join(self.output_dir, self._get_file_name(event_name, "pstats"))
+            try:
+                pstats.Stats(*event_profiles).dump_stats(path)
+            except Exception as e:  # the other events of the window are still written
+                self.log_limiter.log("write_error", "ERROR", "Profiler: cannot write the {} profile: {}",
+                                     event_name, e)
+                continue
+            self.files.append(path)
+        self._log_files()
+
+    def _write_lines(self, name: str, lines: List[str]) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        with open(path, "a") as output:
+            output.write("\n".join(lines) + "\n")
+        return path
+
+    def _log_files(self):
+        if self.files:
+            logger.info("Profiler: {} window written to {}", self.window_mode.value, ", ".join(self.files))
+        else:
+            logger.info("Profiler: {} window ended without profiled requests", self.window_mode.value)
+
+    def get_stats(self) -> dict:
+        """
+        :return: The state of the profiler: window open, its mode and end, windows run, files written by the last
+                 window, slow requests seen.
+        """
+        return {
+            "active": self.active,
+            "mode": self.window_mode.value,
+            "window_end": self.window_end if self.active else None,
+            "windows": self.windows,
+            "files": list(self.files),
+            "slow_requests": self.slow_count,
+        }
@@ -0,0 +1,246 @@
+import asyncio
+import inspect
+import signal
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+import zmq
+from loguru import logger
+
+from ZeroMQFramework.common.connection_protocol import ZeroMQConnection
+from ZeroMQFramework.common.context_manager import ZeroMQContextManager
+from ZeroMQFramework.common.node_type import ZeroMQNodeType
+from ZeroMQFramework.helpers.log_sink import ZeroMQLogRateLimiter
+from ZeroMQFramework.helpers.utils import create_message, get_node_id, get_uuid_hex, parse_message
+
+
+class ZeroMQLogicalWorker:
+    """A logical worker of a ZeroMQReactorWorkers host: a DEALER socket of its own, its handler and its accounting."""
+
+    def __init__(self, index: int, socket: zmq.Socket, handle_message: Callable[[dict], Any]):
+        self.index = index
+        self.socket = socket
+        self.handle_message = handle_message
+        self.handled = 0
+        self.errors = 0
+        self.busy_time = 0.0  # seconds spent handling requests, awaited time included
+        self.task = None  # the request awaited by an async handler, the worker takes no other request meanwhile
+
+    def get_stats(self) -> dict:
+        return {
+            "worker": self.index,
+            "identity": self.socket.getsockopt(zmq.IDENTITY).decode('utf-8'),
+            "handled": self.handled,
+            "errors": self.errors,
+            "busy": self.task is not None,
+            "busy_time": round(self.busy_time, 6),
+        }
+
+
+class ZeroMQReactorWorkers(threading.Thread):
+    """
+    Hosts many logical workers on a single thread and a single poller.
+
+    Every logical worker is a DEALER socket with its own identity connected to the router backend, so the router sees
+    (and load balances across) num_workers workers, without the thread, poller, socket monitor and heartbeat each
+    ZeroMQWorker runs. The ready requests are dispatched round-robin, one request per ready logical worker per poll
+    and starting from a different worker every time, so no logical worker is starved.
+
+    A handler may be a coroutine function: the request is then awaited on the event loop of the reactor and the
+    logical worker takes no other request until it completes, so up to num_workers I/O bound requests are processed
+    concurrently by one thread. Plain handlers run one at a time, the concurrency then only comes from the handlers
+    releasing the GIL. Generator handlers are collected into a single response (no streaming).
+
+    The logical workers send no heartbeats, use the host with the default routing proxy rather than the membership
+    based strategies, which only address workers announced by heartbeats.
+    """
+
+    def __init__(self, config_file: str, connection: ZeroMQConnection, num_workers: int = 100,
+                 handle_message: Callable[[dict], Any] = None,
+                 handle_message_factory: Callable[[], Callable[[dict], Any]] = None,
+                 context: Optional[zmq.Context] = None, async_poll_timeout: int = 1):
+        """
+        :param config_file: The configuration file, for the node id.
+        :param connection: The connection to the router backend, shared by the logical workers.
+        :param num_workers: Number of logical workers.
+        :param handle_message: Handler shared by the logical workers.
+        :param handle_message_factory: Called once per logical worker to create its own handler, instead of
+                                       handle_message (for stateful handlers).
+        :param context: The ZeroMQ context, the process wide shared context if None.
+        :param async_poll_timeout: Poll timeout in milliseconds while async handlers are pending, the event loop
+                                   runs between the polls.
+        """
+        threading.Thread.__init__(self)
+        if handle_message is None and handle_message_factory is None:
+            raise ValueError("handle_message or handle_message_factory must be specified")
+        self.config_file = config_file
+        self.connection = connection
+        self.num_workers = num_workers
+        self.shutdown_requested = False
+        self._shared_context = context is None
+        self.context = ZeroMQContextManager.acquire() if self._shared_context else context
+        self.poller = zmq.Poller()
+        self.poller_timeout = 1000  # milliseconds
+        self.async_poll_timeout = async_poll_timeout
+        self.log_limiter = ZeroMQLogRateLimiter()
+        self._event_loop = None  # created on first use, only needed by async handlers
+        self.pending_tasks = 0
+        self._next_worker = 0  # where the next round-robin dispatch starts
+
+        self.node_id = get_node_id(config_file, ZeroMQNodeType.WORKER.value.lower())
+        self.session_id = get_uuid_hex(16)
+        self.workers: List[ZeroMQLogicalWorker] = []
+        for index in range(num_workers):
+            socket = self.context.socket(zmq.DEALER)
+            socket.setsockopt(zmq.IDENTITY, f"{self.node_id}_{self.session_id}_{index}".encode('utf-8'))
+            socket.setsockopt(zmq.PROBE_ROUTER, 1)  # announces the logical worker to the router on connect
+            connection.apply_socket_options(socket)
+            worker = ZeroMQLogicalWorker(index, socket, handle_message_factory() if handle_message_factory
+                                         else handle_message)
+            self.workers.append(worker)
+
+        signal.signal(signal.SIGINT, self.request_shutdown)
+        signal.signal(signal.SIGTERM, self.request_shutdown)
+        self.daemon = True
+
+    def run(self):
+        connection_string = self.connection.get_connection_string(bind=False)
+        for worker in self.workers:
+            worker.socket.connect(connection_string)
+            self.poller.register(worker.socket, zmq.POLLIN)
+        logger.info(f"{self.num_workers} logical workers connected to {connection_string}")
+        self.process_messages()
+
+    def process_messages(self):
+        while not self.shutdown_requested:
+            try:
+                timeout = self.async_poll_timeout if self.pending_tasks else self.poller_timeout
+                socks = dict(self.poller.poll(timeout=timeout))
+                if socks:
+                    self.dispatch(socks)
+                if self.pending_tasks:
+                    self._run_event_loop_once()
+            except zmq.ZMQError as e:
+                self.log_limiter.log("zmq_error", "ERROR", "ZMQ Error occurred: {}", e)
+            except Exception as e:
+                self.log_limiter.log("exception", "ERROR", "Unknown exception occurred: {}", e)
+
+        # Exited the loop (self.shutdown_requested is true)
+        self.cleanup()
+
+    def dispatch(self, socks: dict):
+        """
+        Receive and handle one request per ready logical worker, round-robin.
+
+        :param socks: The result of the poll.
+        :return: None
+        """
+        start = self._next_worker
+        self._next_worker = (start + 1) % self.num_workers
+        for offset in range(self.num_workers):
+            worker = self.workers[(start + offset) % self.num_workers]
+            if worker.socket not in socks:
+                continue
+            try:
+                message = worker.socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                continue
+            if len(message) < 4 or b'' not in message:
+                self.log_limiter.log("malformed", "ERROR", "Malformed message received: {}", message)
+                continue
+            delimiter = message.index(b'')
+            self.handle_request(worker, message[:delimiter + 1], message[delimiter + 1:])
+
+    def handle_request(self, worker: ZeroMQLogicalWorker, envelope: list, message: list):
+        """
+        Parse a request and pass it to the handler of the logical worker. The response of an async handler is sent
+        once the handler completed, see _complete_request.
+
+        :param worker: The logical worker the request was received by.
+        :param envelope: The frames to prepend to the response.
+        :param message: The request frames.
+        :return: None
+        """
+        start = time.perf_counter()
+        try:
+            parsed_message = parse_message(message, compression=self.connection.compression,
+                                           shared_memory=self.connection.shared_memory)
+            response_data = worker.handle_message(parsed_message)
+        except Exception as e:
+            worker.errors += 1
+            self.log_limiter.log("handler_error", "ERROR", "Logical worker {} failed to handle a request: {}",
+                                 worker.index, e)
+            return
+
+        if inspect.isawaitable(response_data):
+            if self._event_loop is None:
+                self._event_loop = asyncio.new_event_loop()
+            worker.task = asyncio.ensure_future(response_data, loop=self._event_loop)
+            self.pending_tasks += 1
+            worker.task.add_done_callback(lambda task: self._complete_request(worker, envelope, parsed_message,
+                                                                              start, task))
+            self.poller.unregister(worker.socket)  # busy until the handler completed
+            return
+        self._send_response(worker, envelope, parsed_message, response_data, start)
+
+    def _complete_request(self, worker: ZeroMQLogicalWorker, envelope: list, parsed_message: dict, start: float,
+                          task: asyncio.Future):
+        # called by the event loop, on the reactor thread
+        worker.task = None
+        self.pending_tasks -= 1
+        if not self.shutdown_requested:
+            self.poller.register(worker.socket, zmq.POLLIN)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            worker.errors += 1
+            worker.busy_time += time.perf_counter() - start
+            self.log_limiter.log("handler_error", "ERROR", "Logical worker {} failed to handle a request: {}",
+                                 worker.index, task.exception())
+            return
+        self._send_response(worker, envelope, parsed_message, task.result(), start)
+
+    def _send_response(self, worker: ZeroMQLogicalWorker, envelope: list, parsed_message: dict, response_data: Any,
+                       start: float):
+        if inspect.isgenerator(response_data):
+            response_data = list(response_data)
+        request_id = parsed_message.get("metadata", {}).get("request_id")
+        worker.socket.send_multipart(envelope + create_message(
+            parsed_message["event_name"], response_data, metadata={"request_id": request_id} if request_id else None,
+            compression=self.connection.compression, by_reference=self.connection.pass_objects,
+            shared_memory=self.connection.shared_memory))
+        worker.handled += 1
+        worker.busy_time += time.perf_counter() - start
+
+    def _run_event_loop_once(self):
+        # one iteration of the event loop: the ready callbacks and the due timers and I/O, without blocking
+        self._event_loop.call_soon(self._event_loop.stop)
+        self._event_loop.run_forever()
+
+    def get_stats(self) -> List[dict]:
+        """
+        :return: The accounting of every logical worker: requests handled, handler errors, busy state and busy time.
+        """
+        return [worker.get_stats() for worker in self.workers]
+
+    def request_shutdown(self, signum, frame):
+        logger.warning(f"Received signal {signum}, stopping {self.num_workers} logical workers...")
+        self.shutdown_requested = True
+
+    def cleanup(self):
+        logger.info("Reactor workers are shutting down, performing cleanup...")
+        if self._event_loop is not None:
+            tasks = [worker.task for worker in self.workers if worker.task is not None]
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self._event_loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._event_loop.close()
+        for socket, _ in list(self.poller.sockets):
+            self.poller.unregister(socket)
+        for worker in self.workers:
+            worker.socket.close()
+        if self._shared_context:
+            ZeroMQContextManager.release(self.context)  # terminated once no node uses it
+        logger.info(f"{self.num_workers} logical workers stopped.")
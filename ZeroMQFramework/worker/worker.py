@@ -1,4 +1,6 @@
-from typing import Callable, Any
+import asyncio
+import inspect
+from typing import Callable, Any, Dict, Iterator, Optional, List
 from ..common.processing_base import ZeroMQProcessingBase
 from ZeroMQFramework.common.connection_protocol import *
 import zmq
@@ -8,73 +10,492 @@ from ZeroMQFramework.common.node_type import ZeroMQNodeType
 from ..heartbeat.heartbeat_sender import ZeroMQHeartbeatSender
 from ..heartbeat.heartbeat_receiver import ZeroMQHeartbeatReceiver
 from ..heartbeat.heartbeat_config import ZeroMQHeartbeatConfig
+from .idempotency_store import ZeroMQIdempotencyStore
+from ..common.tracing import ZeroMQTracer
+from ..common.event import ZeroMQEvent
+from .profiler import ZeroMQHandlerProfiler
 import signal
 import threading
 from ..helpers.utils import *
 from loguru import logger
 
 
+class ZeroMQCreditStream:
+    """A flow controlled streamed response: its messages left, where they go and the chunks the client granted."""
+    __slots__ = ("stream_id", "messages", "envelope", "socket", "credit", "last_credit")
+
+    def __init__(self, stream_id: str, messages: Iterator[list], envelope: list, socket: zmq.Socket, credit: int):
+        self.stream_id = stream_id
+        self.messages = messages
+        self.envelope = envelope
+        self.socket = socket
+        self.credit = credit
+        self.last_credit = time.monotonic()
+
+
 class ZeroMQWorker(ZeroMQBase, ZeroMQProcessingBase, threading.Thread):
     def __init__(self, config_file: str, connection: ZeroMQConnection, handle_message: Callable[[dict], Any] = None,
                  context: zmq.Context = None, node_type: ZeroMQNodeType = ZeroMQNodeType.WORKER,
-                 heartbeat_config: ZeroMQHeartbeatConfig = None):
+                 heartbeat_config: ZeroMQHeartbeatConfig = None,
+                 idempotency_store: Optional[ZeroMQIdempotencyStore] = None,
+                 ha_connections: Optional[List[ZeroMQConnection]] = None,
+                 ha_heartbeat_configs: Optional[List[ZeroMQHeartbeatConfig]] = None,
+                 batch_handler: Optional[Callable[[List[dict]], List[Any]]] = None, max_batch_size: int = 32,
+                 max_batch_wait_us: int = 1000, tracer: Optional[ZeroMQTracer] = None,
+                 profiler: Optional[ZeroMQHandlerProfiler] = None, stream_timeout: float = 30):
         super().__init__(config_file, connection, node_type, handle_message, context, heartbeat_config)
+        self._event_loop = None  # created on first use, only needed by async generator handlers
+        if self.node_type == ZeroMQNodeType.WORKER:
+            self.socket.setsockopt(zmq.PROBE_ROUTER, 1)  # announces the worker to the router as soon as it connects
+        # Flow controlled streams: the worker sends as many chunks as the client granted credits for, then pauses the
+        # handler generator (serving other requests meanwhile) until more credits arrive. A stream without credits
+        # for stream_timeout seconds (client gone) is dropped
+        self.streams: Dict[str, ZeroMQCreditStream] = {}
+        self.stream_timeout = stream_timeout
+        # opt-in. Replayed request ids get the cached response instead of running the handler again
+        self.idempotency_store = idempotency_store
+        # records a span for the requests traced by the clients (parse, handler and reply times), see ZeroMQTracer.
+        # Batched requests are not traced
+        self.tracer = tracer
+        self.trace_attributes = {"node.type": self.node_type.value, "node.id": self.node_id}
+        # profiles the handler executions per event name on demand (profile control event or signal), and samples
+        # the slow requests, see ZeroMQHandlerProfiler. Batches are profiled under the event name "batch"
+        self.profiler = profiler
+
+        # Micro-batching: the queued requests (up to max_batch_size, waiting up to max_batch_wait_us for more once the
+        # first one arrived) are passed as one list to batch_handler, which returns one result per request. Each
+        # result is sent back to the client of its request. For handlers far cheaper per item in batches
+        if batch_handler is not None and self.node_type != ZeroMQNodeType.WORKER:
+            raise ValueError("Micro-batching is only supported in worker mode")
+        self.batch_handler = batch_handler
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait_us = max_batch_wait_us
+
+        # High availability: the worker also serves the backends of the other routers, with one DEALER socket per
+        # router so a response always goes back through the router the request came from
+        if ha_connections and self.node_type != ZeroMQNodeType.WORKER:
+            raise ValueError("HA connections are only supported in worker mode")
+        self.ha_connections = ha_connections or []
+        self.ha_sockets = []
+        for ha_connection in self.ha_connections:
+            ha_socket = self.context.socket(zmq.DEALER)
+            ha_socket.setsockopt(zmq.IDENTITY, self.get_socket_identity())  # same identity on every router
+            ha_socket.setsockopt(zmq.PROBE_ROUTER, 1)
+            ha_connection.apply_socket_options(ha_socket)
+            self.ha_sockets.append(ha_socket)
+        self.ha_heartbeats = [self.create_heartbeat_sender(config, connection)
+                              for config, connection in zip(ha_heartbeat_configs or [], self.ha_connections)]
 
     def run(self):
         self.start_worker()
 
     def start_worker(self):
         connection_string = self.connection.get_connection_string(bind=self.node_type == ZeroMQNodeType.SERVER)
+        self.start_socket_monitor()
         if self.node_type == ZeroMQNodeType.SERVER:
             self.socket.bind(connection_string)
             logger.info(f"{self.node_type.value} bind to {connection_string}")
         else:
             self.socket.connect(connection_string)
             logger.info(f"{self.node_type.value} connected to {connection_string}")
+        for ha_socket, ha_connection in zip(self.ha_sockets, self.ha_connections):
+            ha_socket.connect(ha_connection.get_connection_string(bind=False))
+            logger.info(f"{self.node_type.value} connected to {ha_connection.get_connection_string(bind=False)}")
 
         if self.heartbeat_enabled:
             self.heartbeat.start()
+        for ha_heartbeat in self.ha_heartbeats:
+            ha_heartbeat.start()
         self.process_messages()
 
     def process_messages(self):
-        self.poller.register(self.socket, zmq.POLLIN)
+        sockets = [self.socket] + self.ha_sockets
+        for socket in sockets:
+            self.poller.register(socket, zmq.POLLIN)
 
         while not self.shutdown_requested:
             try:
                 socks = dict(self.poller.poll(timeout=self.poller_timeout))
-                if self.socket in socks:
-                    message = self.socket.recv_multipart()
+                if self.batch_handler is not None:
+                    if socks:
+                        self.handle_batch(self.receive_batch(sockets, socks))
+                    continue
+                for socket in sockets:
+                    if socket not in socks:
+                        continue
+                    message = socket.recv_multipart()
                     if self.node_type == ZeroMQNodeType.WORKER:  # worker mode
-                        if len(message) < 4:
-                            logger.error(f"Malformed message received: {message}")
-                            continue
-                        client_address = message[0]
-                        parsed_message = parse_message(message[1:])
-                        response = self.process_message(parsed_message)
-                        if response:
-                            self.socket.send_multipart([client_address, b''] + response)
-                    elif self.node_type == ZeroMQNodeType.SERVER:  # Server mode
-                        parsed_message = parse_message(message)
-                        response = self.process_message(parsed_message)
-                        if response:
-                            self.socket.send_multipart(response)
+                        request = self._split_envelope(message)
+                        if request is not None:
+                            self.handle_request(request[0], request[1], socket)
+                    elif self.node_type == ZeroMQNodeType.SERVER:  # Server mode, the REP socket keeps the envelope
+                        self.handle_request([], message, socket)
+                if self.streams:
+                    self.expire_streams()
 
             except zmq.ZMQError as e:
-                logger.error(f"ZMQ Error occurred: {e}")
+                self.log_limiter.log("zmq_error", "ERROR", "ZMQ Error occurred: {}", e)
             except Exception as e:
-                logger.error(f"Unknown exception occurred: {e}")
+                self.log_limiter.log("exception", "ERROR", "Unknown exception occurred: {}", e)
 
         # Exited the loop (self.shutdown_requested is true)
         self.cleanup()
 
-    def process_message(self, parsed_message: dict) -> list:
-        response_data = self.handle_message(parsed_message)
-        msg = create_message(parsed_message["event_name"], response_data)
+    def _split_envelope(self, message: list) -> Optional[tuple]:
+        if len(message) < 4 or b'' not in message:
+            self.log_limiter.log("malformed", "ERROR", "Malformed message received: {}", message)
+            return None
+        # The envelope is everything up to the empty delimiter frame: the client address, plus a request id frame
+        # for REQ sockets in correlate mode. It is sent back unchanged
+        delimiter = message.index(b'')
+        return message[:delimiter + 1], message[delimiter + 1:]
+
+    def receive_batch(self, sockets: List[zmq.Socket], socks: dict) -> List[tuple]:
+        """
+        Receive the requests of a batch: everything already queued on the ready sockets, then whatever arrives until
+        the batch is full or max_batch_wait_us elapsed since the first request. Waits shorter than a millisecond (the
+        poll resolution) are spent polling without blocking.
+
+        :param sockets: The sockets of the worker.
+        :param socks: The result of the poll that found the first requests.
+        :return: The requests as (envelope, message frames, socket) tuples.
+        """
+        batch = []
+        deadline = time.perf_counter() + self.max_batch_wait_us / 1e6
+        while True:
+            for socket in sockets:
+                while socket in socks and len(batch) < self.max_batch_size:
+                    try:
+                        message = socket.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    request = self._split_envelope(message)
+                    if request is not None:
+                        batch.append((request[0], request[1], socket))
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.max_batch_size or remaining <= 0 or self.shutdown_requested:
+                return batch
+            socks = dict(self.poller.poll(timeout=int(remaining * 1000)))
+
+    def handle_batch(self, batch: List[tuple]):
+        """
+        Parse the requests of a batch, pass them to the batch handler at once and send every result back with the
+        envelope of its request. The profile control event is answered by the profiler and requests with a cached
+        response (idempotency store) are answered directly, duplicates of a request that is still running are dropped
+        (the client retries).
+
+        :param batch: The requests as (envelope, message frames, socket) tuples.
+        :return: None
+        :raises ValueError: If the batch handler does not return one result per request.
+        """
+        requests = []
+        claimed = []
+        for envelope, message, socket in batch:
+            parsed_message = parse_message(message, compression=self.connection.compression,
+                                           shared_memory=self.connection.shared_memory)
+            if self.is_profile_control(parsed_message):
+                socket.send_multipart(envelope + self.create_response(
+                    parsed_message, self.profiler.handle_control(parsed_message["event_data"])))
+                continue
+            request_id = parsed_message.get("metadata", {}).get("request_id")
+            if self.idempotency_store is not None and request_id:
+                if not self.idempotency_store.claim(request_id):
+                    # no wait: the running request may be in this batch
+                    cached_response = self.get_cached_response(request_id)
+                    if cached_response is not None:
+                        logger.debug("Duplicate request {}, sending the cached response", request_id)
+                        socket.send_multipart(envelope + cached_response)
+                    else:
+                        self.log_limiter.log("duplicate", "WARNING", "Duplicate request {} still running, dropped",
+                                             request_id)
+                    continue
+                claimed.append(request_id)
+            requests.append((envelope, parsed_message, socket))
+        if not requests:
+            return
+
+        if self.load_monitor is not None:
+            for _ in requests:
+                self.load_monitor.request_started()
+            start = time.perf_counter()
+        try:
+            messages = [parsed_message for _, parsed_message, _ in requests]
+            if self.profiler is not None:
+                results = self.profiler.run("batch", self.batch_handler, messages)
+            else:
+                results = self.batch_handler(messages)
+            if len(results) != len(requests):
+                raise ValueError(f"The batch handler returned {len(results)} results for {len(requests)} requests")
+            for (envelope, parsed_message, socket), result in zip(requests, results):
+                socket.send_multipart(envelope + self.create_response(parsed_message, result))
+        except Exception:
+            for request_id in claimed:  # only the requests without a response yet
+                self.idempotency_store.release(request_id)
+            raise
+        finally:
+            if self.load_monitor is not None:
+                latency = (time.perf_counter() - start) * 1000
+                for _ in requests:
+                    self.load_monitor.request_finished(latency)
+                self.load_monitor.queue_length = len(requests) - 1
+
+    def handle_request(self, envelope: list, message: list, socket: Optional[zmq.Socket] = None):
+        """
+        Parse a request, process it and send the response(s) back with the request envelope.
+
+        :param envelope: The frames to prepend to the response (empty in server mode).
+        :param message: The request frames.
+        :param socket: The socket the request was received on, the main socket if None.
+        :return: None
+        """
+        socket = socket if socket is not None else self.socket
+        received = time.time_ns() if self.tracer is not None else None
+        parsed_message = parse_message(message, compression=self.connection.compression,
+                                       shared_memory=self.connection.shared_memory)
+        if parsed_message["event_name"] == ZeroMQEvent.STREAM_CREDIT.value:
+            self.handle_stream_credit(parsed_message)
+            return
+        span = None
+        if self.tracer is not None and "trace" in parsed_message["metadata"]:
+            span = self.tracer.start_span("worker", parsed_message["metadata"]["trace"], start_time=received,
+                                          attributes=self.trace_attributes)
+            if span is not None:
+                span.add_event("parsed")
+        if self.load_monitor is not None:
+            self.load_monitor.request_started()
+            start = time.perf_counter()
+        status = None
+        try:
+            response = self.process_message(parsed_message)
+            if span is not None:
+                span.add_event("handled")  # a stream is handled while its chunks are sent
+            if inspect.isgenerator(response):  # streamed response, one message per chunk
+                credit = parsed_message["metadata"].get("credit")
+                if credit is not None:
+                    stream_id = parsed_message["metadata"]["stream"]
+                    self.streams[stream_id] = ZeroMQCreditStream(stream_id, response, envelope, socket, int(credit))
+                    self.send_stream(self.streams[stream_id])
+                else:
+                    for chunk in response:
+                        socket.send_multipart(envelope + chunk)
+            elif response:
+                socket.send_multipart(envelope + response)
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            if span is not None:
+                self.tracer.end_span(span, status)
+            if self.load_monitor is not None:
+                self.load_monitor.request_finished((time.perf_counter() - start) * 1000)
+                # backlog estimate: consecutive requests handled while others were already waiting
+                pending = socket.getsockopt(zmq.EVENTS) & zmq.POLLIN
+                self.load_monitor.queue_length = self.load_monitor.queue_length + 1 if pending else 0
+
+    def process_message(self, parsed_message: dict):
+        """
+        Pass the message to the handler and build the response.
+
+        If the handler returns a generator (or an async generator) and the client requested a stream, a generator
+        of messages (one per chunk) is returned so the chunks can be sent as soon as they are produced. Streaming is
+        only possible in worker mode as the REP socket of a server can only send a single reply, so otherwise the
+        chunks are collected into a list and sent as one response.
+
+        If an idempotency store is set and the request carries a request id, the request id is claimed before the
+        handler is called. A duplicate gets the cached response, waiting for it (up to the pending_timeout of the
+        store) if the first request is still running, and is dropped if there is still none: the handler is not called
+        again. The claim is released if the handler fails. Streamed responses are never cached.
+
+        With a profiler, the handler runs under it and the profile control event is answered by the profiler.
+
+        :param parsed_message: The parsed request.
+        :return: The response message, a generator of response messages, or None for a dropped duplicate.
+        """
+        if self.is_profile_control(parsed_message):
+            return self.create_response(parsed_message, self.profiler.handle_control(parsed_message["event_data"]))
+        request_id = parsed_message.get("metadata", {}).get("request_id")
+        claimed = False
+        if self.idempotency_store is not None and request_id:
+            claimed = self.idempotency_store.claim(request_id)
+            if not claimed:
+                cached_response = self.get_cached_response(request_id, self.idempotency_store.pending_timeout)
+                if cached_response is not None:
+                    logger.debug("Duplicate request {}, sending the cached response", request_id)
+                    return cached_response
+                self.log_limiter.log("duplicate", "WARNING", "Duplicate request {} still running, dropped", request_id)
+                return None
+
+        try:
+            if self.profiler is not None:
+                # a generator handler is only profiled until it returns its generator, not while the chunks are
+                # produced
+                response_data = self.profiler.run(parsed_message["event_name"], self.handle_message, parsed_message)
+            else:
+                response_data = self.handle_message(parsed_message)
+            if inspect.isgenerator(response_data) or inspect.isasyncgen(response_data):
+                chunks = self._iterate_chunks(response_data)
+                stream_id = parsed_message.get("metadata", {}).get("stream")
+                if stream_id and self.node_type == ZeroMQNodeType.WORKER:
+                    if claimed:  # not cached
+                        self.idempotency_store.release(request_id)
+                    return self.stream_response(parsed_message["event_name"], stream_id, chunks)
+                response_data = list(chunks)
+            return self.create_response(parsed_message, response_data)
+        except Exception:
+            if claimed:
+                self.idempotency_store.release(request_id)
+            raise
+
+    def is_profile_control(self, parsed_message: dict) -> bool:
+        """
+        :param parsed_message: The parsed request.
+        :return: True if the request is the profile control event of the profiler, to be answered by it.
+        """
+        return (self.profiler is not None and bool(self.profiler.control_event)
+                and parsed_message["event_name"] == ZeroMQEvent.PROFILE.value)
+
+    def create_response(self, parsed_message: dict, response_data: Any) -> list:
+        """
+        Build the response message of a request, cached in the idempotency store if any.
+
+        :param parsed_message: The parsed request.
+        :param response_data: The handler result.
+        :return: The response message.
+        """
+        request_id = parsed_message.get("metadata", {}).get("request_id")
+        metadata = {"request_id": request_id} if request_id else None
+        if "trace" in parsed_message.get("metadata", {}):  # the routers match the reply with their span
+            metadata = {**(metadata or {}), "trace": parsed_message["metadata"]["trace"]}
+        msg = create_message(parsed_message["event_name"], response_data, metadata=metadata,
+                             compression=self.connection.compression, by_reference=self.connection.pass_objects,
+                             shared_memory=self.connection.shared_memory)
+        if self.idempotency_store is not None and request_id:
+            # the token of a message passed by reference or the segment of an offloaded payload is only valid until
+            # read, keep the response data instead
+            single_read = self.connection.pass_objects or self.connection.shared_memory is not None
+            self.idempotency_store.put(request_id, (parsed_message["event_name"], response_data, metadata)
+                                       if single_read else msg)
         return msg
 
+    def get_cached_response(self, request_id: str, timeout: float = 0) -> Optional[list]:
+        """
+        :param request_id: The request id.
+        :param timeout: Time in seconds to wait for the response if the request is still running.
+        :return: The response cached by the idempotency store for this request id, None if there is none.
+        """
+        cached_response = self.idempotency_store.get(request_id, timeout)
+        if isinstance(cached_response, tuple):  # a new message for every replay, see create_response
+            event_name, response_data, metadata = cached_response
+            return create_message(event_name, response_data, metadata=metadata,
+                                  compression=self.connection.compression, by_reference=self.connection.pass_objects,
+                                  shared_memory=self.connection.shared_memory)
+        return cached_response
+
+    def stream_response(self, event_name: str, stream_id: str, chunks: Iterator) -> Iterator[list]:
+        """
+        Build one message per chunk followed by an end of stream message.
+
+        Every chunk carries the stream id and its sequence number, so the client can drop stale chunks and detect
+        lost ones. If the handler fails mid-stream, the end message carries the error. The messages are produced as
+        they are sent, so a stream waiting for credits (see send_stream) pauses the handler.
+
+        :param event_name: The event name of the request.
+        :param stream_id: The stream id sent by the client.
+        :param chunks: The chunks produced by the handler.
+        :return: A generator of messages.
+        """
+        seq = 0
+        error = None
+        try:
+            for chunk in chunks:
+                yield create_message(event_name, chunk, metadata={"stream": stream_id, "seq": seq, "end": False},
+                                     compression=self.connection.compression,
+                                     by_reference=self.connection.pass_objects,
+                                     shared_memory=self.connection.shared_memory)
+                seq += 1
+        except Exception as e:
+            self.log_limiter.log("stream_error", "ERROR", "Stream handler for {} failed after {} chunks: {}",
+                                 event_name, seq, e)
+            error = str(e)
+        metadata = {"stream": stream_id, "seq": seq, "end": True}
+        if error:
+            metadata["error"] = error
+        yield create_message(event_name, None, metadata=metadata, by_reference=self.connection.pass_objects)
+
+    def send_stream(self, stream: ZeroMQCreditStream):
+        """
+        Send the messages of a flow controlled stream while it has credits, one per message. The stream is dropped
+        once its end message is sent.
+
+        :param stream: The stream.
+        :return: None
+        """
+        try:
+            while stream.credit > 0:
+                message = next(stream.messages, None)
+                if message is None:
+                    del self.streams[stream.stream_id]
+                    return
+                stream.socket.send_multipart(stream.envelope + message)
+                stream.credit -= 1
+        except Exception:
+            self.streams.pop(stream.stream_id, None)
+            raise
+
+    def handle_stream_credit(self, parsed_message: dict):
+        """
+        Resume a stream with the credits granted by its client, or drop it if the client cancelled it.
+
+        :param parsed_message: The credit message: {"credit": chunks} or {"cancel": true}.
+        :return: None
+        """
+        stream = self.streams.get(parsed_message["metadata"].get("stream"))
+        if stream is None:  # ended, expired or cancelled
+            return
+        data = parsed_message["event_data"] or {}
+        if data.get("cancel"):
+            del self.streams[stream.stream_id]
+            stream.messages.close()
+            return
+        stream.credit += int(data.get("credit", 0))
+        stream.last_credit = time.monotonic()
+        self.send_stream(stream)
+
+    def expire_streams(self):
+        now = time.monotonic()
+        for stream in [stream for stream in self.streams.values() if now - stream.last_credit > self.stream_timeout]:
+            self.log_limiter.log("stream_expired", "WARNING", "Stream {} dropped, no credit for {} seconds",
+                                 stream.stream_id, self.stream_timeout)
+            del self.streams[stream.stream_id]
+            stream.messages.close()
+
+    def _iterate_chunks(self, chunks) -> Iterator:
+        if not inspect.isasyncgen(chunks):
+            return chunks
+        return self._iterate_async_chunks(chunks)
+
+    def _iterate_async_chunks(self, chunks) -> Iterator:
+        if self._event_loop is None:
+            self._event_loop = asyncio.new_event_loop()
+        while True:
+            try:
+                yield self._event_loop.run_until_complete(chunks.__anext__())
+            except StopAsyncIteration:
+                break
+
     def cleanup(self):
         logger.info(f"{self.node_type.value} is shutting down, performing cleanup...")
         self.poller.unregister(self.socket)
+        for ha_heartbeat in self.ha_heartbeats:
+            ha_heartbeat.stop()
+        for ha_socket in self.ha_sockets:
+            self.poller.unregister(ha_socket)
+            ha_socket.close()
+        for stream in self.streams.values():
+            stream.messages.close()
+        self.streams = {}
+        if self._event_loop is not None:
+            self._event_loop.close()
         super().cleanup()
 
     def handle_message(self, message: dict) -> Any:
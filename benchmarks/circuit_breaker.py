@@ -0,0 +1,71 @@
+"""
+Circuit breaker: time a caller spends on failed requests against a degraded backend, with and without a breaker.
+
+The worker behind the router stops answering within the client timeout. Without a breaker, every request waits for
+the whole timeout before raising ZeroMQTimeoutError. With a breaker the first min_requests requests still time out,
+then the circuit opens and the following ones fail with ZeroMQCircuitOpenError right away.
+
+Usage: python benchmarks/circuit_breaker.py --config config.ini --requests 10 --timeout 1 --min-requests 3
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import (ZeroMQCircuitBreaker, ZeroMQClient, ZeroMQError, ZeroMQRouter, ZeroMQTCPConnection,
+                             ZeroMQWorker)
+
+
+def measure(client, requests):
+    durations = []
+    errors = {}
+    for i in range(requests):
+        start = time.perf_counter()
+        try:
+            client.send_message("degraded", i)
+        except ZeroMQError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--timeout", type=int, default=1, help="client timeout in seconds")
+    parser.add_argument("--min-requests", type=int, default=3, help="outcomes before the circuit can open")
+    parser.add_argument("--port", type=int, default=17800)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="CRITICAL")
+
+    router = ZeroMQRouter(args.config, ZeroMQTCPConnection(port=args.port), ZeroMQTCPConnection(port=args.port + 1))
+    threading.Thread(target=router.start, daemon=True).start()
+    time.sleep(0.1)  # the router binds first
+
+    def handle_message(message):
+        time.sleep(args.timeout * 3)  # degraded: far slower than the client timeout
+        return message["event_data"]
+
+    for _ in range(4):
+        ZeroMQWorker(args.config, ZeroMQTCPConnection(port=args.port + 1), handle_message=handle_message).start()
+
+    for label, breaker in (("no breaker", None),
+                           ("breaker", ZeroMQCircuitBreaker(min_requests=args.min_requests, open_duration=60))):
+        client = ZeroMQClient(args.config, ZeroMQTCPConnection(port=args.port), timeout=args.timeout,
+                              circuit_breaker=breaker)
+        client.connect()
+        durations, errors = measure(client, args.requests)
+        print(f"{label:>10}: {sum(durations) / 1000:7.3f} s for {args.requests} failed requests, "
+              f"median {statistics.median(durations):9.3f} ms, fastest {min(durations):9.3f} ms, errors {errors}")
+        if breaker is not None:
+            print(f"{'':>10}  {breaker.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Fair queuing: latency of a quiet tenant while a noisy tenant floods the router, for the routing proxy and the fair
+queuing strategy (with and without a rate limit on the noisy tenant).
+
+The noisy tenant runs many client sockets sending back to back, the quiet tenant one client sending one request at a
+time. Both go through a router to a few workers with a fixed handler cost. The tenants are told apart by their node
+id (a configuration file each), the fair queuing strategy groups the sockets of a node with node_id_key. Each
+strategy runs in its own process.
+
+Usage: python benchmarks/fair_queuing.py --noisy-clients 40 --workers 4 --handler-ms 5 --noisy-rate 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import ZeroMQClient, ZeroMQRouter, ZeroMQTCPConnection, ZeroMQWorker, get_node_id
+from ZeroMQFramework.router.fair_queuing import ZeroMQClientLimit, ZeroMQFairQueuingStrategy
+
+
+def run(args, mode):
+    directory = tempfile.mkdtemp()
+    noisy_config, quiet_config, config = (os.path.join(directory, f"{name}.ini") for name in ("noisy", "quiet", "node"))
+    if mode == "proxy":
+        strategy = None
+    else:
+        limits = {get_node_id(noisy_config, "client"): ZeroMQClientLimit(rate=args.noisy_rate)} if mode == "limit" \
+            else None
+        strategy = ZeroMQFairQueuingStrategy(max_in_flight=args.workers, limits=limits,
+                                             client_key=ZeroMQFairQueuingStrategy.node_id_key)
+    router = ZeroMQRouter(config, ZeroMQTCPConnection(port=args.port), ZeroMQTCPConnection(port=args.port + 1),
+                          strategy=strategy)
+    threading.Thread(target=router.start, daemon=True).start()
+    time.sleep(0.1)  # the router binds first
+
+    def handle_message(message):
+        time.sleep(args.handler_ms / 1000)
+        return message["event_data"]
+
+    for _ in range(args.workers):
+        ZeroMQWorker(config, ZeroMQTCPConnection(port=args.port + 1), handle_message=handle_message).start()
+    noisy = [ZeroMQClient(noisy_config, ZeroMQTCPConnection(port=args.port), timeout=60)
+             for _ in range(args.noisy_clients)]
+    quiet = ZeroMQClient(quiet_config, ZeroMQTCPConnection(port=args.port), timeout=60)
+    for client in noisy + [quiet]:
+        client.connect()
+    time.sleep(0.5)
+
+    noisy_sent = []
+
+    def flood(client):
+        while True:
+            client.send_message("noisy", 0)
+            noisy_sent.append(1)
+
+    for client in noisy:
+        threading.Thread(target=flood, args=(client,), daemon=True).start()
+    time.sleep(0.5)  # the noisy tenant fills the queues
+
+    latencies = []
+    noisy_before, start = len(noisy_sent), time.perf_counter()
+    for i in range(args.requests):
+        request_start = time.perf_counter()
+        quiet.send_message("quiet", i)
+        latencies.append((time.perf_counter() - request_start) * 1000)
+    noisy_throughput = (len(noisy_sent) - noisy_before) / (time.perf_counter() - start)
+    latencies.sort()
+    print(f"{mode:>5}: quiet tenant p50 {statistics.median(latencies):7.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms, noisy tenant {noisy_throughput:7,.0f} requests/s")
+    sys.stdout.flush()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--noisy-clients", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--handler-ms", type=float, default=5)
+    parser.add_argument("--noisy-rate", type=float, default=50, help="rate limit of the noisy tenant (limit mode)")
+    parser.add_argument("--requests", type=int, default=100, help="requests of the quiet tenant")
+    parser.add_argument("--port", type=int, default=17700)
+    parser.add_argument("--run", choices=["proxy", "fair", "limit"], help=argparse.SUPPRESS)  # one run
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    if args.run is not None:
+        run(args, args.run)
+
+    for index, mode in enumerate(["proxy", "fair", "limit"]):
+        subprocess.run([sys.executable, __file__, "--run", mode, "--noisy-clients", str(args.noisy_clients),
+                        "--workers", str(args.workers), "--handler-ms", str(args.handler_ms),
+                        "--noisy-rate", str(args.noisy_rate), "--requests", str(args.requests),
+                        "--port", str(args.port + index * 2)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Heartbeat cost: JSON vs binary wire format.
+
+Measures the per-heartbeat CPU cost (encoding on the sender, decoding and recording on the receiver) for both wire
+formats, and the receiver memory per node once N nodes are known, against the previous dict-backed node records keyed
+by f-strings. No sockets are used, the frames are handed to the receiver directly.
+
+Usage: python benchmarks/heartbeat_wire_format.py --nodes 5000 --rounds 5 --load
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+import zmq
+
+from ZeroMQFramework import *
+from ZeroMQFramework.heartbeat.node_info import ZeroMQNodeInfo
+from ZeroMQFramework.heartbeat.wire_format import (ZeroMQHeartbeatWireFormat, create_heartbeat_message,
+                                                   parse_heartbeat_message)
+from ZeroMQFramework.helpers.utils import get_uuid_hex
+
+
+@dataclass
+class DictNodeInfo:  # the node record before __slots__, for the memory comparison
+    node_id: str
+    session_id: str
+    node_type: ZeroMQNodeType
+    last_heartbeat: int
+    missed_count: int = 0
+    endpoint: Optional[str] = None
+    load: Optional[dict] = None
+
+
+def make_nodes(count, with_load):
+    load = {"inflight": 2, "queue": 0, "p50": 1.25, "p99": 7.5, "cpu": 35.2, "rss": 52428800} if with_load else None
+    return [ZeroMQNodeInfo(node_id=get_uuid_hex(), session_id=get_uuid_hex(16), node_type=ZeroMQNodeType.WORKER,
+                           last_heartbeat=0, endpoint="tcp://10.0.0.1:5556", load=dict(load) if load else None)
+            for _ in range(count)]
+
+
+def bench_format(context, nodes, rounds, wire_format, with_load):
+    config = ZeroMQHeartbeatConfig(ZeroMQTCPConnection(port=5557), report_load=with_load, wire_format=wire_format)
+    receiver = ZeroMQHeartbeatReceiver(context, "bench", "bench", ZeroMQNodeType.ROUTER, config)
+    identity = b"sender"
+    for node in nodes:  # every node joins first, only the steady state is measured
+        receiver.handle_heartbeat(parse_heartbeat_message([identity] + create_heartbeat_message(node, wire_format)))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for node in nodes:
+            message = create_heartbeat_message(node, wire_format)
+            receiver.handle_heartbeat(parse_heartbeat_message([identity] + message))
+    per_heartbeat = (time.perf_counter() - start) / (rounds * len(nodes)) * 1e6
+    size = sum(len(frame) for frame in create_heartbeat_message(nodes[0], wire_format))
+    receiver.socket.close(linger=0)
+    receiver.socket_monitor.cleanup()
+    return per_heartbeat, size
+
+
+def table_memory(nodes, record):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if record is ZeroMQNodeInfo:
+        table = {(node.node_id, node.session_id): ZeroMQNodeInfo(node.node_id, node.session_id, node.node_type,
+                                                                 node.last_heartbeat, endpoint=node.endpoint)
+                 for node in nodes}
+    else:
+        table = {f"{node.node_id}_{node.session_id}": DictNodeInfo(node.node_id, node.session_id, node.node_type,
+                                                                   node.last_heartbeat, endpoint=node.endpoint)
+                 for node in nodes}
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del table
+    return used / len(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--load", action="store_true", help="include load reports in the heartbeats")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    context = zmq.Context()
+    nodes = make_nodes(args.nodes, args.load)
+
+    for wire_format in ZeroMQHeartbeatWireFormat:
+        cost, size = bench_format(context, nodes, args.rounds, wire_format, args.load)
+        print(f"{wire_format.value:6}: {cost:6.2f} us/heartbeat, {size} bytes on the wire")
+    # the ids are shared by both tables, only the records and the keys are measured
+    print(f"receiver table, dict records and f-string keys: {table_memory(nodes, DictNodeInfo):,.0f} bytes/node")
+    print(f"receiver table, slots records and tuple keys  : {table_memory(nodes, ZeroMQNodeInfo):,.0f} bytes/node")
+    context.term()
+
+
+if __name__ == "__main__":
+    main()
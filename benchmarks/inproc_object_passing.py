@@ -0,0 +1,68 @@
+"""
+Inproc object passing: request latency of in-process nodes with serialized messages vs objects passed by reference.
+
+A client, a router and a worker run in this process over inproc connections, once serializing the messages (JSON)
+and once with pass_objects=True (only a token frame goes through libzmq, see ZeroMQObjectRegistry). The request is
+a list of dicts of the given number of items, echoed back by the worker. The direct call of the handler is the floor.
+
+Usage: python benchmarks/inproc_object_passing.py --config config.ini --items 1 100 10000 --requests 2000
+"""
+import argparse
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import ZeroMQClient, ZeroMQINPROCConnection, ZeroMQRouter, ZeroMQWorker
+
+
+def handle_message(message):
+    return message["event_data"]
+
+
+def bench(config_file, pass_objects, items_list, requests):
+    name = "objects" if pass_objects else "json"
+    router = ZeroMQRouter(config_file, ZeroMQINPROCConnection(f"{name}_front", pass_objects=pass_objects),
+                          ZeroMQINPROCConnection(f"{name}_back", pass_objects=pass_objects))
+    threading.Thread(target=router.start, daemon=True).start()
+    time.sleep(0.1)  # the router binds first
+    ZeroMQWorker(config_file, ZeroMQINPROCConnection(f"{name}_back", pass_objects=pass_objects),
+                 handle_message=handle_message).start()
+    client = ZeroMQClient(config_file, ZeroMQINPROCConnection(f"{name}_front", pass_objects=pass_objects))
+    client.connect()
+    results = {}
+    for items in items_list:
+        data = [{"id": i, "name": f"item {i}", "score": i * 0.5, "tags": ["a", "b"]} for i in range(items)]
+        client.send_message("echo", data)  # warm up
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.send_message("echo", data)
+        results[items] = (time.perf_counter() - start) / requests * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 100, 10000], help="items per request")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    serialized = bench(args.config, False, args.items, args.requests)
+    by_reference = bench(args.config, True, args.items, args.requests)
+    for items in args.items:
+        message = {"event_name": "echo", "event_data": [{"id": 0}] * items, "metadata": {}}
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            handle_message(message)
+        direct = (time.perf_counter() - start) / args.requests * 1e6
+        print(f"{items:>6} items: json {serialized[items]:10.1f} us, by reference {by_reference[items]:8.1f} us, "
+              f"direct call {direct:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Load generator: open loop requests at a fixed rate against a router or server, with latencies measured from the
+intended start time of every request.
+
+A closed loop load test (a ZeroMQClient sending its next request once the previous one is answered) slows down with
+the system under test: when it stalls, the requests that should have been sent meanwhile are never sent, and their
+delay is missing from the latencies (coordinated omission). Here the start times are scheduled in advance, at --rate
+requests per second over --duration seconds (evenly spaced, or as a Poisson process with --arrival poisson), and
+the latency of a request runs from its scheduled start to its reply. A request waiting for a free virtual client is
+late, and that delay is part of its latency.
+
+The load is spread over --processes processes, each running --clients virtual clients as asyncio tasks with a DEALER
+socket each and one request in flight per client, like a REQ client. The latencies go to HDR style histograms
+(ZeroMQLatencyHistogram, microsecond values, 3 significant digits) merged across the processes. The report gives the
+throughput, the errors by class (ZeroMQTimeoutError, ZeroMQQSocketInvalid, ZeroMQMalformedMessage), the latency
+percentiles from the intended start and, for comparison, from the actual send (what a closed loop test reports).
+
+Usage: python benchmarks/load_generator.py --endpoint tcp://127.0.0.1:5555 --rate 2000 --duration 30 --processes 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import zmq
+import zmq.asyncio
+from loguru import logger
+
+from ZeroMQFramework.helpers.error import ZeroMQMalformedMessage, ZeroMQQSocketInvalid, ZeroMQTimeoutError
+from ZeroMQFramework.helpers.histogram import ZeroMQLatencyHistogram
+from ZeroMQFramework.helpers.utils import create_message, get_uuid_hex, parse_message
+
+PERCENTILES = (50, 90, 99, 99.9, 99.99)
+
+
+class VirtualClient:
+    def __init__(self, context: zmq.asyncio.Context, endpoint: str, timeout: float):
+        self.context = context
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.socket = None
+        self.connect()
+
+    def connect(self):
+        if self.socket is not None:
+            self.socket.close(linger=0)
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(self.endpoint)
+
+    async def request(self, message: list, request_id: str):
+        """
+        :raises ZeroMQTimeoutError: If no reply is received within the timeout.
+        :raises ZeroMQQSocketInvalid: If the socket fails, it is reconnected.
+        :raises ZeroMQMalformedMessage: If the reply cannot be parsed.
+        """
+        deadline = time.perf_counter() + self.timeout
+        try:
+            await self.socket.send_multipart(message)
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not await self.socket.poll(remaining * 1000, zmq.POLLIN):
+                    raise ZeroMQTimeoutError(f"No reply within {self.timeout} s")
+                reply = await self.socket.recv_multipart()
+                try:
+                    metadata = parse_message(reply)["metadata"]
+                except ValueError as e:
+                    raise ZeroMQMalformedMessage(e)
+                if metadata.get("request_id") == request_id:
+                    return
+                # else the late reply of a request that timed out
+        except zmq.ZMQError as e:
+            self.connect()
+            raise ZeroMQQSocketInvalid(e)
+
+
+async def generate(args, rate: float, start: float) -> dict:
+    context = zmq.asyncio.Context()
+    clients = [VirtualClient(context, args.endpoint, args.timeout) for _ in range(args.clients)]
+    payload = "x" * args.payload_bytes if args.payload_bytes else json.loads(args.payload)
+    schedule = asyncio.Queue()  # intended start times, perf_counter
+    latency = ZeroMQLatencyHistogram()  # from the intended start
+    service_time = ZeroMQLatencyHistogram()  # from the actual send
+    errors = Counter()
+    counters = Counter()
+    measure_from = None  # intended start of the first measured request, after the warm up
+
+    async def run_client(client):
+        while True:
+            intended = await schedule.get()
+            if intended is None:
+                return
+            request_id = get_uuid_hex(16)
+            message = create_message(args.event, payload, include_empty_frame=True, metadata={"request_id": request_id})
+            sent = time.perf_counter()
+            counters["sent"] += 1
+            try:
+                await client.request(message, request_id)
+            except (ZeroMQTimeoutError, ZeroMQQSocketInvalid, ZeroMQMalformedMessage) as e:
+                if intended >= measure_from:
+                    errors[type(e).__name__] += 1
+                continue
+            if intended >= measure_from:
+                now = time.perf_counter()
+                latency.record((now - intended) * 1e6)
+                service_time.record((now - sent) * 1e6)
+                counters["completed"] += 1
+
+    # all the processes start at the same wall clock time, then each schedules on its own monotonic clock
+    await asyncio.sleep(max(0.0, start - time.time()))
+    begin = time.perf_counter()
+    measure_from = begin + args.warmup
+    end = begin + args.warmup + args.duration
+    tasks = [asyncio.ensure_future(run_client(client)) for client in clients]
+
+    intended = begin
+    while intended < end:
+        await asyncio.sleep(max(0.0, intended - time.perf_counter()))  # yields to the clients even when late
+        schedule.put_nowait(intended)
+        counters["scheduled"] += intended >= measure_from
+        intended += random.expovariate(rate) if args.arrival == "poisson" else 1 / rate
+    for _ in clients:
+        schedule.put_nowait(None)
+
+    # the backlog of a system that fell behind is still sent, up to the drain time
+    done, pending = await asyncio.wait(tasks, timeout=args.drain)
+    for task in pending:
+        task.cancel()
+    unsent = sum(1 for _ in range(schedule.qsize()) if schedule.get_nowait() is not None)
+    context.destroy(linger=0)
+    return {
+        "latency": latency.to_dict(),
+        "service_time": service_time.to_dict(),
+        "errors": dict(errors),
+        "scheduled": counters["scheduled"],
+        "sent": counters["sent"],
+        "completed": counters["completed"],
+        "unsent": unsent,
+        "cancelled": len(pending),
+    }
+
+
+def format_histogram(histogram: ZeroMQLatencyHistogram) -> str:
+    if not histogram.total_count:
+        return "n/a"
+    values = ", ".join(f"p{percentile:g} {value / 1000:9.3f}"
+                       for percentile, value in histogram.get_percentiles(PERCENTILES).items())
+    return f"{values}, max {histogram.max / 1000:9.3f} ms"
+
+
+def report(args, results: list):
+    latency = ZeroMQLatencyHistogram()
+    service_time = ZeroMQLatencyHistogram()
+    errors = Counter()
+    totals = Counter()
+    for result in results:
+        latency.add(ZeroMQLatencyHistogram.from_dict(result["latency"]))
+        service_time.add(ZeroMQLatencyHistogram.from_dict(result["service_time"]))
+        errors.update(result["errors"])
+        totals.update({key: result[key] for key in ("scheduled", "sent", "completed", "unsent", "cancelled")})
+
+    print(f"target     {args.rate:,.0f} requests/s for {args.duration} s ({args.arrival}), "
+          f"{args.processes} processes x {args.clients} clients")
+    print(f"completed  {totals['completed']} of {totals['scheduled']} scheduled "
+          f"({totals['completed'] / args.duration:,.0f} requests/s), unsent {totals['unsent']}, "
+          f"cancelled {totals['cancelled']}")
+    print(f"errors     {dict(errors) or 'none'}")
+    print(f"latency    {format_histogram(latency)}  (from the intended start)")
+    print(f"service    {format_histogram(service_time)}  (from the send, closed loop view)")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"args": vars(args), "errors": dict(errors), **totals, "latency": latency.to_dict(),
+                       "service_time": service_time.to_dict()}, output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", required=True, help="router frontend or server, e.g. tcp://127.0.0.1:5555")
+    parser.add_argument("--rate", type=float, default=1000, help="total requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1, help="seconds of load before measuring")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=50, help="virtual clients per process")
+    parser.add_argument("--event", default="message")
+    parser.add_argument("--payload", default="{}", help="JSON event data")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="send a string of this size instead")
+    parser.add_argument("--timeout", type=float, default=5, help="seconds before a request is a timeout")
+    parser.add_argument("--drain", type=float, default=10, help="seconds to send the backlog after the duration")
+    parser.add_argument("--output", help="write the merged results (histograms included) to this JSON file")
+    parser.add_argument("--run", type=float, help=argparse.SUPPRESS)  # one process, starting at this time
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    if args.run is not None:
+        result = asyncio.run(generate(args, args.rate / args.processes, args.run))
+        print(json.dumps(result))
+        return
+
+    start = time.time() + 0.5 + 0.1 * args.processes  # time for the processes to start and connect
+    command = [sys.executable, __file__] + sys.argv[1:] + ["--run", str(start)]
+    processes = [subprocess.Popen(command, stdout=subprocess.PIPE, text=True) for _ in range(args.processes)]
+    results = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in processes]
+    report(args, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Logging overhead per request.
+
+Measures what a log call made for every request costs the message loop:
+- a debug log built with an f-string while DEBUG is disabled (the f-string is still built) vs loguru arguments
+- a log written by a file sink on the calling thread vs the batching sink (ZeroMQBatchingLogSink)
+- the same with a slow disk (every write takes --disk-latency ms), where the calling thread stalls unless the writes
+  are done in the background
+- an error logged for every request vs through the rate limiter (ZeroMQLogRateLimiter)
+
+Usage: python benchmarks/logging_overhead.py --requests 20000 --disk-latency 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+from ZeroMQFramework.helpers.log_sink import ZeroMQBatchingLogSink, ZeroMQLogRateLimiter
+
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{line} - {message}"
+
+
+class SlowStream:
+    """A file whose writes take a fixed time, like a busy or remote disk."""
+
+    def __init__(self, path, latency):
+        self.file = open(path, "a", encoding="utf-8")
+        self.latency = latency
+
+    def write(self, message):
+        time.sleep(self.latency)
+        self.file.write(message)
+
+    def flush(self):
+        self.file.flush()
+
+
+def per_request(requests, log_call):
+    request = {"event_name": "bench", "event_data": {"i": 1}}
+    start = time.perf_counter()
+    for i in range(requests):
+        log_call(i, request)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def with_handler(requests, sink, log_call, **kwargs):
+    handler = logger.add(sink, format=LOG_FORMAT, **kwargs)
+    cost = per_request(requests, log_call)
+    logger.remove(handler)  # stops the batching sink, the pending messages are written outside of the measure
+    return cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--disk-latency", type=float, default=2, help="ms per write of the slow disk")
+    args = parser.parse_args()
+
+    logger.remove()
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "bench.log")
+    results = []
+
+    def info(i, request):
+        logger.info("request {} handled: {}", i, request["event_name"])
+
+    logger.add(sys.stderr, level="INFO", format=LOG_FORMAT)  # DEBUG disabled
+    results.append(("debug disabled, f-string", per_request(
+        args.requests, lambda i, request: logger.debug(f"request {i} received: {request}"))))
+    results.append(("debug disabled, loguru arguments", per_request(
+        args.requests, lambda i, request: logger.debug("request {} received: {}", i, request))))
+    logger.remove()
+
+    results.append(("info, file sink on the calling thread", with_handler(args.requests, path, info)))
+    results.append(("info, batching sink", with_handler(args.requests, ZeroMQBatchingLogSink(path), info)))
+
+    slow_requests = max(args.requests // 20, 100)
+    latency = args.disk_latency / 1000
+    results.append((f"info, slow disk ({args.disk_latency} ms), calling thread",
+                    with_handler(slow_requests, SlowStream(path, latency), info)))
+    results.append((f"info, slow disk ({args.disk_latency} ms), batching sink",
+                    with_handler(slow_requests, ZeroMQBatchingLogSink(SlowStream(path, latency)), info)))
+
+    limiter = ZeroMQLogRateLimiter()
+    results.append(("error on every request", with_handler(
+        args.requests, ZeroMQBatchingLogSink(path),
+        lambda i, request: logger.error("request {} failed: {}", i, "boom"))))
+    results.append(("error on every request, rate limited", with_handler(
+        args.requests, ZeroMQBatchingLogSink(path),
+        lambda i, request: limiter.log("failed", "ERROR", "request {} failed: {}", i, "boom"))))
+
+    for name, cost in results:
+        print(f"{name:48}: {cost:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
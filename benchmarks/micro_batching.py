@@ -0,0 +1,101 @@
+"""
+Micro-batching: throughput and latency of a worker with a batch handler, for several batch sizes and waits.
+
+The handler models vectorized scoring: a fixed cost per call plus a small cost per item (a sleep, which like NumPy
+releases the GIL). Concurrent clients send requests through a router to one worker, first handled one at a time
+(handle_message), then with batch_handler for each max_batch_size x max_batch_wait_us combination. Larger batches
+amortize the fixed cost (throughput) at the price of the time spent waiting for the batch to fill (latency).
+Each setting runs in its own process.
+
+Usage: python benchmarks/micro_batching.py --config config.ini --batch-sizes 1 8 32 --waits-us 0 200 1000 \
+--clients 32 --call-cost-us 500 --item-cost-us 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import ZeroMQClient, ZeroMQRouter, ZeroMQTCPConnection, ZeroMQWorker
+
+
+def run(args, batch_size, wait_us):
+    def score(count):
+        time.sleep((args.call_cost_us + count * args.item_cost_us) / 1e6)
+
+    def handle_message(message):
+        score(1)
+        return message["event_data"]
+
+    def batch_handler(messages):
+        score(len(messages))
+        return [message["event_data"] for message in messages]
+
+    router = ZeroMQRouter(args.config, ZeroMQTCPConnection(port=args.port), ZeroMQTCPConnection(port=args.port + 1))
+    threading.Thread(target=router.start, daemon=True).start()
+    if batch_size:
+        worker = ZeroMQWorker(args.config, ZeroMQTCPConnection(port=args.port + 1), batch_handler=batch_handler,
+                              max_batch_size=batch_size, max_batch_wait_us=wait_us)
+    else:
+        worker = ZeroMQWorker(args.config, ZeroMQTCPConnection(port=args.port + 1), handle_message=handle_message)
+    worker.start()
+    clients = [ZeroMQClient(args.config, ZeroMQTCPConnection(port=args.port), timeout=30) for _ in range(args.clients)]
+    for client in clients:
+        client.connect()
+
+    latencies = []
+
+    def send(client):
+        for i in range(args.requests):
+            start = time.perf_counter()
+            client.send_message("score", i)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=send, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    label = f"batch {batch_size:>3}, wait {wait_us:>5} us" if batch_size else "unbatched              "
+    print(f"{label}: {len(latencies) / elapsed:9,.0f} requests/s, p50 {statistics.median(latencies):7.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms")
+    sys.stdout.flush()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--waits-us", type=int, nargs="+", default=[0, 200, 1000])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--call-cost-us", type=int, default=500, help="handler cost per call")
+    parser.add_argument("--item-cost-us", type=int, default=20, help="handler cost per item")
+    parser.add_argument("--port", type=int, default=17500)
+    parser.add_argument("--run", type=int, nargs=2, help=argparse.SUPPRESS)  # one run: batch size (0 = unbatched), wait
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if args.run is not None:
+        run(args, *args.run)
+
+    settings = [(0, 0)] + [(batch_size, wait_us) for batch_size in args.batch_sizes for wait_us in args.waits_us]
+    for index, (batch_size, wait_us) in enumerate(settings):
+        subprocess.run([sys.executable, __file__, "--run", str(batch_size), str(wait_us), "--config", args.config,
+                        "--clients", str(args.clients), "--requests", str(args.requests),
+                        "--call-cost-us", str(args.call_cost_us), "--item-cost-us", str(args.item_cost_us),
+                        "--port", str(args.port + index * 2)], check=True)
+
+
+if __name__ == "__main__":
+    main()
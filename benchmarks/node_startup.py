@@ -0,0 +1,82 @@
+"""
+Node startup time.
+
+Reports:
+- the package import time, for a bare import and for a single class (the package exports are imported lazily)
+- the node id lookup, from the configuration file (first node of a type) vs cached (the next ones)
+- the time to create N clients and workers, and the Python threads they start before connecting (the socket monitors
+  and heartbeats are only started when the node connects)
+
+Usage: python benchmarks/node_startup.py --config config.ini --nodes 200
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import ZeroMQClient, ZeroMQWorker, ZeroMQTCPConnection, ZeroMQHeartbeatConfig, ZeroMQContextManager
+from ZeroMQFramework.helpers import utils
+
+
+def import_time(statement, runs=5):
+    def run(code):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return time.perf_counter() - start
+    baseline = min(run("pass") for _ in range(runs))  # interpreter startup
+    return (min(run(statement) for _ in range(runs)) - baseline) * 1000
+
+
+def node_id_lookup(config_file, lookups=200):
+    start = time.perf_counter()
+    for _ in range(lookups):
+        utils._node_ids.clear()  # read the configuration file every time
+        utils.get_node_id(config_file, "client")
+    cold = (time.perf_counter() - start) / lookups * 1e6
+    start = time.perf_counter()
+    for _ in range(lookups):
+        utils.get_node_id(config_file, "client")
+    cached = (time.perf_counter() - start) / lookups * 1e6
+    return cold, cached
+
+
+def create_nodes(config_file, count, node_class, **kwargs):
+    threads_before = threading.active_count()
+    start = time.perf_counter()
+    nodes = [node_class(config_file, ZeroMQTCPConnection(port=17200), **kwargs) for _ in range(count)]
+    elapsed = (time.perf_counter() - start) / count * 1000
+    threads = threading.active_count() - threads_before
+    for node in nodes:  # never started, only the socket and the shared context to release
+        node.socket.close(linger=0)
+        ZeroMQContextManager.release(node.context)
+    return elapsed, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--nodes", type=int, default=200)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    print(f"import ZeroMQFramework                  : {import_time('import ZeroMQFramework'):7.1f} ms")
+    print(f"from ZeroMQFramework import ZeroMQClient: "
+          f"{import_time('from ZeroMQFramework import ZeroMQClient'):7.1f} ms")
+    cold, cached = node_id_lookup(args.config)
+    print(f"node id, read from the configuration    : {cold:7.1f} us")
+    print(f"node id, cached                          : {cached:7.1f} us")
+    heartbeat_config = ZeroMQHeartbeatConfig(ZeroMQTCPConnection(port=17201), interval=1)
+    for name, node_class, kwargs in (("client", ZeroMQClient, {}),
+                                     ("client with heartbeat", ZeroMQClient, {"heartbeat_config": heartbeat_config}),
+                                     ("worker", ZeroMQWorker, {"handle_message": lambda message: None})):
+        per_node, threads = create_nodes(args.config, args.nodes, node_class, **kwargs)
+        print(f"create {args.nodes} x {name:22}: {per_node:7.3f} ms/node, {threads} threads started")
+
+
+if __name__ == "__main__":
+    main()
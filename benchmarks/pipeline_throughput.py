@@ -0,0 +1,79 @@
+"""
+Throughput benchmark: PUSH/PULL pipeline mode vs the req/reply path.
+
+Runs a router, a worker and a client (req/reply) and a producer, a pipeline worker and a sink (pipeline) in one
+process and reports messages per second for each path.
+
+Usage: python benchmarks/pipeline_throughput.py --messages 20000 --hwm 1000
+"""
+import argparse
+import sys
+import threading
+import time
+
+from ZeroMQFramework import *
+
+
+def bench_req_reply(config_file, messages, base_port, payload):
+    router = ZeroMQRouter(config_file, ZeroMQTCPConnection(port=base_port), ZeroMQTCPConnection(port=base_port + 1))
+    threading.Thread(target=router.start, daemon=True).start()
+    worker = ZeroMQWorker(config_file, ZeroMQTCPConnection(port=base_port + 1),
+                          handle_message=lambda m: m["event_data"])
+    worker.start()
+    client = ZeroMQClient(config_file, ZeroMQTCPConnection(port=base_port))
+    client.connect()
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        client.send_message("bench", payload)
+    return messages / (time.perf_counter() - start)
+
+
+def bench_pipeline(config_file, messages, base_port, payload, hwm):
+    done = threading.Event()
+    received = [0]
+
+    def handle_result(_):
+        received[0] += 1
+        if received[0] == messages:
+            done.set()
+
+    sink = ZeroMQSink(config_file, ZeroMQTCPConnection(port=base_port + 1), handle_result=handle_result, hwm=hwm)
+    sink.start()
+    worker = ZeroMQPipelineWorker(config_file, ZeroMQTCPConnection(port=base_port),
+                                  handle_message=lambda m: m["event_data"],
+                                  sink_connection=ZeroMQTCPConnection(port=base_port + 1), hwm=hwm)
+    worker.start()
+    producer = ZeroMQProducer(config_file, ZeroMQTCPConnection(port=base_port), hwm=hwm)
+    producer.connect()
+    time.sleep(0.5)  # let the worker connect, PUSH does not queue for peers that are not connected yet
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        producer.send_message("bench", payload)
+    if not done.wait(timeout=60):
+        print(f"pipeline: only {received[0]} of {messages} results reached the sink", file=sys.stderr)
+    return received[0] / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--hwm", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=17000)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    payload = {"data": "x" * args.payload_size}
+
+    req_reply = bench_req_reply(args.config, args.messages, args.port, payload)
+    pipeline = bench_pipeline(args.config, args.messages, args.port + 10, payload, args.hwm)
+    print(f"req/reply: {req_reply:,.0f} msg/s")
+    print(f"pipeline : {pipeline:,.0f} msg/s (hwm={args.hwm})")
+
+
+if __name__ == "__main__":
+    main()
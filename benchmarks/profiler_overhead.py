@@ -0,0 +1,88 @@
+"""
+Handler profiling: request latency without a profiler, with an idle profiler, with a slow request threshold and during
+sampling and cProfile windows, then the files written by the windows.
+
+A client, a router and a worker run in one process per configuration. The handler does some pure Python work
+(--handler-work iterations), so the cProfile overhead on Python calls shows. The files go to a temporary directory.
+
+Usage: python benchmarks/profiler_overhead.py --config config.ini --requests 2000 --handler-work 2000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import (ZeroMQClient, ZeroMQHandlerProfiler, ZeroMQProfilerMode, ZeroMQRouter,
+                             ZeroMQTCPConnection, ZeroMQWorker)
+
+CONFIGURATIONS = ["none", "idle", "slow", "sample", "cprofile"]
+
+
+def run(args, configuration):
+    profiler = None
+    if configuration != "none":
+        profiler = ZeroMQHandlerProfiler(args.output_dir, slow_threshold_ms=1000 if configuration == "slow" else None)
+    router = ZeroMQRouter(args.config, ZeroMQTCPConnection(port=args.port), ZeroMQTCPConnection(port=args.port + 1))
+    threading.Thread(target=router.start, daemon=True).start()
+    time.sleep(0.1)  # the router binds first
+
+    def handle_message(message):
+        return sum(i * i for i in range(args.handler_work))
+
+    ZeroMQWorker(args.config, ZeroMQTCPConnection(port=args.port + 1), handle_message=handle_message,
+                 profiler=profiler).start()
+    client = ZeroMQClient(args.config, ZeroMQTCPConnection(port=args.port), timeout=10)
+    client.connect()
+    for i in range(100):  # warm up
+        client.send_message("work", i)
+
+    if configuration in ("sample", "cprofile"):
+        profiler.start(3600, ZeroMQProfilerMode(configuration))
+    latencies = []
+    for i in range(args.requests):
+        start = time.perf_counter()
+        client.send_message("work", i)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    if profiler is not None:
+        profiler.stop()
+    print(f"{configuration:>10}: mean {statistics.mean(latencies):8.1f} us, median {statistics.median(latencies):8.1f} us"
+          + (f", {len(profiler.files)} files" if profiler and profiler.files else ""))
+    sys.stdout.flush()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--handler-work", type=int, default=2000, help="iterations of the handler loop")
+    parser.add_argument("--port", type=int, default=17950)
+    parser.add_argument("--run", choices=CONFIGURATIONS, help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    if args.run is not None:
+        run(args, args.run)
+
+    directory = tempfile.mkdtemp()
+    for index, configuration in enumerate(CONFIGURATIONS):
+        subprocess.run([sys.executable, __file__, "--run", configuration, "--output-dir", directory,
+                        "--config", args.config, "--requests", str(args.requests),
+                        "--handler-work", str(args.handler_work), "--port", str(args.port + index * 2)], check=True)
+    print()
+    for name in sorted(os.listdir(directory)):
+        print(f"{name}: {os.path.getsize(os.path.join(directory, name)):,} bytes")
+    print(f"in {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Reactor workers: N logical workers on one thread (ZeroMQReactorWorkers) vs N ZeroMQWorker threads.
+
+The handler models an I/O bound request (a 10 ms wait: time.sleep for the threaded workers, asyncio.sleep for the
+reactor, whose handler is a coroutine function). Concurrent clients send requests through a router. Reported are
+the throughput, the latency percentiles, and the OS threads and resident memory of the process hosting the workers.
+Each setting runs in its own processes.
+
+Usage: python benchmarks/reactor_workers.py --config config.ini --workers 50 200 --clients 100 --io-ms 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import ZeroMQClient, ZeroMQReactorWorkers, ZeroMQRouter, ZeroMQTCPConnection, ZeroMQWorker
+
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def run_workers(args, reactor, num_workers):
+    threads_before = threading.active_count()
+    if reactor:
+        async def handle_message(message):
+            await asyncio.sleep(args.io_ms / 1000)
+            return message["event_data"]
+
+        ZeroMQReactorWorkers(args.config, ZeroMQTCPConnection(port=args.port + 1), num_workers=num_workers,
+                             handle_message=handle_message).start()
+    else:
+        def handle_message(message):
+            time.sleep(args.io_ms / 1000)
+            return message["event_data"]
+
+        for _ in range(num_workers):
+            ZeroMQWorker(args.config, ZeroMQTCPConnection(port=args.port + 1), handle_message=handle_message).start()
+    time.sleep(1)  # the workers connect
+    print(f"{threading.active_count() - threads_before} {rss_mb():.1f}")  # read by run
+    sys.stdout.flush()
+    while True:
+        time.sleep(1)
+
+
+def run(args, reactor, num_workers):
+    router = ZeroMQRouter(args.config, ZeroMQTCPConnection(port=args.port), ZeroMQTCPConnection(port=args.port + 1))
+    threading.Thread(target=router.start, daemon=True).start()
+    time.sleep(0.1)  # the router binds first
+    workers = subprocess.Popen([sys.executable, __file__, "--workers-process", str(int(reactor)), str(num_workers),
+                                "--config", args.config, "--io-ms", str(args.io_ms), "--port", str(args.port)],
+                               stdout=subprocess.PIPE, text=True)
+    worker_threads, worker_rss = workers.stdout.readline().split()
+
+    clients = [ZeroMQClient(args.config, ZeroMQTCPConnection(port=args.port), timeout=60) for _ in range(args.clients)]
+    for client in clients:
+        client.connect()
+    latencies = []
+
+    def send(client):
+        for i in range(args.requests):
+            start = time.perf_counter()
+            client.send_message("io", i)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=send, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    workers.kill()
+    latencies.sort()
+    label = "reactor" if reactor else "threads"
+    print(f"{label} {num_workers:>4} workers: {len(latencies) / elapsed:8,.0f} requests/s, "
+          f"p50 {statistics.median(latencies):7.2f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms, "
+          f"worker process {worker_threads:>4} threads {worker_rss:>6} MB RSS")
+    sys.stdout.flush()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--workers", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--io-ms", type=float, default=10, help="wait of the handler")
+    parser.add_argument("--port", type=int, default=17600)
+    parser.add_argument("--run", type=int, nargs=2, help=argparse.SUPPRESS)  # one run: reactor (0 or 1), workers
+    parser.add_argument("--workers-process", type=int, nargs=2, help=argparse.SUPPRESS)  # the workers of a run
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if args.workers_process is not None:
+        run_workers(args, bool(args.workers_process[0]), args.workers_process[1])
+    if args.run is not None:
+        run(args, bool(args.run[0]), args.run[1])
+
+    settings = [(reactor, num_workers) for num_workers in args.workers for reactor in (0, 1)]
+    for index, (reactor, num_workers) in enumerate(settings):
+        subprocess.run([sys.executable, __file__, "--run", str(reactor), str(num_workers), "--config", args.config,
+                        "--clients", str(args.clients), "--requests", str(args.requests), "--io-ms", str(args.io_ms),
+                        "--port", str(args.port + index * 2)], check=True)
+
+
+if __name__ == "__main__":
+    main()
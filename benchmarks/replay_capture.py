@@ -0,0 +1,185 @@
+"""
+Replay: send the requests of a traffic capture (see ZeroMQRouter capture) to a router or server, and report the
+latency and throughput of the replay next to the latencies of the capture.
+
+The captured requests are read through a memory map (the capture file and its rotated files, oldest first) and sent
+in their original order from DEALER sockets, the requests of a captured client always from the same socket. They are
+sent on the original schedule (--speed 1), a faster or slower one (--speed 10, --speed 0.5), or as fast as the target
+answers with at most --max-in-flight requests waiting (--speed max). The scheduled replays are open loop: a request is
+sent on time whether the previous ones were answered or not, the time it is sent late is reported as schedule lag.
+
+Every request gets a new request id so the replies can be matched and workers with an idempotency store do not answer
+from their cache, unless --keep-request-ids is given. Requests passed by reference or offloaded to shared memory
+cannot be replayed from another process and are skipped.
+
+Usage: python benchmarks/replay_capture.py --capture router.cap --endpoint tcp://127.0.0.1:5555 --speed 1
+"""
+import argparse
+import json
+import sys
+import time
+import zlib
+from typing import Optional, Tuple
+
+import zmq
+
+from ZeroMQFramework.common.object_registry import OBJECT_REF
+from ZeroMQFramework.helpers.utils import get_uuid_hex
+from ZeroMQFramework.router.traffic_capture import REPLY, read_capture
+
+
+def get_request_id(metadata_frame) -> Optional[str]:
+    try:
+        return json.loads(bytes(metadata_frame)).get("request_id")
+    except ValueError:
+        return None
+
+
+def load(args):
+    """
+    :return: The replayable requests as (offset from the first request in seconds, client identity, frames after the
+             envelope, original latency in ms or None), and the number of skipped requests.
+    """
+    requests = []
+    pending = {}  # original request id: index in requests, until its reply is read
+    skipped = 0
+    first = None
+    for record in read_capture(args.capture):
+        frames = record.frames
+        delimiter = next((index for index, frame in enumerate(frames) if len(frame) == 0), None)
+        if delimiter is None or len(frames) < delimiter + 3:
+            continue  # not a request or reply of a client
+        body = frames[delimiter + 1:]
+        if record.direction == REPLY:
+            index = pending.pop(get_request_id(body[2]), None) if len(body) > 2 else None
+            if index is not None:
+                offset, identity, request, _ = requests[index]
+                requests[index] = (offset, identity, request, (record.timestamp - first - offset) * 1000)
+            continue
+        if len(body) > 2 and (body[2] == OBJECT_REF or b'"shm"' in body[2]):
+            skipped += 1
+            continue
+        if args.limit and len(requests) >= args.limit:
+            continue  # still reading the replies of the loaded requests
+        if first is None:
+            first = record.timestamp
+        if len(body) > 2:
+            request_id = get_request_id(body[2])
+            if request_id:
+                pending[request_id] = len(requests)
+        requests.append((record.timestamp - first, bytes(frames[0]), body, None))
+    return requests, skipped
+
+
+def with_request_id(body: list, keep: bool) -> Tuple[list, str]:
+    metadata = json.loads(bytes(body[2])) if len(body) > 2 else {}
+    if not keep or not metadata.get("request_id"):
+        metadata["request_id"] = get_uuid_hex(16)
+    return [body[0], body[1], json.dumps(metadata).encode('utf-8')], metadata["request_id"]
+
+
+def percentiles(values: list) -> str:
+    if not values:
+        return "n/a"
+    values = sorted(values)
+
+    def at(percentile):
+        return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+    return f"p50 {at(50):8.3f} ms, p90 {at(90):8.3f} ms, p99 {at(99):8.3f} ms, max {values[-1]:8.3f} ms"
+
+
+def replay(args, requests):
+    context = zmq.Context()
+    sockets = []
+    poller = zmq.Poller()
+    for _ in range(args.sockets):
+        socket = context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(args.endpoint)
+        poller.register(socket, zmq.POLLIN)
+        sockets.append(socket)
+    time.sleep(0.2)  # let the connections complete, the first requests would be scheduled late
+
+    sent = {}  # request id: send time
+    latencies = []
+    lags = []
+    unmatched = 0
+    speed = None if args.speed == "max" else float(args.speed)
+
+    def receive(timeout_ms):
+        nonlocal unmatched
+        for socket, _ in poller.poll(timeout_ms):
+            while True:
+                try:
+                    reply = socket.recv_multipart(zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                start = sent.pop(get_request_id(reply[3]), None) if len(reply) > 3 else None
+                if start is None:
+                    unmatched += 1
+                else:
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for offset, identity, body, _ in requests:
+        if speed is None:
+            while len(sent) >= args.max_in_flight:
+                receive(100)
+        else:
+            due = start + offset / speed
+            while (wait := due - time.perf_counter()) > 0:
+                receive(max(1, int(wait * 1000)) if wait > 0.001 else 0)
+            lags.append((time.perf_counter() - due) * 1000)
+        frames, request_id = with_request_id(body, args.keep_request_ids)
+        sent[request_id] = time.perf_counter()
+        sockets[zlib.crc32(identity) % len(sockets)].send_multipart([b''] + frames, copy=False)
+        receive(0)
+    sending = time.perf_counter() - start
+
+    deadline = time.perf_counter() + args.timeout
+    while sent and time.perf_counter() < deadline:
+        receive(100)
+    elapsed = time.perf_counter() - start
+
+    for socket in sockets:
+        socket.close()
+    context.term()
+    return latencies, lags, len(sent), unmatched, sending, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capture", required=True, help="capture file given to ZeroMQTrafficCapture")
+    parser.add_argument("--endpoint", required=True, help="router frontend or server, e.g. tcp://127.0.0.1:5555")
+    parser.add_argument("--speed", default="1", help="schedule speed factor, or max")
+    parser.add_argument("--max-in-flight", type=int, default=100, help="requests waiting for a reply (--speed max)")
+    parser.add_argument("--sockets", type=int, default=16, help="DEALER sockets the captured clients are spread on")
+    parser.add_argument("--limit", type=int, default=0, help="replay the first requests only")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for the last replies")
+    parser.add_argument("--keep-request-ids", action="store_true", help="send the captured request ids")
+    args = parser.parse_args()
+    if args.speed != "max" and float(args.speed) <= 0:
+        parser.error("--speed must be positive or max")
+
+    requests, skipped = load(args)
+    if not requests:
+        print(f"No replayable request in {args.capture} ({skipped} skipped)")
+        sys.exit(1)
+    duration = requests[-1][0]
+    print(f"{len(requests)} requests over {duration:.3f} s captured ({skipped} skipped), replaying at speed "
+          f"{args.speed} to {args.endpoint}")
+
+    latencies, lags, lost, unmatched, sending, elapsed = replay(args, requests)
+    original = [latency for _, _, _, latency in requests if latency is not None]
+    print(f"  sent       {len(requests)} in {sending:.3f} s ({len(requests) / max(sending, 1e-9):,.0f} requests/s)")
+    print(f"  replies    {len(latencies)} in {elapsed:.3f} s ({len(latencies) / max(elapsed, 1e-9):,.0f} replies/s), "
+          f"lost {lost}, unmatched {unmatched}")
+    print(f"  latency    {percentiles(latencies)}")
+    print(f"  captured   {percentiles(original)}")
+    if lags:
+        print(f"  lag        {percentiles(lags)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Shared context: nodes with a context each vs the process wide shared context, and the I/O threads of the context.
+
+Every ZeroMQ context runs its own I/O and reaper threads, so a process with many nodes each owning a context runs
+two OS threads per node. This benchmark creates N workers with a private context each and N workers sharing the
+context of ZeroMQContextManager, and reports the creation time and the OS threads of the process. It then measures the
+request throughput of concurrent clients through a router and workers, with the shared context configured with each
+of the given numbers of I/O threads (one process per setting, the context is configured before the first node).
+
+Usage: python benchmarks/shared_context.py --config config.ini --nodes 200 --io-threads 1 2 4 --clients 8
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+from loguru import logger
+
+from ZeroMQFramework import (ZeroMQClient, ZeroMQContextManager, ZeroMQRouter, ZeroMQTCPConnection,
+                             ZeroMQWorker)
+
+
+def os_threads():
+    return len(os.listdir("/proc/self/task"))
+
+
+def create_workers(config_file, count, shared):
+    threads_before = os_threads()
+    start = time.perf_counter()
+    workers = [ZeroMQWorker(config_file, ZeroMQTCPConnection(port=17300), context=None if shared else zmq.Context())
+               for _ in range(count)]
+    elapsed = (time.perf_counter() - start) / count * 1000
+    threads = os_threads() - threads_before
+    for worker in workers:  # never started, only the socket and the context to release
+        worker.socket.close(linger=0)
+        if shared:
+            ZeroMQContextManager.release(worker.context)
+        else:
+            worker.context.term()
+    return elapsed, threads
+
+
+def throughput(config_file, io_threads, clients, workers, requests, payload, port):
+    ZeroMQContextManager.configure(io_threads=io_threads)
+    router = ZeroMQRouter(config_file, ZeroMQTCPConnection(port=port), ZeroMQTCPConnection(port=port + 1))
+    threading.Thread(target=router.start, daemon=True).start()
+    for _ in range(workers):
+        ZeroMQWorker(config_file, ZeroMQTCPConnection(port=port + 1), handle_message=lambda message: "ok").start()
+    nodes = [ZeroMQClient(config_file, ZeroMQTCPConnection(port=port)) for _ in range(clients)]
+    for node in nodes:
+        node.connect()
+    data = "x" * payload
+
+    def send(node):
+        for _ in range(requests):
+            node.send_message("bench", data)
+
+    threads = [threading.Thread(target=send, args=(node,)) for node in nodes]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"io_threads = {io_threads}: {clients * requests / elapsed:10,.0f} requests/s "
+          f"({clients} clients, {workers} workers, {payload} bytes), {os_threads()} OS threads")
+    sys.stdout.flush()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--io-threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per client")
+    parser.add_argument("--payload", type=int, default=64 * 1024, help="request size in bytes")
+    parser.add_argument("--port", type=int, default=17310)
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)  # one throughput run with this many I/O threads
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if args.run is not None:
+        throughput(args.config, args.run, args.clients, args.workers, args.requests, args.payload, args.port)
+
+    for shared in (False, True):
+        elapsed, threads = create_workers(args.config, args.nodes, shared)
+        print(f"{args.nodes} workers, {'shared context   ' if shared else 'context per node '}: {elapsed:.3f} ms/node, "
+              f"{threads} OS threads")
+    for index, io_threads in enumerate(args.io_threads):
+        subprocess.run([sys.executable, __file__, "--run", str(io_threads), "--config", args.config,
+                        "--clients", str(args.clients), "--workers", str(args.workers),
+                        "--requests", str(args.requests), "--payload", str(args.payload),
+                        "--port", str(args.port + index * 2)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Shared memory offload: request latency of large payloads over IPC, through the sockets vs offloaded to shared memory.
+
+A client and a worker run in this process and a router in a child process, all over IPC connections, once sending the
+payloads through the sockets and once with a ZeroMQSharedMemoryPool (only the segment name goes through the router).
+The worker replies with a small result. The peak resident memory of the router (VmHWM) is reported for each mode, as
+the router no longer holds copies of the payloads in its queues. Linux only (/proc).
+
+Usage: python benchmarks/shared_memory_offload.py --config config.ini --sizes-mb 1 8 32 --requests 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import ZeroMQClient, ZeroMQIPCConnection, ZeroMQRouter, ZeroMQSharedMemoryPool, ZeroMQWorker
+
+
+def connection(args, name, offload):
+    pool = ZeroMQSharedMemoryPool(threshold=args.threshold_kb * 1024) if offload else None
+    return ZeroMQIPCConnection(os.path.join(args.ipc_dir, f"shm_bench_{name}.ipc"), shared_memory=pool)
+
+
+def run_router(args, offload):
+    router = ZeroMQRouter(args.config, connection(args, "frontend", offload), connection(args, "backend", offload))
+    router.start()
+
+
+def peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run(args, offload):
+    router = subprocess.Popen([sys.executable, __file__, "--router", str(int(offload)), "--config", args.config,
+                               "--ipc-dir", args.ipc_dir, "--threshold-kb", str(args.threshold_kb)])
+    time.sleep(0.5)  # the router binds first
+
+    def handle_message(message):
+        return {"size": len(message["event_data"])}
+
+    ZeroMQWorker(args.config, connection(args, "backend", offload), handle_message=handle_message).start()
+    client = ZeroMQClient(args.config, connection(args, "frontend", offload), timeout=60)
+    client.connect()
+    label = "shared memory" if offload else "sockets      "
+    for size_mb in args.sizes_mb:
+        data = "x" * (size_mb * 1024 * 1024)
+        client.send_message("payload", data)  # warm up
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            client.send_message("payload", data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{label} {size_mb:>4} MB: p50 {statistics.median(latencies):8.2f} ms, max {max(latencies):8.2f} ms, "
+              f"router peak RSS {peak_rss_mb(router.pid):7.1f} MB")
+        sys.stdout.flush()
+    router.kill()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=50, help="requests per size")
+    parser.add_argument("--threshold-kb", type=int, default=256, help="offload threshold of the pool")
+    parser.add_argument("--ipc-dir", default="/tmp")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)  # one run: offload (0 or 1)
+    parser.add_argument("--router", type=int, help=argparse.SUPPRESS)  # the router process of a run
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if args.router is not None:
+        run_router(args, bool(args.router))
+    if args.run is not None:
+        run(args, bool(args.run))
+
+    for offload in (False, True):
+        subprocess.run([sys.executable, __file__, "--run", str(int(offload)), "--config", args.config,
+                        "--sizes-mb", *map(str, args.sizes_mb), "--requests", str(args.requests),
+                        "--threshold-kb", str(args.threshold_kb), "--ipc-dir", args.ipc_dir], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Socket profiles: request throughput and latency of a router with workers and clients for each socket profile.
+
+Every connection of the run (client, router frontend and backend, workers) uses the profile, for each payload size.
+Each profile runs in its own process. Profiles are preset names or, with --config, sections of a configuration file
+read with ZeroMQSocketProfile.from_config.
+
+Usage: python benchmarks/socket_profiles.py --config config.ini --profiles default low-latency high-throughput \
+large-payload --payloads 100 65536 1048576
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import ZeroMQClient, ZeroMQRouter, ZeroMQSocketProfile, ZeroMQTCPConnection, ZeroMQWorker
+from ZeroMQFramework.common.socket_profile import SOCKET_PROFILES
+
+
+def run(config_file, profile_name, payloads, clients, workers, requests, port):
+    profile = (ZeroMQSocketProfile.get(profile_name) if profile_name in SOCKET_PROFILES
+               else ZeroMQSocketProfile.from_config(config_file, profile_name))
+    router = ZeroMQRouter(config_file, ZeroMQTCPConnection(port=port, socket_profile=profile),
+                          ZeroMQTCPConnection(port=port + 1, socket_profile=profile))
+    threading.Thread(target=router.start, daemon=True).start()
+    for _ in range(workers):
+        ZeroMQWorker(config_file, ZeroMQTCPConnection(port=port + 1, socket_profile=profile),
+                     handle_message=lambda message: len(message["event_data"])).start()
+    nodes = [ZeroMQClient(config_file, ZeroMQTCPConnection(port=port, socket_profile=profile), timeout=30)
+             for _ in range(clients)]
+    for node in nodes:
+        node.connect()
+
+    for payload in payloads:
+        data = "x" * payload
+        latencies = []
+
+        def send(node):
+            for _ in range(requests):
+                start = time.perf_counter()
+                node.send_message("bench", data)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=send, args=(node,)) for node in nodes]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        print(f"{profile.name:16} {payload:>9} bytes: {clients * requests / elapsed:9,.0f} requests/s, "
+              f"p50 {statistics.median(latencies):7.3f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:7.3f} ms")
+        sys.stdout.flush()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--profiles", nargs="+", default=list(SOCKET_PROFILES),
+                        help="preset names or configuration file sections")
+    parser.add_argument("--payloads", type=int, nargs="+", default=[100, 64 * 1024, 1024 * 1024],
+                        help="request sizes in bytes")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500, help="requests per client and payload")
+    parser.add_argument("--port", type=int, default=17400)
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # one run with this profile
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if args.run is not None:
+        run(args.config, args.run, args.payloads, args.clients, args.workers, args.requests, args.port)
+
+    for index, profile in enumerate(args.profiles):
+        subprocess.run([sys.executable, __file__, "--run", profile, "--config", args.config,
+                        "--payloads", *map(str, args.payloads), "--clients", str(args.clients),
+                        "--workers", str(args.workers), "--requests", str(args.requests),
+                        "--port", str(args.port + index * 2)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Socket status overhead: the per-request connection check of the client vs a lock protected status.
+
+The client processes its socket monitor events on its own thread, so reading the status takes no lock. This benchmark
+measures the check done before each request (a plain comparison while connected, draining the monitor events
+otherwise) and the cost of a drain, against the previous approach: a status flag behind a threading.Lock written by a
+monitor thread, with N other threads contending for the same lock.
+
+Usage: python benchmarks/socket_status_overhead.py --calls 200000 --threads 4
+"""
+import argparse
+import sys
+import threading
+import time
+
+import zmq
+
+from ZeroMQFramework.common.socket_monitor import ZeroMQSocketMonitor
+from ZeroMQFramework.common.socket_status import ZeroMQSocketStatus
+from loguru import logger
+
+
+def bench_locked(calls, threads):
+    lock = threading.Lock()
+    status = [True]
+    stop = threading.Event()
+
+    def contend():  # other threads hitting the same lock, like a monitor thread and other sending threads
+        while not stop.is_set():
+            with lock:
+                status[0] = True
+
+    contenders = [threading.Thread(target=contend, daemon=True) for _ in range(threads)]
+    for thread in contenders:
+        thread.start()
+    start = time.perf_counter()
+    for _ in range(calls):
+        with lock:
+            _ = status[0]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in contenders:
+        thread.join()
+    return elapsed / calls * 1e9
+
+
+def bench_lock_free(calls, threads, port):
+    context = zmq.Context()
+    router = context.socket(zmq.ROUTER)
+    router.bind(f"tcp://127.0.0.1:{port}")
+    socket = context.socket(zmq.DEALER)
+    monitor = ZeroMQSocketMonitor(context, socket, threaded=False)
+    monitor.start()
+    socket.connect(f"tcp://127.0.0.1:{port}")
+    monitor.wait_for_events(1000)
+
+    stop = threading.Event()
+
+    def busy():  # the same amount of background threads, they do not touch the status
+        while not stop.is_set():
+            time.sleep(0)
+
+    others = [threading.Thread(target=busy, daemon=True) for _ in range(threads)]
+    for thread in others:
+        thread.start()
+    status = ZeroMQSocketStatus.CONNECTED if monitor.is_connected() else ZeroMQSocketStatus.DISCONNECTED
+    start = time.perf_counter()
+    for _ in range(calls):  # the client send path
+        if status != ZeroMQSocketStatus.CONNECTED:
+            monitor.drain_events()
+    check = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        monitor.drain_events()
+    drain = time.perf_counter() - start
+    stop.set()
+    for thread in others:
+        thread.join()
+
+    monitor.cleanup()
+    socket.close(linger=0)
+    router.close(linger=0)
+    context.term()
+    return check / calls * 1e9, drain / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4, help="contending threads")
+    parser.add_argument("--port", type=int, default=17100)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    locked = bench_locked(args.calls, args.threads)
+    check, drain = bench_lock_free(args.calls, args.threads, args.port)
+    print(f"lock protected status : {locked:,.0f} ns/check ({args.threads} contending threads)")
+    print(f"lock free status      : {check:,.0f} ns/check")
+    print(f"monitor event drain   : {drain:,.0f} ns/drain (only while not connected)")
+
+
+if __name__ == "__main__":
+    main()
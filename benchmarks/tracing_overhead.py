@@ -0,0 +1,98 @@
+"""
+Tracing: request latency without a tracer and with tracers sampling none, 1% and all of the requests, then the hop
+breakdown (client queue, router queue, backend queue, handler, ...) of the fully sampled run.
+
+A client, a router and a worker run in one process per sample rate, with a fixed handler cost. The spans are written
+by a ZeroMQJSONSpanExporter to a temporary file. Pass --spans to print the breakdown of an existing span file instead.
+
+Usage: python benchmarks/tracing_overhead.py --config config.ini --requests 2000 --handler-ms 0.5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+from ZeroMQFramework import (ZeroMQClient, ZeroMQJSONSpanExporter, ZeroMQRouter, ZeroMQTCPConnection, ZeroMQTracer,
+                             ZeroMQWorker)
+from ZeroMQFramework.common.tracing import get_hop_breakdown, read_spans
+
+
+def run(args, sample_rate):
+    tracer = None
+    if sample_rate is not None:
+        tracer = ZeroMQTracer(ZeroMQJSONSpanExporter(args.spans_file), sample_rate=sample_rate)
+    router = ZeroMQRouter(args.config, ZeroMQTCPConnection(port=args.port), ZeroMQTCPConnection(port=args.port + 1),
+                          tracer=tracer)
+    threading.Thread(target=router.start, daemon=True).start()
+    time.sleep(0.1)  # the router binds first
+
+    def handle_message(message):
+        time.sleep(args.handler_ms / 1000)
+        return message["event_data"]
+
+    ZeroMQWorker(args.config, ZeroMQTCPConnection(port=args.port + 1), handle_message=handle_message,
+                 tracer=tracer).start()
+    client = ZeroMQClient(args.config, ZeroMQTCPConnection(port=args.port), timeout=10, tracer=tracer)
+    client.connect()
+    for i in range(100):  # warm up
+        client.send_message("trace", i)
+
+    latencies = []
+    for i in range(args.requests):
+        start = time.perf_counter()
+        client.send_message("trace", i)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    label = "no tracer" if sample_rate is None else f"sample {sample_rate:g}"
+    print(f"{label:>12}: mean {statistics.mean(latencies):8.1f} us, median {statistics.median(latencies):8.1f} us"
+          + (f", {tracer.spans_exported} spans" if tracer else ""))
+    if tracer is not None:
+        tracer.close()
+    sys.stdout.flush()
+    os._exit(0)  # the nodes run until interrupted
+
+
+def print_breakdown(path):
+    print(f"{'hop':>18} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for hop, stats in get_hop_breakdown(read_spans(path)).items():
+        print(f"{hop:>18} {stats['count']:>7} {stats['mean_ms']:>9.3f} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f}"
+              f" {stats['max_ms']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--handler-ms", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=17900)
+    parser.add_argument("--spans", help="print the hop breakdown of this span file and exit")
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # one run: a sample rate, or none
+    parser.add_argument("--spans-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    if args.spans:
+        print_breakdown(args.spans)
+        return
+    if args.run is not None:
+        run(args, None if args.run == "none" else float(args.run))
+
+    directory = tempfile.mkdtemp()
+    for index, sample_rate in enumerate(["none", "0", "0.01", "1"]):
+        spans_file = os.path.join(directory, f"spans_{sample_rate}.jsonl")
+        subprocess.run([sys.executable, __file__, "--run", sample_rate, "--spans-file", spans_file,
+                        "--config", args.config, "--requests", str(args.requests), "--handler-ms", str(args.handler_ms),
+                        "--port", str(args.port + index * 2)], check=True)
+    print()
+    print_breakdown(os.path.join(directory, "spans_1.jsonl"))
+
+
+if __name__ == "__main__":
+    main()